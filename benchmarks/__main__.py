@@ -0,0 +1,81 @@
+"""Run every benchmark and write the results to a JSON file.
+
+Run with: python -m benchmarks [--output FILE] [--only NAME ...] [--baseline FILE]
+"""
+import argparse
+from datetime import datetime
+from datetime import timezone
+import importlib
+import json
+import os
+import platform
+import sys
+
+BENCHMARKS = {
+    'request_construction': 'benchmarks.bench_request_construction',
+    'throughput': 'benchmarks.bench_throughput',
+    'payloads': 'benchmarks.bench_payloads',
+}
+
+
+def metadata():
+    """Return details of the machine and interpreter the results were measured on."""
+    try:
+        from importlib.metadata import version
+        ptv_version = version('ptv-wrapper')
+    except Exception:
+        ptv_version = None
+    return {
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ptv_version': ptv_version,
+    }
+
+
+def flatten(results, prefix=''):
+    """Return the numeric leaves of nested result dicts keyed by dotted path."""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + name] = value
+    return flat
+
+
+def compare(results, baseline):
+    """Return (name, baseline, current, ratio) for every result also present in baseline."""
+    current, previous = flatten(results), flatten(baseline)
+    return [(name, previous[name], value, value / previous[name] if previous[name] else None)
+        for name, value in sorted(current.items()) if name in previous]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='benchmark-results.json',
+        help='results file (default = benchmark-results.json)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print('running {}'.format(name), file=sys.stderr)
+        results[name] = importlib.import_module(BENCHMARKS[name]).run()
+    with open(args.output, 'w', encoding='UTF-8') as f:
+        json.dump({'metadata': metadata(), 'results': results}, f, indent=2)
+    print('wrote {}'.format(args.output), file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='UTF-8') as f:
+            baseline = json.load(f)['results']
+        for name, before, after, ratio in compare(results, baseline):
+            print('{:<60}{:>12.3f}{:>12.3f}{:>8}'.format(name, before, after,
+                '{:.2f}x'.format(ratio) if ratio is not None else '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""JSON decode cost and peak RSS for large get_runs_for_route payloads.
+
+Each mode runs in a fresh child process so peak RSS is not inherited from
+earlier modes; the payload is also built and decoded in children, since
+Linux carries a parent's peak RSS over into its children. The response is
+read from a file rather than the network, so only the client's own memory
+and CPU are measured. Peak RSS comes from the resource module and is only
+available on Unix.
+
+Run with: python -m benchmarks.bench_payloads
+"""
+from contextlib import contextmanager
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from ptv.cache import CachePolicy
+from ptv.cache import MemoryCache
+from ptv.client import PTVClient
+from ptv.transport import Response
+from ptv.transport import Transport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+MODES = ('dict', 'models', 'stream', 'stream_models', 'cached', 'orjson')
+
+
+def runs_payload(count):
+    """Return the body of a get_runs_for_route response with count runs."""
+    runs = [{
+        'run_id': run_id,
+        'run_ref': str(run_id),
+        'route_id': 6,
+        'route_type': 0,
+        'final_stop_id': 1073 if run_id % 2 else 1071,
+        'destination_name': 'Frankston' if run_id % 2 else 'Flinders Street',
+        'status': 'scheduled',
+        'direction_id': 5 if run_id % 2 else 1,
+        'run_sequence': 0,
+        'express_stop_count': run_id % 3,
+        'vehicle_position': None,
+        'vehicle_descriptor': {'operator': 'Metro Trains Melbourne', 'id': None,
+            'low_floor': None, 'air_conditioned': None, 'description': None,
+            'supplier': None, 'length': None},
+    } for run_id in range(1, count + 1)]
+    return json.dumps({'runs': runs, 'status': {'version': '3.0', 'health': 1}}).encode('UTF-8')
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _FileResponse(object):
+    def __init__(self, path):
+        self.status_code = 200
+        self.headers = {}
+        self._file = open(path, 'rb')
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        return iter(lambda: self._file.read(chunk_size), b'')
+
+    def close(self):
+        self._file.close()
+
+
+class FileTransport(Transport):
+    """Answers every request with the body stored in a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, url):
+        with open(self.path, 'rb') as f:
+            return Response(200, f.read(), url=url)
+
+    def stream(self, url):
+        return _FileResponse(self.path)
+
+
+def _write_payload(path, count, conn):
+    with open(path, 'wb') as f:
+        f.write(runs_payload(count))
+    conn.send(None)
+
+
+def _decode(path, conn):
+    with open(path, 'rb') as f:
+        body = f.read()
+    results = {'payload_mb': len(body) / 2 ** 20, 'json_loads_s_per_mb': decode_seconds_per_mb(body)}
+    try:
+        import orjson
+        results['orjson_loads_s_per_mb'] = decode_seconds_per_mb(body, orjson.loads)
+    except ImportError:
+        results['orjson_loads_s_per_mb'] = None
+    conn.send(results)
+
+
+def _measure(path, mode, conn):
+    kwargs = {'transport': FileTransport(path), 'coalesce': False}
+    if mode in ('models', 'stream_models'):
+        kwargs['models'] = True
+    if mode == 'cached':
+        kwargs['cache'] = MemoryCache()
+        kwargs['cache_policy'] = CachePolicy()
+    if mode == 'orjson':
+        import orjson
+        kwargs['json_loads'] = orjson.loads
+    client = PTVClient(DEV_ID, API_KEY, **kwargs)
+    baseline = peak_rss()
+    started = time.perf_counter()
+    if mode.startswith('stream'):
+        items = sum(1 for _ in client.iter_runs_for_route(6))
+        result = None
+    else:
+        result = client.get_runs_for_route(6)
+        items = len(result['runs'])
+    seconds = time.perf_counter() - started
+    measured = {'seconds': seconds, 'items': items, 'peak_rss_mb': (peak_rss() - baseline) / 2 ** 20}
+    if mode == 'cached':
+        measured['cache_bytes'] = client.cache.stats()['bytes']
+    conn.send(measured)
+
+
+@contextmanager
+def payload_file(count):
+    """Write a runs payload of count runs to a temporary file and yield its path."""
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        in_child(_write_payload, path, count)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def in_child(target, *args):
+    """Call target(*args, conn) in a fresh process and return what it sends, or None if it fails."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    process = context.Process(target=target, args=args + (child,))
+    process.start()
+    child.close()
+    try:
+        return parent.recv()
+    except EOFError:
+        return None
+    finally:
+        process.join()
+
+
+def decode_seconds_per_mb(body, loads=json.loads, repeat=3):
+    """Return the best time to decode body with loads, in seconds per MiB."""
+    best = min(_timed(loads, body) for _ in range(repeat))
+    return best / (len(body) / 2 ** 20)
+
+
+def _timed(loads, body):
+    started = time.perf_counter()
+    loads(body)
+    return time.perf_counter() - started
+
+
+def run(count=50000):
+    """Run the benchmark and return decode cost and per-mode results as a dict.
+
+    Modes whose optional dependency is missing are reported as None.
+
+    Optional Parameters:
+        count (int)
+            Runs in the payload (default = 50000)
+    """
+    with payload_file(count) as path:
+        results = {'runs': count}
+        results.update(in_child(_decode, path))
+        results['modes'] = {mode: in_child(_measure, path, mode) for mode in MODES}
+    return results
+
+
+def main():
+    results = run()
+    print('{runs} runs, {payload_mb:.1f} MiB, json.loads {json_loads_s_per_mb:.3f} s/MiB'.format(**results))
+    for mode, measured in results['modes'].items():
+        if measured is None:
+            print('{:<16}unavailable'.format(mode))
+            continue
+        print('{:<16}{:>8.3f} s  peak RSS +{:>7.1f} MiB'.format(mode, measured['seconds'],
+            measured['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
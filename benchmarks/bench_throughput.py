@@ -0,0 +1,127 @@
+"""Single-call latency and throughput at 1-256 concurrent callers, against a local fake server.
+
+The server runs in a child process so it does not compete with the client for the GIL.
+
+Run with: python -m benchmarks.bench_throughput
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import multiprocessing
+import time
+
+from ptv.aio import AsyncPTVClient
+from ptv.aio import default_async_transport
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.fake import FakePTVServer
+from ptv.fake import SyntheticNetwork
+from ptv.transport import RequestsTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+CONCURRENCY = (1, 4, 16, 64, 256)
+
+
+def _serve(conn, latency):
+    network = SyntheticNetwork(routes_per_type=4, stops_per_route=12)
+    with FakePTVServer({DEV_ID: API_KEY}, network=network, latency=latency) as server:
+        conn.send(server.base_url)
+        conn.recv()
+
+
+@contextmanager
+def fake_server(latency=0):
+    """Run a FakePTVServer in a child process and yield its base URL."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    process = context.Process(target=_serve, args=(child, latency))
+    process.start()
+    child.close()
+    try:
+        yield parent.recv()
+    finally:
+        parent.send(None)
+        process.join()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def call(client, i):
+    return client.get_stops(i % 4 + 1, RouteType.TRAIN)
+
+
+def sync_latency(base_url, calls):
+    """Return p50 and p99 single-call latency in milliseconds over sequential calls."""
+    with PTVClient(DEV_ID, API_KEY, base_url=base_url, coalesce=False) as client:
+        call(client, 0)
+        samples = []
+        for i in range(calls):
+            started = time.perf_counter()
+            call(client, i)
+            samples.append((time.perf_counter() - started) * 1e3)
+    return {'p50_ms': percentile(samples, 0.5), 'p99_ms': percentile(samples, 0.99)}
+
+
+def sync_throughput(base_url, concurrency, calls):
+    """Return calls per second made by concurrency threads sharing one client."""
+    transport = RequestsTransport(pool_connections=1, pool_maxsize=concurrency)
+    # Coalescing is disabled so every call is a request, as with distinct parameters.
+    with PTVClient(DEV_ID, API_KEY, transport=transport, base_url=base_url,
+        coalesce=False) as client:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda i: call(client, i), range(concurrency)))
+            started = time.perf_counter()
+            list(executor.map(lambda i: call(client, i), range(calls)))
+            return calls / (time.perf_counter() - started)
+
+
+def async_throughput(base_url, concurrency, calls):
+    """Return calls per second made by concurrency tasks sharing one AsyncPTVClient."""
+    async def measure():
+        client = AsyncPTVClient(DEV_ID, API_KEY, transport=default_async_transport(concurrency),
+            base_url=base_url, max_concurrency=concurrency, coalesce=False)
+        try:
+            await asyncio.gather(*[call(client, i) for i in range(concurrency)])
+            started = time.perf_counter()
+            await asyncio.gather(*[call(client, i) for i in range(calls)])
+            return calls / (time.perf_counter() - started)
+        finally:
+            await client.close()
+    return asyncio.run(measure())
+
+
+def run(calls=2000, latency=0, concurrency=CONCURRENCY):
+    """Run the benchmark and return latencies and calls per second as a dict.
+
+    Optional Parameters:
+        calls (int)
+            Calls made per measurement (default = 2000)
+        latency (float)
+            Seconds the fake server adds to every response (default = 0)
+        concurrency (tuple)
+            Numbers of concurrent callers measured (default = CONCURRENCY)
+    """
+    with fake_server(latency) as base_url:
+        return {
+            'server_latency_ms': latency * 1e3,
+            'sync_latency': sync_latency(base_url, min(calls, 500)),
+            'sync_calls_per_second': {str(c): sync_throughput(base_url, c, calls) for c in concurrency},
+            'async_calls_per_second': {str(c): async_throughput(base_url, c, calls) for c in concurrency},
+        }
+
+
+def main():
+    results = run()
+    print('sync latency      p50 {p50_ms:.2f} ms  p99 {p99_ms:.2f} ms'.format(**results['sync_latency']))
+    for concurrency in results['sync_calls_per_second']:
+        print('{:>4} callers     sync {:>8.0f}/s  async {:>8.0f}/s'.format(concurrency,
+            results['sync_calls_per_second'][concurrency],
+            results['async_calls_per_second'][concurrency]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Python wrapper for the PTV Timetable API.
+
+Names are imported from their modules when first used (PEP 562), so
+importing ptv, and running the ptv command, doesn't load requests and the
+rest of the library until they are needed.
+"""
+import importlib
+
+_EXPORTS = {
+    'AsyncPTVClient': 'aio',
+    'CachePolicy': 'cache',
+    'Credential': 'credentials',
+    'CredentialPool': 'credentials',
+    'DepartureTable': 'columnar',
+    'DisruptionTracker': 'disruptions',
+    'EntityStore': 'entities',
+    'FakePTVServer': 'fake',
+    'JourneyPlanner': 'planner',
+    'MemoryCache': 'cache',
+    'MetricsCollector': 'metrics',
+    'NetworkIndex': 'index',
+    'PTVClient': 'client',
+    'PrefetchScheduler': 'prefetch',
+    'RateLimiter': 'retry',
+    'RetryPolicy': 'retry',
+    'RouteType': 'client',
+    'RunTable': 'columnar',
+    'SQLiteCache': 'cache',
+    'SearchIndex': 'search',
+    'SharedRateLimiter': 'retry',
+    'StopLocator': 'spatial',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import time
+
+import requests
+
+from .bulk import merge_departures
+from .bulk import split_request
+from .cache import cache_key
+from .client import BASE_URL
+from .client import BaseClient
+from .metrics import HIT
+from .metrics import MISS
+from .metrics import STALE
+from .singleflight import AsyncSingleFlight
+from .transport import RequestsTransport
+from .transport import Response
+from .watch import watch_departures_async
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTransport(object):
+    """ Base class for the HTTP transport used by AsyncPTVClient.
+
+    Subclasses implement the get() coroutine and return an object exposing
+    status_code, headers, content, json() and raise_for_status().
+    """
+
+    async def get(self, url):
+        """Perform a GET request.
+
+        Parameters
+            url (str)
+                Fully signed URL to request
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Release any pooled connections."""
+        pass
+
+
+class AiohttpTransport(AsyncTransport):
+    """ Transport backed by a single pooled aiohttp.ClientSession.
+
+    Requires the optional aiohttp dependency (pip install ptv-wrapper[async]).
+    """
+
+    def __init__(self, pool_maxsize=100, keep_alive=True, connect_timeout=5, read_timeout=30):
+        """Initialize an AiohttpTransport.
+
+        Optional Parameters:
+            pool_maxsize (int)
+                Maximum number of open connections (default = 100)
+            keep_alive (bool)
+                Reuse connections between requests (default = true)
+            connect_timeout (float)
+                Seconds to wait when establishing a connection (default = 5)
+            read_timeout (float)
+                Seconds to wait between bytes from the server (default = 30)
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError('AiohttpTransport requires aiohttp: pip install ptv-wrapper[async]')
+        self._aiohttp = aiohttp
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._trace('request_start'))
+        self.trace_config.on_connection_create_start.append(self._trace('connect_start'))
+        self.trace_config.on_connection_create_end.append(self._trace('connect_end'))
+        self.trace_config.on_request_end.append(self._trace('request_end'))
+        self.session = None
+
+    @staticmethod
+    def _trace(name):
+        async def record(session, context, params):
+            context.trace_request_ctx[name] = time.perf_counter()
+        return record
+
+    def _session(self):
+        # The session must be created inside the running event loop.
+        if self.session is None or self.session.closed:
+            connector = self._aiohttp.TCPConnector(limit=self.pool_maxsize,
+                force_close=not self.keep_alive)
+            self.session = self._aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                trace_configs=[self.trace_config])
+        return self.session
+
+    async def get(self, url):
+        from yarl import URL
+        timings = {}
+        # encoded=True stops aiohttp re-quoting the query covered by the signature
+        try:
+            async with self._session().get(URL(url, encoded=True),
+                trace_request_ctx=timings) as response:
+                content = await response.read()
+        except asyncio.TimeoutError as e:
+            raise requests.Timeout(str(e))
+        except self._aiohttp.ClientConnectionError as e:
+            raise requests.ConnectionError(str(e))
+        # on_request_end fires once the response headers have been read
+        connect_time = timings.get('connect_end', 0.0) - timings.get('connect_start', 0.0)
+        ttfb = timings['request_end'] - timings['request_start'] if 'request_end' in timings else None
+        return Response(response.status, content, dict(response.headers), url,
+            connect_time=connect_time, ttfb=ttfb)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class ThreadedAsyncTransport(AsyncTransport):
+    """ Adapts a synchronous Transport by running it in the default executor.
+
+    Used by AsyncPTVClient when aiohttp is not installed.
+    """
+
+    def __init__(self, transport=None):
+        """Initialize a ThreadedAsyncTransport.
+
+        Optional Parameters:
+            transport (Transport)
+                Synchronous transport to wrap (default = RequestsTransport)
+        """
+        self.transport = transport if transport is not None else RequestsTransport()
+
+    async def get(self, url):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.transport.get, url)
+
+    async def close(self):
+        self.transport.close()
+
+
+def default_async_transport(pool_maxsize):
+    """Return an AiohttpTransport if aiohttp is installed, else a ThreadedAsyncTransport."""
+    try:
+        return AiohttpTransport(pool_maxsize=pool_maxsize)
+    except ImportError:
+        return ThreadedAsyncTransport(RequestsTransport(pool_maxsize=pool_maxsize))
+
+
+class AsyncPTVClient(BaseClient):
+    """ Class to make asyncio calls to PTV API.
+
+    Exposes the same endpoint methods as PTVClient, each returning a
+    coroutine. Concurrent calls share one connection pool and are bounded
+    by a semaphore.
+    """
+
+    def __init__(self, dev_id=None, api_key=None, transport=None, base_url=BASE_URL, max_concurrency=32,
+        cache=None, cache_policy=None, coalesce=True, rate_limiter=None, retry_policy=None,
+        models=False, json_loads=None, observers=None, credentials=None, entities=None):
+        """Initialize an AsyncPTVClient.
+
+        Parameters
+            dev_id (str)
+                Developer ID from PTV (may be None with credentials)
+            api_key (str)
+                API key from PTV (may be None with credentials)
+
+        Optional Parameters:
+            transport (AsyncTransport)
+                Transport used for every request (default = AiohttpTransport
+                when aiohttp is installed, otherwise ThreadedAsyncTransport)
+            base_url (str)
+                Scheme and host of the API (default = BASE_URL)
+            max_concurrency (int)
+                Maximum number of requests in flight at once (default = 32)
+            cache (Cache)
+                Response cache consulted before every request (default = no caching)
+            cache_policy (CachePolicy)
+                Per-endpoint freshness used with cache (default = CachePolicy())
+            coalesce (bool)
+                Share one in-flight request between tasks making identical
+                calls at the same time (default = true)
+            rate_limiter (RateLimiter)
+                Token bucket consulted before every request sent (default = unlimited)
+            retry_policy (RetryPolicy)
+                Policy for retrying failed requests (default = no retries)
+            models (bool)
+                Return Departure, Run, Stop, Route, Direction and Disruption
+                objects in place of dicts (default = false)
+            json_loads (callable)
+                Decoder taking the response body as bytes, e.g. orjson.loads
+                (default = the transport's json())
+            observers (callable [])
+                Called with a CallEvent after every endpoint method call, e.g.
+                a MetricsCollector (default = none)
+            credentials (CredentialPool)
+                Keys that requests are spread across, each signed with its
+                own key; with rate_limiter, each request uses the key that
+                can send soonest (default = dev_id and api_key only)
+            entities (EntityStore)
+                Store that responses are normalised into, so stops, routes,
+                runs, directions and disruptions are held once per id and
+                shared between responses (default = none)
+        """
+        super().__init__(dev_id, api_key, base_url, cache, cache_policy, rate_limiter,
+            retry_policy, models, json_loads, observers, credentials, entities)
+        self.transport = transport if transport is not None else default_async_transport(max_concurrency)
+        self.single_flight = AsyncSingleFlight() if coalesce else None
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._tasks = set()
+
+    async def close(self):
+        """Close the transport and release pooled connections."""
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _api_call(self, path, params=None, endpoint=None):
+        """Create URL and call API
+
+        Parameters:
+            path (str)
+                The endpoint we are calling
+            params (dict)
+                Dictionary containing parameters to be passed in the query
+            endpoint (Endpoint)
+                Template the path was built from
+
+        Returns
+            JSON from response as dict
+        """
+        if params is None:
+            params = {}
+        event = self._start_event(path, endpoint, params)
+        if event is None:
+            return await self._call(path, params, None)
+        started = time.perf_counter()
+        try:
+            result = await self._call(path, params, event)
+        except Exception as e:
+            self._finish_event(event, started, e)
+            raise
+        self._finish_event(event, started)
+        return result
+
+    async def _call(self, path, params, event):
+        key, ttl, result, fresh = self._cache_lookup(path, params)
+        if event is not None:
+            event.key = key
+        if result is not None:
+            if event is not None:
+                event.cache = HIT if fresh else STALE
+            if not fresh:
+                self._revalidate(key, ttl, path, params)
+            return self._result(result, cached=True)
+        if event is not None and key is not None:
+            event.cache = MISS
+        if self.single_flight is None:
+            return self._result(await self._load(key, ttl, path, params, event))
+        return self._result(await self.single_flight.do(key or cache_key(path, params),
+            self._load, key, ttl, path, params, event))
+
+    async def _load(self, key, ttl, path, params, event=None):
+        """Fetch a response and store it in the cache when cacheable."""
+        result, size = await self._fetch(path, params, event)
+        if key is not None:
+            self._cache_store(key, ttl, result, size)
+        return result
+
+    async def _fetch(self, path, params, event=None):
+        """Sign and send a request, returning the decoded JSON and its size in bytes.
+
+        The status, size and timings of the response are recorded on event, if given.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            # Each attempt may go out under a different key of the pool.
+            credential, wait = self._reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            url = self._build_url(path, params, credential)
+            if event is not None:
+                event.requests, event.retries = attempt + 1, attempt
+            try:
+                async with self._semaphore:
+                    response = await self.transport.get(url)
+            except Exception as e:
+                delay = self._retry_delay(attempt, started, error=e)
+                if delay is None:
+                    raise
+            else:
+                if event is not None:
+                    event.record_response(response)
+                delay = self._retry_delay(attempt, started, response=response)
+                if delay is None:
+                    response.raise_for_status()
+                    return self._decode(response, event), len(response.content)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _revalidate(self, key, ttl, path, params):
+        """Refresh a stale cache entry in a background task unless already refreshing."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(key, ttl, path, dict(params)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key, ttl, path, params):
+        try:
+            result, size = await self._fetch(path, params)
+            self._cache_store(key, ttl, result, size)
+        except Exception:
+            # The stale entry keeps being served until it is discarded.
+            logger.warning('Background refresh of %s failed', key, exc_info=True)
+        finally:
+            self._refreshing.discard(key)
+
+    # Bulk
+    async def get_departures_for_stops(self, stops, **kwargs):
+        """Get departures for many stops concurrently, merged into a single result.
+
+        Concurrency is bounded by max_concurrency.
+
+        Parameters:
+            stops (array[tuple])
+                (route_type, stop_id) or (route_type, stop_id, route_id) tuples
+
+        Optional Parameters:
+            Any optional parameter of get_departure_from_stop, applied to every stop
+
+        Returns
+            dict with every departure under 'departures', each expanded stop,
+            route, run, direction and disruption once keyed by id, and the
+            stops that failed under 'errors'
+        """
+        async def fetch(request):
+            route_type, stop_id, route_id = split_request(request)
+            return await self.get_departure_from_stop(route_type, stop_id, route_id, **kwargs)
+
+        results = await asyncio.gather(*[fetch(request) for request in stops],
+            return_exceptions=True)
+        return merge_departures(stops, results)
+
+    def watch_departures(self, stops, **kwargs):
+        """Poll departures for many stops and yield only added, removed or changed ones.
+
+        Async generator taking the parameters of ptv.watch.watch_departures_async.
+        """
+        return watch_departures_async(self, stops, **kwargs)
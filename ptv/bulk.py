@@ -0,0 +1,59 @@
+EXPANSION_IDS = {
+    'stops': 'stop_id',
+    'routes': 'route_id',
+    'runs': 'run_id',
+    'directions': 'direction_id',
+    'disruptions': 'disruption_id',
+}
+
+
+def split_request(request):
+    """Split a bulk departures request into (route_type, stop_id, route_id).
+
+    Parameters
+        request (tuple)
+            (route_type, stop_id) or (route_type, stop_id, route_id)
+    """
+    if len(request) == 2:
+        return request[0], request[1], None
+    route_type, stop_id, route_id = request
+    return route_type, stop_id, route_id
+
+
+def merge_departures(requests, results):
+    """Merge departures responses into a single de-duplicated result.
+
+    Parameters
+        requests (list)
+            The (route_type, stop_id[, route_id]) tuples that were requested
+        results (list)
+            Response dict or raised exception for each request, in the same order
+
+    Returns
+        dict with 'departures' holding every departure, one dict per expansion
+        ('stops', 'routes', 'runs', 'directions', 'disruptions') mapping each
+        id to a single object, and 'errors' listing the requests that failed
+    """
+    merged = {'departures': [], 'errors': []}
+    for key in EXPANSION_IDS:
+        merged[key] = {}
+    for request, result in zip(requests, results):
+        # gather(return_exceptions=True) returns CancelledError, a BaseException.
+        if isinstance(result, BaseException):
+            route_type, stop_id, route_id = split_request(request)
+            merged['errors'].append({
+                'route_type': route_type,
+                'stop_id': stop_id,
+                'route_id': route_id,
+                'error': result,
+            })
+            continue
+        merged['departures'].extend(result.get('departures', []))
+        for key, id_field in EXPANSION_IDS.items():
+            objects = result.get(key) or {}
+            if isinstance(objects, dict):
+                merged[key].update(objects)
+            else:
+                for obj in objects:
+                    merged[key][str(obj[id_field])] = obj
+    return merged
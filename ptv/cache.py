@@ -0,0 +1,322 @@
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib
+
+HOUR = 3600
+
+# Freshness in seconds keyed by the first path segment after the API version.
+DEFAULT_TTLS = {
+    'route_types': 6 * HOUR,
+    'routes': 6 * HOUR,
+    'directions': 6 * HOUR,
+    'stops': 6 * HOUR,
+    'search': HOUR,
+    'runs': 300,
+    'disruptions': 60,
+    'pattern': 30,
+    'departures': 30,
+}
+
+
+def cache_key(path, params):
+    """Build the canonical cache key for a request.
+
+    Parameters
+        path (str)
+            The target path of the URL with leading slash (e.g '/v3/routes')
+        params (dict)
+            Query parameters, excluding devid and signature
+
+    Returns
+        The path followed by the query string with parameters sorted by name (str)
+    """
+    items = sorted((k, v) for k, v in params.items() if k not in ('devid', 'signature'))
+    return path + '?' + urllib.parse.urlencode(items, doseq=True)
+
+
+class CachePolicy(object):
+    """ Per-endpoint freshness policy."""
+
+    def __init__(self, ttls=None, default_ttl=0, stale_while_revalidate=0):
+        """Initialize a CachePolicy.
+
+        Optional Parameters:
+            ttls (dict)
+                Seconds to keep responses keyed by endpoint (e.g. 'routes',
+                'departures'); merged over DEFAULT_TTLS
+            default_ttl (float)
+                Seconds to keep responses for endpoints not listed
+                (default = 0, i.e. not cached)
+            stale_while_revalidate (float)
+                Seconds past expiry during which a stale response is still
+                returned while it is refreshed in the background (default = 0)
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+
+    def ttl_for(self, path):
+        """Return the time to live in seconds for a request path.
+
+        Parameters
+            path (str)
+                The target path of the URL with leading slash (e.g '/v3/routes/1')
+        """
+        segments = path.split('/')
+        endpoint = segments[2] if len(segments) > 2 else ''
+        return self.ttls.get(endpoint, self.default_ttl)
+
+
+class Cache(object):
+    """ Base class for response caches used by the clients."""
+
+    def lookup(self, key):
+        """Look up a key, including entries that are stale but not yet discarded.
+
+        Returns
+            Tuple of (value, fresh) or None on a miss.
+        """
+        raise NotImplementedError
+
+    def get(self, key):
+        """Return the fresh cached value for key, or None on a miss or expiry."""
+        entry = self.lookup(key)
+        if entry is None or not entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl, size=0, stale_ttl=0):
+        """Store a value.
+
+        Parameters
+            key (str)
+                Canonical request key from cache_key()
+            value (dict)
+                Decoded response
+            ttl (float)
+                Seconds the value stays fresh
+            size (int)
+                Size of the encoded response in bytes
+            stale_ttl (float)
+                Seconds past expiry the value is kept and served as stale
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove all entries."""
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    """ Thread-safe in-memory TTL cache with LRU eviction.
+
+    Cached responses are shared between callers and should not be mutated.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, clock=time.monotonic):
+        """Initialize a MemoryCache.
+
+        Optional Parameters:
+            max_entries (int)
+                Maximum number of responses kept (default = 1024)
+            max_bytes (int)
+                Maximum total size of kept responses in bytes (default = unbounded)
+            clock (callable)
+                Returns the current time in seconds (default = time.monotonic)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires, discard_at, size = entry
+            now = self.clock()
+            if discard_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            fresh = now < expires
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return value, fresh
+
+    def set(self, key, value, ttl, size=0, stale_ttl=0):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # Too large to keep; dropping the old entry stops it being served.
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            expires = self.clock() + ttl
+            self._entries[key] = (value, expires, expires + stale_ttl, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return hit, miss and eviction counters with current usage as a dict."""
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+        }
+
+    def _remove(self, key):
+        self.bytes -= self._entries.pop(key)[3]
+
+
+class SQLiteCache(Cache):
+    """ Persistent cache stored in a SQLite database.
+
+    Entries survive restarts and the database may be shared by several
+    worker processes on one host. Expiry uses wall-clock time so that all
+    processes agree on freshness.
+    """
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS responses ('
+        'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, '
+        'discard_at REAL NOT NULL, size INTEGER NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS responses_discard_at ON responses (discard_at)',
+    )
+
+    def __init__(self, path, max_entries=None, clock=time.time, purge_interval=100):
+        """Initialize a SQLiteCache.
+
+        Parameters
+            path (str)
+                Location of the database file; created if missing
+
+        Optional Parameters:
+            max_entries (int)
+                Maximum number of responses kept, enforced on every write;
+                entries closest to being discarded are evicted first
+                (default = unbounded)
+            clock (callable)
+                Returns the current wall-clock time in seconds (default = time.time)
+            purge_interval (int)
+                Number of writes between purges of discarded entries (default = 100)
+        """
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.clock = clock
+        self.purge_interval = purge_interval
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads; keep one per thread.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def lookup(self, key):
+        row = self._connect().execute(
+            'SELECT value, expires, discard_at FROM responses WHERE key = ?', (key,)).fetchone()
+        now = self.clock()
+        if row is None or row[2] <= now:
+            with self._lock:
+                self.misses += 1
+            return None
+        fresh = now < row[1]
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return json.loads(row[0]), fresh
+
+    def set(self, key, value, ttl, size=0, stale_ttl=0):
+        encoded = json.dumps(value, separators=(',', ':'))
+        expires = self.clock() + ttl
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+            (key, encoded, expires, expires + stale_ttl, size or len(encoded)))
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_interval == 0
+        if purge:
+            self.purge()
+        elif self.max_entries is not None:
+            self._evict(conn)
+
+    def purge(self):
+        """Delete discarded entries and enforce max_entries."""
+        conn = self._connect()
+        conn.execute('DELETE FROM responses WHERE discard_at <= ?', (self.clock(),))
+        if self.max_entries is not None:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM responses WHERE key IN ('
+            'SELECT key FROM responses ORDER BY discard_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM responses')
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def stats(self):
+        """Return hit and miss counters for this process with the current entry count as a dict."""
+        with self._lock:
+            counters = {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+            }
+        counters['entries'] = len(self)
+        return counters
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import urllib
+
+from .cache import cache_key
+from .transport import RequestsTransport
+from .transport import Response
+from .transport import Transport
+
+CASSETTE_VERSION = 1
+
+# Response headers kept in cassettes; the rest vary between runs or identify the caller.
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+
+def request_key(url):
+    """Return the canonical key of a signed URL.
+
+    The key is the path followed by the query sorted by name, without
+    devid and signature, so cassettes hold no credentials and match
+    whatever key replays them.
+    """
+    parts = urllib.parse.urlsplit(url)
+    return cache_key(parts.path, urllib.parse.parse_qs(parts.query, keep_blank_values=True))
+
+
+class Cassette(object):
+    """ Recorded responses keyed by request_key.
+
+    A request recorded several times replays its responses in order,
+    repeating the last one once they are used up.
+    """
+
+    def __init__(self, interactions=None):
+        """Initialize a Cassette.
+
+        Optional Parameters:
+            interactions (list)
+                Dicts with 'request', 'status', 'headers' and 'body' keys
+        """
+        self.interactions = list(interactions or [])
+        self._responses = {}
+        self._played = {}
+        self._lock = threading.Lock()
+        for interaction in self.interactions:
+            self._responses.setdefault(interaction['request'], []).append(interaction)
+
+    @classmethod
+    def load(cls, path):
+        """Read a cassette written by save()."""
+        with open(path, encoding='UTF-8') as f:
+            cassette = json.load(f)
+        if cassette.get('version') != CASSETTE_VERSION:
+            raise ValueError('Unsupported cassette version: {}'.format(cassette.get('version')))
+        return cls(cassette['interactions'])
+
+    def save(self, path):
+        """Atomically write the cassette to a JSON file."""
+        with self._lock:
+            cassette = {'version': CASSETTE_VERSION, 'interactions': list(self.interactions)}
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(cassette, f, indent=1)
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def __contains__(self, key):
+        return key in self._responses
+
+    def record(self, url, response):
+        """Add the response to a request."""
+        headers = {name: response.headers[name] for name in RECORDED_HEADERS
+            if name in response.headers}
+        interaction = {
+            'request': request_key(url),
+            'status': response.status_code,
+            'headers': headers,
+            'body': response.content.decode('UTF-8'),
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+            self._responses.setdefault(interaction['request'], []).append(interaction)
+
+    def play(self, key):
+        """Return the next (status, headers, body bytes) recorded for key, or None."""
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                return None
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+            interaction = responses[min(played, len(responses) - 1)]
+        return interaction['status'], interaction['headers'], interaction['body'].encode('UTF-8')
+
+
+class RecordingTransport(Transport):
+    """ Transport that passes requests through and records every response."""
+
+    def __init__(self, path, transport=None):
+        """Initialize a RecordingTransport.
+
+        Parameters
+            path (str)
+                Cassette file, extended if it exists and written on close()
+
+        Optional Parameters:
+            transport (Transport)
+                Transport making the real requests (default = RequestsTransport())
+        """
+        self.path = path
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.cassette = Cassette.load(path) if os.path.exists(path) else Cassette()
+
+    def get(self, url):
+        response = self.transport.get(url)
+        self.cassette.record(url, response)
+        return response
+
+    def save(self):
+        """Write the cassette recorded so far."""
+        self.cassette.save(self.path)
+
+    def close(self):
+        self.save()
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """ Transport answering every request from a cassette, without network access."""
+
+    def __init__(self, cassette):
+        """Initialize a ReplayTransport.
+
+        Parameters
+            cassette (Cassette or str)
+                Cassette, or path of a cassette file
+
+        Raises
+            KeyError from get() for requests that were not recorded
+        """
+        self.cassette = Cassette.load(cassette) if isinstance(cassette, str) else cassette
+
+    def get(self, url):
+        key = request_key(url)
+        recorded = self.cassette.play(key)
+        if recorded is None:
+            raise KeyError('No recorded response for {}'.format(key))
+        status, headers, body = recorded
+        return Response(status, body, headers, url=url)
@@ -0,0 +1,303 @@
+"""Command-line interface to the PTV Timetable API.
+
+Every endpoint of PTVClient is a sub-command (e.g. ``ptv departures train 1071``)
+printing the response as JSON, or as NDJSON with one object of the
+endpoint's main collection per line. ``ptv daemon`` keeps one client, with
+pooled connections and a warm cache, behind a Unix socket; other
+invocations hand their call to it when it is running and make it
+themselves otherwise.
+
+Only the standard library is imported until a call is made in process.
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import stat
+import sys
+
+ROUTE_TYPES = ('train', 'tram', 'bus', 'vline', 'night_bus')
+
+# Sub-command: (help, PTVClient method, positional arguments, options,
+# collection printed one per line by --format ndjson). Arguments are
+# (parameter, kind) and only options given on the command line are passed.
+COMMANDS = {
+    'departures': ('Departures from a stop', 'get_departure_from_stop',
+        [('route_type', 'route_type'), ('stop_id', 'int')],
+        [('route_id', 'int'), ('platform_numbers', 'ints'), ('direction_id', 'int'),
+            ('date_utc', 'str'), ('max_results', 'int'), ('gtfs', 'flag'),
+            ('include_cancelled', 'flag'), ('expand', 'strs')],
+        'departures'),
+    'directions': ('Directions a route travels in', 'get_direction_for_route',
+        [('route_id', 'int')], [], 'directions'),
+    'direction': ('Routes that travel in a direction', 'get_direction',
+        [('direction_id', 'int')], [], 'directions'),
+    'direction-for-route-type': ('Routes of a route type that travel in a direction',
+        'get_direction_for_route_type', [('direction_id', 'int'), ('route_type', 'route_type')],
+        [], 'directions'),
+    'disruptions': ('All disruptions', 'get_disruptions', [], [], 'disruptions'),
+    'disruptions-on-route': ('Disruptions on a route', 'get_disruptions_on_route',
+        [('route_id', 'int')], [('disruption_status', 'str')], 'disruptions'),
+    'disruption': ('A disruption', 'get_disruption', [('disruption_id', 'int')], [], None),
+    'pattern': ('Stopping pattern of a run', 'get_stopping_pattern_for_run',
+        [('run_id', 'int'), ('route_type', 'route_type')],
+        [('stop_id', 'int'), ('date_utc', 'str')], 'departures'),
+    'routes': ('All routes', 'get_routes', [],
+        [('route_types', 'route_types'), ('route_name', 'str')], 'routes'),
+    'route': ('A route', 'get_route', [('route_id', 'int')], [], None),
+    'route-types': ('Route types and their names', 'get_route_types', [], [], 'route_types'),
+    'runs': ('Runs on a route', 'get_runs_for_route', [('route_id', 'int')], [], 'runs'),
+    'run': ('Runs with a run ID', 'get_run', [('run_id', 'int')], [], 'runs'),
+    'run-for-route-type': ('A run of a route type', 'get_run_for_route_type',
+        [('run_id', 'int'), ('route_type', 'route_type')], [], None),
+    'search': ('Stops, routes and outlets matching a search term', 'search',
+        [('search_term', 'str')],
+        [('route_types', 'route_types'), ('latitude', 'float'), ('longitude', 'float'),
+            ('max_distance', 'float'), ('include_outlets', 'no_flag')],
+        None),
+    'stop': ('A stop', 'get_stop', [('stop_id', 'int'), ('route_type', 'route_type')],
+        [('stop_location', 'flag'), ('stop_amenities', 'flag'), ('stop_accessibility', 'flag')],
+        None),
+    'stops': ('Stops on a route', 'get_stops', [('route_id', 'int'), ('route_type', 'route_type')],
+        [], 'stops'),
+    'stops-near': ('Stops near a location', 'get_stop_near_location',
+        [('latitude', 'float'), ('longitude', 'float')],
+        [('route_types', 'route_types'), ('max_results', 'int'), ('max_distance', 'float')],
+        'stops'),
+}
+
+
+def default_socket():
+    """Return the daemon's socket path: $PTV_SOCKET, else ptv.sock in
+    $XDG_RUNTIME_DIR, else in a private /tmp/ptv-<uid> directory."""
+    if os.environ.get('PTV_SOCKET'):
+        return os.environ['PTV_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = '/tmp/ptv-{}'.format(os.getuid() if hasattr(os, 'getuid') else 'user')
+    return os.path.join(directory, 'ptv.sock')
+
+
+def owned_socket(path):
+    """Return whether path is a Unix socket owned by the current user.
+
+    Raises FileNotFoundError when nothing is at path.
+    """
+    info = os.lstat(path)
+    return stat.S_ISSOCK(info.st_mode) and (not hasattr(os, 'getuid') or
+        info.st_uid == os.getuid())
+
+
+def key_fingerprint(api_key):
+    """Return a digest identifying an API key without revealing it."""
+    return hashlib.sha256(bytes(api_key, 'UTF-8')).hexdigest()
+
+
+def _route_type(value):
+    value = value.lower().replace('-', '_')
+    if value.isdigit() and int(value) < len(ROUTE_TYPES):
+        return int(value)
+    if value in ROUTE_TYPES:
+        return ROUTE_TYPES.index(value)
+    raise argparse.ArgumentTypeError('invalid route type {!r} (choose from {} or 0-{})'.format(
+        value, ', '.join(ROUTE_TYPES), len(ROUTE_TYPES) - 1))
+
+
+_TYPES = {'int': int, 'float': float, 'str': str, 'route_type': _route_type}
+
+
+def _add_argument(parser, name, kind, option):
+    flag = '--' + name.replace('_', '-')
+    if kind == 'flag':
+        parser.add_argument(flag, dest=name, action='store_true', default=argparse.SUPPRESS)
+    elif kind == 'no_flag':
+        parser.add_argument('--no-' + name.replace('_', '-'), dest=name, action='store_false',
+            default=argparse.SUPPRESS)
+    elif not option:
+        parser.add_argument(name, type=_TYPES[kind])
+    elif kind in _TYPES:
+        parser.add_argument(flag, dest=name, type=_TYPES[kind], default=argparse.SUPPRESS)
+    else:
+        parser.add_argument(flag, dest=name, type=_TYPES[kind[:-1]], nargs='+',
+            default=argparse.SUPPRESS)
+
+
+def _parser():
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument('--socket', default=default_socket(),
+        help='daemon socket (default = $PTV_SOCKET, or ptv.sock in $XDG_RUNTIME_DIR or /tmp/ptv-<uid>)')
+    connection.add_argument('--dev-id', default=os.environ.get('PTV_DEV_ID'),
+        help='developer ID (default = $PTV_DEV_ID)')
+    connection.add_argument('--api-key', default=os.environ.get('PTV_API_KEY'),
+        help='API key (default = $PTV_API_KEY)')
+    connection.add_argument('--base-url', help='API to call (default = the PTV Timetable API)')
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('-f', '--format', choices=('json', 'ndjson'), default='json',
+        help='json prints the response, ndjson one object of its main collection per line')
+    output.add_argument('--indent', type=int, help='indent json output')
+    output.add_argument('--no-daemon', action='store_true', help='always call from this process')
+
+    parser = argparse.ArgumentParser(prog='ptv', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    for command, (summary, method, arguments, options, collection) in COMMANDS.items():
+        subparser = commands.add_parser(command, help=summary, description=summary,
+            parents=[output, connection])
+        for name, kind in arguments:
+            _add_argument(subparser, name, kind, False)
+        for name, kind in options:
+            _add_argument(subparser, name, kind, True)
+    daemon = commands.add_parser('daemon', parents=[connection],
+        help='Serve calls from a warm client on a Unix socket',
+        description='Serve calls from a warm client on a Unix socket until interrupted.')
+    daemon.add_argument('--max-entries', type=int, default=4096,
+        help='responses kept in the cache (default = 4096)')
+    return parser
+
+
+def call(client, command, kwargs):
+    """Make a sub-command's call.
+
+    Parameters
+        client (PTVClient)
+            Client to call with
+        command (str)
+            Name of the sub-command
+        kwargs (dict)
+            Parameters of the client method, with route types as numbers
+
+    Returns
+        The response (dict)
+    """
+    from .client import RouteType
+    kwargs = dict(kwargs)
+    if 'route_type' in kwargs:
+        kwargs['route_type'] = RouteType(kwargs['route_type'])
+    if 'route_types' in kwargs:
+        kwargs['route_types'] = [RouteType(value) for value in kwargs['route_types']]
+    return getattr(client, COMMANDS[command][1])(**kwargs)
+
+
+def format_output(result, collection=None, format='json', indent=None):
+    """Return a response as the text printed by the CLI.
+
+    Parameters
+        result (dict)
+            The response
+
+    Optional Parameters:
+        collection (str)
+            Member listed one object per line by ndjson; disruptions grouped
+            by mode are flattened (default = print the response on one line)
+        format (str)
+            'json' or 'ndjson' (default = 'json')
+        indent (int)
+            Indent of json output (default = compact)
+    """
+    if format == 'ndjson':
+        items = result.get(collection) if collection else None
+        if isinstance(items, dict):
+            items = [item for group in items.values() for item in group]
+        if not isinstance(items, list):
+            items = [result]
+        return ''.join(json.dumps(item) + '\n' for item in items)
+    return json.dumps(result, indent=indent) + '\n'
+
+
+def describe_error(error):
+    """Return (message, HTTP status or None) for an exception raised by a call."""
+    response = getattr(error, 'response', None)
+    return str(error) or type(error).__name__, getattr(response, 'status_code', None)
+
+
+def _send(path, request):
+    """Hand a call to the daemon, returning (header, output), or None when none is
+    listening or it serves other credentials."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        if not owned_socket(path):
+            # Anyone else's socket could answer with made-up data.
+            sys.stderr.write('ptv: ignoring {}: not a socket owned by you\n'.format(path))
+            return None
+    except FileNotFoundError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        sock.sendall(json.dumps(request).encode('UTF-8') + b'\n')
+        with sock.makefile('rb') as f:
+            header = json.loads(f.readline())
+            if header.get('mismatch'):
+                return None
+            return header, f.read().decode('UTF-8')
+    finally:
+        sock.close()
+
+
+def _client(args, **kwargs):
+    from .client import PTVClient
+    if args.base_url:
+        kwargs['base_url'] = args.base_url
+    return PTVClient(args.dev_id, args.api_key, **kwargs)
+
+
+def _serve(args):
+    import signal
+    from .cache import MemoryCache
+    from .daemon import Daemon
+    from .retry import RetryPolicy
+    client = _client(args, cache=MemoryCache(max_entries=args.max_entries),
+        retry_policy=RetryPolicy())
+    daemon = Daemon(client, args.socket)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write('ptv: listening on {}\n'.format(args.socket))
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        client.close()
+    return 0
+
+
+def main(argv=None):
+    """Run the ptv command, returning its exit status."""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    missing_key = not (args.dev_id and args.api_key)
+    if args.command == 'daemon':
+        if missing_key:
+            parser.error('--dev-id and --api-key (or PTV_DEV_ID and PTV_API_KEY) are required')
+        return _serve(args)
+    summary, method, arguments, options, collection = COMMANDS[args.command]
+    kwargs = {name: getattr(args, name) for name, kind in arguments + options if hasattr(args, name)}
+    reply = None
+    if not args.no_daemon:
+        # The daemon only answers for the credentials and API it was started with.
+        reply = _send(args.socket, {'command': args.command, 'kwargs': kwargs,
+            'format': args.format, 'indent': args.indent, 'dev_id': args.dev_id,
+            'key': key_fingerprint(args.api_key) if args.api_key else None,
+            'base_url': args.base_url})
+    if reply is None:
+        if missing_key:
+            parser.error('--dev-id and --api-key (or PTV_DEV_ID and PTV_API_KEY) are required '
+                'when no daemon is running')
+        try:
+            with _client(args) as client:
+                reply = {'error': None}, format_output(call(client, args.command, kwargs),
+                    collection, args.format, args.indent)
+        except Exception as e:
+            message, status = describe_error(e)
+            reply = {'error': message, 'status': status}, ''
+    header, output = reply
+    if header['error'] is not None:
+        sys.stderr.write('ptv: {}\n'.format(header['error']))
+        return 1
+    sys.stdout.write(output)
+    return 0
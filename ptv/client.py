@@ -1,11 +1,78 @@
-from hashlib import sha1
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-import hmac
-import requests
+import logging
+import threading
+import time
 import urllib
 
+from .bulk import merge_departures
+from .bulk import split_request
+from .cache import CachePolicy
+from .cache import cache_key
+from .credentials import Credential
+from .metrics import CallEvent
+from .metrics import HIT
+from .metrics import MISS
+from .metrics import STALE
+from .models import COLLECTION_MODELS
+from .models import parse_response
+from .singleflight import SingleFlight
+from .stream import iter_items
+from .timetable import walk_departures
+from .transport import RequestsTransport
+from .watch import watch_departures
+
 API_VER = '/v3/'
 BASE_URL = 'https://timetableapi.ptv.vic.gov.au'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+class Endpoint(object):
+    """ A path template compiled once at import time."""
+    __slots__ = ('template', 'collection', '_format')
+
+    def __init__(self, template, collection=None):
+        """Initialize an Endpoint.
+
+        Parameters
+            template (str)
+                Path below API_VER with {} placeholders (e.g. 'routes/{}')
+
+        Optional Parameters:
+            collection (str)
+                Response member holding the endpoint's main array, if any
+        """
+        self.template = template
+        self.collection = collection
+        self._format = (API_VER + template).replace('%', '%%').replace('{}', '%s')
+
+    def path(self, *args):
+        """Return the request path with the placeholders filled in."""
+        return self._format % args
+
+    def __repr__(self):
+        return 'Endpoint({!r})'.format(self.template)
+
+DEPARTURES = Endpoint('departures/route_type/{}/stop/{}', 'departures')
+DEPARTURES_FOR_ROUTE = Endpoint('departures/route_type/{}/stop/{}/route/{}', 'departures')
+DIRECTIONS_FOR_ROUTE = Endpoint('directions/route/{}', 'directions')
+DIRECTION = Endpoint('directions/{}', 'directions')
+DIRECTION_FOR_ROUTE_TYPE = Endpoint('directions/{}/route_type/{}', 'directions')
+DISRUPTIONS = Endpoint('disruptions', 'disruptions')
+DISRUPTIONS_FOR_ROUTE = Endpoint('disruptions/route/{}', 'disruptions')
+DISRUPTION = Endpoint('disruptions/{}')
+PATTERN_FOR_RUN = Endpoint('pattern/run/{}/route_type/{}', 'departures')
+ROUTES = Endpoint('routes', 'routes')
+ROUTE = Endpoint('routes/{}')
+ROUTE_TYPES = Endpoint('route_types', 'route_types')
+RUNS_FOR_ROUTE = Endpoint('runs/route/{}', 'runs')
+RUN = Endpoint('runs/{}', 'runs')
+RUN_FOR_ROUTE_TYPE = Endpoint('runs/{}/route_type/{}')
+SEARCH = Endpoint('search/{}')
+STOP = Endpoint('stops/{}/route_type/{}')
+STOPS_FOR_ROUTE = Endpoint('stops/route/{}/route_type/{}', 'stops')
+STOPS_NEAR_LOCATION = Endpoint('stops/location/{},{}', 'stops')
 
 class RouteType(Enum):
     """ Enum for Route Types and their IDs."""
@@ -15,20 +82,89 @@ class RouteType(Enum):
     VLINE = 3
     NIGHT_BUS = 4
 
-class PTVClient(object):
-    """ Class to make calls to PTV API."""
+class BaseClient(object):
+    """ Endpoint definitions and request signing shared by PTVClient and AsyncPTVClient.
 
-    def __init__(self,dev_id, api_key):
-        """Initialize a PTVClient.
+    Subclasses implement _api_call; every endpoint method returns whatever
+    _api_call returns (a dict for PTVClient, a coroutine for AsyncPTVClient).
+    """
+
+    def __init__(self, dev_id=None, api_key=None, base_url=BASE_URL, cache=None, cache_policy=None,
+        rate_limiter=None, retry_policy=None, models=False, json_loads=None, observers=None,
+        credentials=None, entities=None):
+        """Initialize a BaseClient.
 
         Parameters
             dev_id (str)
-                Developer ID from PTV
+                Developer ID from PTV (may be None with credentials)
             api_key (str)
-                API key from PTV
+                API key from PTV (may be None with credentials)
+
+        Optional Parameters:
+            base_url (str)
+                Scheme and host of the API (default = BASE_URL)
+            cache (Cache)
+                Response cache consulted before every request (default = no caching)
+            cache_policy (CachePolicy)
+                Per-endpoint freshness used with cache (default = CachePolicy())
+            rate_limiter (RateLimiter)
+                Token bucket consulted before every request sent (default = unlimited)
+            retry_policy (RetryPolicy)
+                Policy for retrying failed requests (default = no retries)
+            models (bool)
+                Return Departure, Run, Stop, Route, Direction and Disruption
+                objects in place of dicts (default = false)
+            json_loads (callable)
+                Decoder taking the response body as bytes, e.g. orjson.loads
+                (default = the transport's json())
+            observers (callable [])
+                Called with a CallEvent after every endpoint method call, e.g.
+                a MetricsCollector (default = none)
+            credentials (CredentialPool)
+                Keys that requests are spread across, each signed with its
+                own key; with rate_limiter, each request uses the key that
+                can send soonest (default = dev_id and api_key only)
+            entities (EntityStore)
+                Store that responses are normalised into, so stops, routes,
+                runs, directions and disruptions are held once per id and
+                shared between responses (default = none)
         """
-        self.dev_id = dev_id
+        if dev_id is None or api_key is None:
+            if credentials is None:
+                raise ValueError('dev_id and api_key are required unless credentials are given')
+            dev_id, api_key = credentials.credentials[0].dev_id, credentials.credentials[0].api_key
+        self.credentials = credentials
+        self.entities = entities
+        self._dev_id = dev_id
         self.api_key = api_key
+        self.base_url = base_url
+        self.cache = cache
+        self.cache_policy = cache_policy if cache_policy is not None else CachePolicy()
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.models = models
+        self.json_loads = json_loads
+        self.observers = list(observers or [])
+        self._refreshing = set()
+
+    @property
+    def dev_id(self):
+        return self._dev_id
+
+    @dev_id.setter
+    def dev_id(self, dev_id):
+        self._dev_id = dev_id
+        self.credential = Credential(dev_id, self._api_key)
+
+    @property
+    def api_key(self):
+        return self._api_key
+
+    @api_key.setter
+    def api_key(self, api_key):
+        # The credential keeps the keyed HMAC state, built once per key.
+        self._api_key = api_key
+        self.credential = Credential(self._dev_id, api_key)
 
     def _computeSignature(self,path):
         """Utility method to compute signature from url
@@ -40,12 +176,45 @@ class PTVClient(object):
         Returns
             The hex signature. (str)
         """
-        key = bytes(self.api_key, 'UTF-8')
-        raw = bytes(path, 'UTF-8')
-        return hmac.new(key, raw, sha1).hexdigest().upper()
+        return self.credential.sign(path)
 
-    def _api_call(self, path, params={}):
-        """Create URL and call API
+    def _build_url(self, path, params=None, credential=None):
+        """Create the signed URL for a request
+
+        Parameters:
+            path (str)
+                The endpoint we are calling
+            params (dict)
+                Dictionary containing parameters to be passed in the query;
+                not modified
+            credential (Credential)
+                Key to sign with (default = the client's dev_id and api_key)
+
+        Returns
+            The full URL including devid and signature (str)
+        """
+        if credential is None:
+            credential = self.credential
+        if params:
+            signed = path + '?' + urllib.parse.urlencode(params, doseq=True) + '&' + credential.devid_query
+        else:
+            signed = path + '?' + credential.devid_query
+        return ''.join((self.base_url, signed, '&signature=', credential.sign(signed)))
+
+    def _reserve(self):
+        """Choose the key for a request and charge the rate limiter for it.
+
+        Returns
+            Tuple of (Credential, seconds to wait before sending)
+        """
+        if self.credentials is not None:
+            return self.credentials.reserve(self.rate_limiter)
+        if self.rate_limiter is not None:
+            return self.credential, self.rate_limiter.reserve(self.dev_id)
+        return self.credential, 0
+
+    def _cache_lookup(self, path, params):
+        """Look up a request in the cache
 
         Parameters:
             path (str)
@@ -54,14 +223,111 @@ class PTVClient(object):
                 Dictionary containing parameters to be passed in the query
 
         Returns
-            JSON from response as dict
+            Tuple of (key, ttl, value, fresh). key is None when the request is
+            not cacheable and value is None on a miss.
+        """
+        if self.cache is None:
+            return None, 0, None, False
+        ttl = self.cache_policy.ttl_for(path)
+        if not ttl:
+            return None, 0, None, False
+        key = cache_key(path, params)
+        entry = self.cache.lookup(key)
+        if entry is None:
+            return key, ttl, None, False
+        return key, ttl, entry[0], entry[1]
+
+    def _cache_store(self, key, ttl, result, size):
+        """Store a response in the cache, keeping it as stale per the cache policy."""
+        self.cache.set(key, result, ttl, size, self.cache_policy.stale_while_revalidate)
+
+    def _loads(self, response):
+        return self.json_loads(response.content) if self.json_loads is not None else response.json()
+
+    def _decode(self, response, event=None):
+        """Decode a response body as JSON, timing it when an event is given, and
+        normalise it into the entity store, if any."""
+        if event is None:
+            result = self._loads(response)
+        else:
+            started = time.perf_counter()
+            try:
+                result = self._loads(response)
+            finally:
+                event.decode_time = time.perf_counter() - started
+        if self.entities is not None:
+            result = self.entities.normalize(result)
+        return result
+
+    def add_observer(self, observer):
+        """Call observer with a CallEvent after every endpoint method call."""
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _start_event(self, path, endpoint, params=None):
+        """Return a CallEvent for a call, or None when nothing observes calls."""
+        if not self.observers:
+            return None
+        return CallEvent(endpoint.template if endpoint is not None else path, path, params)
+
+    def _finish_event(self, event, started, error=None):
+        """Complete a call's event and pass it to every observer.
+
+        Exceptions raised by observers are logged rather than propagated.
+        """
+        event.duration = time.perf_counter() - started
+        event.error = error
+        # A call that missed the cache without sending a request shared another call's.
+        event.coalesced = event.requests == 0 and event.cache not in (HIT, STALE)
+        for observer in list(self.observers):
+            try:
+                observer(event)
+            except Exception:
+                logger.warning('Observer %r failed', observer, exc_info=True)
+
+    def _result(self, result, cached=False):
+        """Convert a decoded response into the type requested by the caller.
+
+        Cached responses are normalised into the entity store without
+        refreshing it, since they may be older than what it holds.
+        """
+        if self.entities is None:
+            return parse_response(result) if self.models else result
+        if cached:
+            result = self.entities.normalize(result, refresh=False)
+        return parse_response(result, self.entities) if self.models else result
+
+    def _retry_delay(self, attempt, started, response=None, error=None):
+        """Seconds to wait before retrying a request, or None to stop
+
+        Parameters:
+            attempt (int)
+                Number of retries already made
+            started (float)
+                time.monotonic() when the first attempt started
+            response
+                Response received, if any
+            error (Exception)
+                Exception raised by the transport, if any
+        """
+        if self.retry_policy is None:
+            return None
+        return self.retry_policy.delay(attempt, time.monotonic() - started, response, error)
+
+    def _api_call(self, path, params=None, endpoint=None):
+        """Call API. Implemented by subclasses.
+
+        Parameters:
+            path (str)
+                The endpoint we are calling
+            params (dict)
+                Dictionary containing parameters to be passed in the query
+            endpoint (Endpoint)
+                Template the path was built from
         """
-        params["devid"] = self.dev_id
-        query = "?" + urllib.parse.urlencode(params,doseq=True)
-        url = BASE_URL + path + query + '&signature=' + self._computeSignature(path + query)
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        raise NotImplementedError
 
     # Departures
     def get_departure_from_stop(self, route_type, stop_id, route_id=None, platform_numbers=[],
@@ -95,11 +361,12 @@ class PTVClient(object):
                 List objects to be returned in full (i.e. expanded)
                 - options include: all, stop, route, run, direction, disruption
         """
-        path = API_VER + 'departures/route_type/{}/stop/{}'
-        path = path.format(route_type.value,stop_id)
         if route_id:
-            path += '/route/{}'
-            path = path.format(route_id)
+            endpoint = DEPARTURES_FOR_ROUTE
+            path = endpoint.path(route_type.value, stop_id, route_id)
+        else:
+            endpoint = DEPARTURES
+            path = endpoint.path(route_type.value, stop_id)
         params = {}
         if len(platform_numbers) > 0:
             params["platform_numbers"] = platform_numbers
@@ -115,7 +382,7 @@ class PTVClient(object):
             params["include_cancelled"] = str(True).lower()
         if expand:
             params["expand"] = expand
-        return self._api_call(path, params)
+        return self._api_call(path, params, endpoint)
 
     # Directions
     def get_direction_for_route(self, route_id):
@@ -125,9 +392,8 @@ class PTVClient(object):
             route_id (int)
                 Identifier of route
         """
-        path = API_VER + 'directions/route/{}'
-        path = path.format(route_id)
-        return self._api_call(path)
+        path = DIRECTIONS_FOR_ROUTE.path(route_id)
+        return self._api_call(path, endpoint=DIRECTIONS_FOR_ROUTE)
 
     def get_direction(self, direction_id):
         """Get All routes that travel in the specified direction.
@@ -136,9 +402,8 @@ class PTVClient(object):
             direction_id (int)
                 Identifier of direction of travel
         """
-        path = API_VER + 'directions/{}'
-        path = path.format(direction_id)
-        return self._api_call(path)
+        path = DIRECTION.path(direction_id)
+        return self._api_call(path, endpoint=DIRECTION)
 
     def get_direction_for_route_type(self, direction_id, route_type):
         """Get All routes of the specified route type that travel in the specified direction.
@@ -149,15 +414,14 @@ class PTVClient(object):
             route_type (RouteType enum)
                 Type of Transport
         """
-        path = API_VER + 'directions/{}/route_type/{}'
-        path = path.format(direction_id, route_type.value)
-        return self._api_call(path)
+        path = DIRECTION_FOR_ROUTE_TYPE.path(direction_id, route_type.value)
+        return self._api_call(path, endpoint=DIRECTION_FOR_ROUTE_TYPE)
 
     # Disruptions
     def get_disruptions(self):
         """Get All disruption information for all route types."""
-        path = API_VER + 'disruptions'
-        return self._api_call(path)
+        path = DISRUPTIONS.path()
+        return self._api_call(path, endpoint=DISRUPTIONS)
 
     def get_disruptions_on_route(self, route_id, disruption_status=None):
         """Get All disruption information (if any exists) for the specified route.
@@ -170,14 +434,13 @@ class PTVClient(object):
             Filter by status of disruption_status
             Options: 'current' or 'planned'
         """
-        path = API_VER + 'disruptions/route/{}'
-        path = path.format(route_id)
+        path = DISRUPTIONS_FOR_ROUTE.path(route_id)
         params = {}
         if disruption_status:
             if disruption_status.lower() not in ['current', 'planned']:
                 raise TypeError('Only \"current\" and \"planned\" allowed for disruption_status')
             params["disruption_status"] = disruption_status.lower()
-        return self._api_call(path, params)
+        return self._api_call(path, params, DISRUPTIONS_FOR_ROUTE)
 
     def get_disruption(self, disruption_id):
         """Get Disruption information for the specified disruption ID.
@@ -186,9 +449,8 @@ class PTVClient(object):
             disruption_id (int)
                 Identifier of disruption
         """
-        path = API_VER + 'disruptions/{}'
-        path = path.format(disruption_id)
-        return self._api_call(path)
+        path = DISRUPTION.path(disruption_id)
+        return self._api_call(path, endpoint=DISRUPTION)
 
     # Patterns
     def get_stopping_pattern_for_run(self, run_id, route_type, stop_id=None, date_utc=None):
@@ -205,14 +467,13 @@ class PTVClient(object):
             date_utc (datetime)
                 Filter by the date and time of the request (ISO 8601 UTC format)
         """
-        path = API_VER + 'pattern/run/{}/route_type/{}'
-        path = path.format(run_id, route_type.value)
+        path = PATTERN_FOR_RUN.path(run_id, route_type.value)
         params = {}
         if stop_id:
             params['stop_id'] = stop_id
         if date_utc:
             params['date_utc'] = date_utc
-        return self._api_call(path, params)
+        return self._api_call(path, params, PATTERN_FOR_RUN)
 
     # Routes
     def get_routes(self, route_types=[], route_name=None):
@@ -224,13 +485,13 @@ class PTVClient(object):
             route_name (str)
                 Filter by name of route
         """
-        path = API_VER + 'routes'
+        path = ROUTES.path()
         params = {}
         if route_name:
             params["route_name"] = route_name
         if len(route_types) > 0:
             params["route_types"] = list(map(lambda x: x.value, route_types))
-        return self._api_call(path, params)
+        return self._api_call(path, params, ROUTES)
 
     def get_route(self, route_id):
         """Get the route name and number for the specified route ID
@@ -239,16 +500,15 @@ class PTVClient(object):
             route_id (int)
                 Identifier of route
         """
-        path = API_VER + 'routes/{}'
-        path = path.format(route_id)
-        return self._api_call(path)
+        path = ROUTE.path(route_id)
+        return self._api_call(path, endpoint=ROUTE)
 
     # Route Types
     def get_route_types(self):
         """Get all route types (i.e. identifiers of transport modes) and their names
         """
-        path = API_VER + 'route_types'
-        return self._api_call(path)
+        path = ROUTE_TYPES.path()
+        return self._api_call(path, endpoint=ROUTE_TYPES)
 
     # Runs
     def get_runs_for_route(self, route_id):
@@ -258,9 +518,8 @@ class PTVClient(object):
             route_id (int)
                 Identifier of route
         """
-        path = API_VER + 'runs/route/{}'
-        path = path.format(route_id)
-        return self._api_call(path)
+        path = RUNS_FOR_ROUTE.path(route_id)
+        return self._api_call(path, endpoint=RUNS_FOR_ROUTE)
 
     def get_run(self, run_id):
         """Get All trip/service run details for the specified run ID.
@@ -269,9 +528,8 @@ class PTVClient(object):
             run_id (int)
                 Identifier of a trip/service run
         """
-        path = API_VER + 'runs/{}'
-        path = path.format(run_id)
-        return self._api_call(path)
+        path = RUN.path(run_id)
+        return self._api_call(path, endpoint=RUN)
 
     def get_run_for_route_type(self, run_id, route_type):
         """Get The trip/service run details for the run ID and route type specified.
@@ -282,9 +540,8 @@ class PTVClient(object):
             route_type (RouteType enum)
                 Type of Transport
         """
-        path = API_VER + 'runs/{}/route_type/{}'
-        path = path.format(run_id, route_type.value)
-        return self._api_call(path)
+        path = RUN_FOR_ROUTE_TYPE.path(run_id, route_type.value)
+        return self._api_call(path, endpoint=RUN_FOR_ROUTE_TYPE)
 
     # Search
     def search(self, search_term, route_types=[], latitude=None, longitude=None,
@@ -310,7 +567,7 @@ class PTVClient(object):
             include_outlets (bool)
                 Indicates if outlets will be returned in response (default = true)
         """
-        path = API_VER + 'search/' + urllib.parse.quote(search_term)
+        path = SEARCH.path(urllib.parse.quote(search_term))
         params = {}
         if len(route_types) > 0:
             params['route_types'] = list(map(lambda x: x.value, route_types))
@@ -321,7 +578,7 @@ class PTVClient(object):
         if max_distance:
             params['max_distance'] = max_distance
         params['include_outlets'] = str(include_outlets).lower()
-        return self._api_call(path, params)
+        return self._api_call(path, params, SEARCH)
 
     # Stops
     def get_stop(self, stop_id, route_type, stop_location=False,
@@ -343,13 +600,12 @@ class PTVClient(object):
             stop_accessibility (bool)
                 Indicates if stop accessibility information will be returned (default = false)
         """
-        path = API_VER + 'stops/{}/route_type/{}'
-        path = path.format(stop_id, route_type.value)
+        path = STOP.path(stop_id, route_type.value)
         params = {}
         params['stop_location'] = str(stop_location).lower()
         params['stop_amenities'] = str(stop_amenities).lower()
         params['stop_accessibility'] = str(stop_accessibility).lower()
-        return self._api_call(path, params)
+        return self._api_call(path, params, STOP)
 
     def get_stops(self, route_id, route_type):
         """Get All stops on the specified route.
@@ -360,9 +616,8 @@ class PTVClient(object):
             route_type (RouteType enum)
                 Type of Transport
         """
-        path = API_VER + 'stops/route/{}/route_type/{}'
-        path = path.format(route_id, route_type.value)
-        return self._api_call(path)
+        path = STOPS_FOR_ROUTE.path(route_id, route_type.value)
+        return self._api_call(path, endpoint=STOPS_FOR_ROUTE)
 
     def get_stop_near_location(self, latitude, longitude, route_types=[], max_results=30, max_distance=300):
         """Get All stops near the specified location.
@@ -382,11 +637,286 @@ class PTVClient(object):
                 Filter by maximum distance (in metres) from location specified
                 via latitude and longitude parameters (default = 300)
         """
-        path = API_VER + 'stops/location/{},{}'
-        path = path.format(str(latitude), str(longitude))
+        path = STOPS_NEAR_LOCATION.path(str(latitude), str(longitude))
         params = {}
         params['max_results'] = max_results
         params['max_distance'] = max_distance
         if len(route_types) > 0:
             params["route_types"] = list(map(lambda x: x.value, route_types))
-        return self._api_call(path, params)
+        return self._api_call(path, params, STOPS_NEAR_LOCATION)
+
+
+class PTVClient(BaseClient):
+    """ Class to make calls to PTV API."""
+
+    def __init__(self,dev_id=None, api_key=None, transport=None, base_url=BASE_URL, cache=None,
+        cache_policy=None, coalesce=True, rate_limiter=None, retry_policy=None, models=False,
+        json_loads=None, observers=None, credentials=None, entities=None):
+        """Initialize a PTVClient.
+
+        Parameters
+            dev_id (str)
+                Developer ID from PTV (may be None with credentials)
+            api_key (str)
+                API key from PTV (may be None with credentials)
+
+        Optional Parameters:
+            transport (Transport)
+                Transport used for every request; defaults to a pooled,
+                keep-alive RequestsTransport shared by all endpoint methods
+            base_url (str)
+                Scheme and host of the API (default = BASE_URL)
+            cache (Cache)
+                Response cache consulted before every request (default = no caching)
+            cache_policy (CachePolicy)
+                Per-endpoint freshness used with cache (default = CachePolicy())
+            coalesce (bool)
+                Share one in-flight request between threads making identical
+                calls at the same time (default = true)
+            rate_limiter (RateLimiter)
+                Token bucket consulted before every request sent (default = unlimited)
+            retry_policy (RetryPolicy)
+                Policy for retrying failed requests (default = no retries)
+            models (bool)
+                Return Departure, Run, Stop, Route, Direction and Disruption
+                objects in place of dicts (default = false)
+            json_loads (callable)
+                Decoder taking the response body as bytes, e.g. orjson.loads
+                (default = the transport's json())
+            observers (callable [])
+                Called with a CallEvent after every endpoint method call, e.g.
+                a MetricsCollector (default = none)
+            credentials (CredentialPool)
+                Keys that requests are spread across, each signed with its
+                own key; with rate_limiter, each request uses the key that
+                can send soonest (default = dev_id and api_key only)
+            entities (EntityStore)
+                Store that responses are normalised into, so stops, routes,
+                runs, directions and disruptions are held once per id and
+                shared between responses (default = none)
+        """
+        super().__init__(dev_id, api_key, base_url, cache, cache_policy, rate_limiter,
+            retry_policy, models, json_loads, observers, credentials, entities)
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.single_flight = SingleFlight() if coalesce else None
+        self._refresh_lock = threading.Lock()
+
+    def close(self):
+        """Close the transport and release pooled connections."""
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _api_call(self, path, params=None, endpoint=None):
+        """Create URL and call API
+
+        Parameters:
+            path (str)
+                The endpoint we are calling
+            params (dict)
+                Dictionary containing parameters to be passed in the query
+            endpoint (Endpoint)
+                Template the path was built from
+
+        Returns
+            JSON from response as dict
+        """
+        if params is None:
+            params = {}
+        event = self._start_event(path, endpoint, params)
+        if event is None:
+            return self._call(path, params, None)
+        started = time.perf_counter()
+        try:
+            result = self._call(path, params, event)
+        except Exception as e:
+            self._finish_event(event, started, e)
+            raise
+        self._finish_event(event, started)
+        return result
+
+    def _call(self, path, params, event):
+        key, ttl, result, fresh = self._cache_lookup(path, params)
+        if event is not None:
+            event.key = key
+        if result is not None:
+            if event is not None:
+                event.cache = HIT if fresh else STALE
+            if not fresh:
+                self._revalidate(key, ttl, path, params)
+            return self._result(result, cached=True)
+        if event is not None and key is not None:
+            event.cache = MISS
+        if self.single_flight is None:
+            return self._result(self._load(key, ttl, path, params, event))
+        return self._result(self.single_flight.do(key or cache_key(path, params), self._load,
+            key, ttl, path, params, event))
+
+    def _load(self, key, ttl, path, params, event=None):
+        """Fetch a response and store it in the cache when cacheable."""
+        result, size = self._fetch(path, params, event)
+        if key is not None:
+            self._cache_store(key, ttl, result, size)
+        return result
+
+    def _fetch(self, path, params, event=None):
+        """Sign and send a request, returning the decoded JSON and its size in bytes.
+
+        The status, size and timings of the response are recorded on event, if given.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            # Each attempt may go out under a different key of the pool.
+            credential, wait = self._reserve()
+            if wait > 0:
+                time.sleep(wait)
+            url = self._build_url(path, params, credential)
+            if event is not None:
+                event.requests, event.retries = attempt + 1, attempt
+            try:
+                response = self.transport.get(url)
+            except Exception as e:
+                delay = self._retry_delay(attempt, started, error=e)
+                if delay is None:
+                    raise
+            else:
+                if event is not None:
+                    event.record_response(response)
+                delay = self._retry_delay(attempt, started, response=response)
+                if delay is None:
+                    response.raise_for_status()
+                    return self._decode(response, event), len(response.content)
+            time.sleep(delay)
+            attempt += 1
+
+    def _revalidate(self, key, ttl, path, params):
+        """Refresh a stale cache entry in a background thread unless already refreshing."""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, ttl, path, dict(params)),
+            daemon=True).start()
+
+    def _refresh(self, key, ttl, path, params):
+        try:
+            result, size = self._fetch(path, params)
+            self._cache_store(key, ttl, result, size)
+        except Exception:
+            # The stale entry keeps being served until it is discarded.
+            logger.warning('Background refresh of %s failed', key, exc_info=True)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    # Streaming
+    def stream(self, method, *args, **kwargs):
+        """Yield the items of an endpoint's main array while the response downloads.
+
+        Memory is bounded by one item rather than the whole response. Streamed
+        requests bypass the cache and are not retried.
+
+        Parameters:
+            method (str)
+                Name of an endpoint method returning a list, e.g. 'get_runs_for_route'
+            Any parameters of that method
+
+        Returns
+            Generator of dicts, or model objects when models is set
+        """
+        path, params, endpoint = getattr(_REQUEST_BUILDER, method)(*args, **kwargs)
+        if endpoint is None or endpoint.collection is None:
+            raise ValueError('{} does not return a list that can be streamed'.format(method))
+        return self._api_stream(path, params, endpoint.collection)
+
+    def _api_stream(self, path, params, collection):
+        credential, wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        response = self.transport.stream(self._build_url(path, params, credential))
+        try:
+            response.raise_for_status()
+            model = COLLECTION_MODELS.get(collection) if self.models else None
+            for item in iter_items(response.iter_content(STREAM_CHUNK_SIZE), collection):
+                yield model(item) if model is not None else item
+        finally:
+            response.close()
+
+    def iter_departure_from_stop(self, *args, **kwargs):
+        """Stream departures; takes the parameters of get_departure_from_stop."""
+        return self.stream('get_departure_from_stop', *args, **kwargs)
+
+    def iter_disruptions(self):
+        """Stream all disruptions, across every mode."""
+        return self.stream('get_disruptions')
+
+    def iter_routes(self, *args, **kwargs):
+        """Stream routes; takes the parameters of get_routes."""
+        return self.stream('get_routes', *args, **kwargs)
+
+    def iter_runs_for_route(self, route_id):
+        """Stream the runs for a route."""
+        return self.stream('get_runs_for_route', route_id)
+
+    # Bulk
+    def get_departures_for_stops(self, stops, max_workers=8, **kwargs):
+        """Get departures for many stops in parallel, merged into a single result.
+
+        Parameters:
+            stops (array[tuple])
+                (route_type, stop_id) or (route_type, stop_id, route_id) tuples
+
+        Optional Parameters:
+            max_workers (int)
+                Number of requests made in parallel (default = 8); keep at or
+                below the transport's pool size to reuse connections
+            Any optional parameter of get_departure_from_stop, applied to every stop
+
+        Returns
+            dict with every departure under 'departures', each expanded stop,
+            route, run, direction and disruption once keyed by id, and the
+            stops that failed under 'errors'
+        """
+        def fetch(request):
+            route_type, stop_id, route_id = split_request(request)
+            try:
+                return self.get_departure_from_stop(route_type, stop_id, route_id, **kwargs)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch, stops))
+        return merge_departures(stops, results)
+
+    def watch_departures(self, stops, **kwargs):
+        """Poll departures for many stops and yield only added, removed or changed ones.
+
+        Takes the parameters of ptv.watch.watch_departures; the polling
+        interval shortens while a departure is imminent.
+        """
+        return watch_departures(self, stops, **kwargs)
+
+    def walk_departures(self, route_type, stop_id, start, end, **kwargs):
+        """Yield every departure from a stop scheduled between start and end.
+
+        Takes the parameters of ptv.timetable.walk_departures; pages are
+        fetched lazily and overlapping results are de-duplicated.
+        """
+        return walk_departures(self, route_type, stop_id, start, end, **kwargs)
+
+
+class _RequestBuilder(BaseClient):
+    """ Returns the request an endpoint method would make instead of making it."""
+
+    def __init__(self):
+        pass
+
+    def _api_call(self, path, params=None, endpoint=None):
+        return path, params or {}, endpoint
+
+_REQUEST_BUILDER = _RequestBuilder()
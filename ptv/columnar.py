@@ -0,0 +1,235 @@
+from array import array
+from datetime import datetime
+from datetime import timezone
+
+from .models import Model
+from .models import parse_datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Stored for missing ids; missing timestamps are stored as the int64 of NaT.
+MISSING_ID = -1
+MISSING_TIME = -2 ** 63
+MISSING_CODE = -1
+
+# Length of the API's timestamp format, e.g. '2020-01-01T08:30:00Z'.
+_TIMESTAMP_LENGTH = 20
+_EPOCH = '1970-01-01T00:00:00Z'
+
+
+def _seconds(value):
+    if value is None:
+        return MISSING_TIME
+    if not isinstance(value, datetime):
+        value = parse_datetime(value)
+    elif value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() // 1)
+
+
+def _parse_numpy(values):
+    count = len(values)
+    missing = [i for i, value in enumerate(values) if value is None]
+    if missing:
+        values = [_EPOCH if value is None else value for value in values]
+    try:
+        raw = ''.join(values).encode('ascii')
+    except (TypeError, UnicodeEncodeError):
+        return None
+    if len(raw) != count * _TIMESTAMP_LENGTH:
+        return None
+    chars = np.frombuffer(raw, np.uint8).reshape(count, _TIMESTAMP_LENGTH)
+    if not (chars[:, -1] == ord('Z')).all():
+        return None
+    # Drop the Z and let numpy parse the rest in C.
+    text = np.ascontiguousarray(chars[:, :-1]).view('S{}'.format(_TIMESTAMP_LENGTH - 1)).ravel()
+    try:
+        seconds = text.astype('datetime64[s]').view(np.int64)
+    except ValueError:
+        return None
+    seconds[missing] = MISSING_TIME
+    return seconds
+
+
+def epoch_seconds(values):
+    """Convert timestamps from the API into seconds since the epoch.
+
+    Timestamps in the API's fixed format are parsed together by numpy when
+    it is installed; anything else falls back to parse_datetime one by one.
+
+    Parameters
+        values (list)
+            ISO 8601 UTC strings, datetimes or None
+
+    Returns
+        array('q') of seconds, or an int64 numpy array when numpy is
+        installed, with MISSING_TIME for None
+    """
+    if np is not None:
+        if not values:
+            return np.empty(0, np.int64)
+        seconds = _parse_numpy(values)
+        if seconds is None:
+            seconds = np.array([_seconds(value) for value in values], np.int64)
+        return seconds
+    return array('q', [_seconds(value) for value in values])
+
+
+def parse_timestamps(values):
+    """Parse timestamps from the API into a numpy datetime64[s] array, NaT for None.
+
+    Requires numpy.
+    """
+    if np is None:
+        raise ImportError('parse_timestamps requires numpy: pip install ptv-wrapper[numpy]')
+    return np.asarray(epoch_seconds(values), np.int64).view('datetime64[s]')
+
+
+def _values(rows, name):
+    if isinstance(rows[0], Model):
+        # Read timestamps from their slots so unparsed strings stay strings.
+        slot = '_' + name if name in rows[0]._timestamps else name
+        return [getattr(row, slot, None) for row in rows]
+    return [row.get(name) for row in rows]
+
+
+class Table(object):
+    """ Columnar batch of API objects, appended to across many calls.
+
+    Fields listed in _ints are stored as int64 (MISSING_ID for None), those
+    in _timestamps as int64 seconds since the epoch (MISSING_TIME for None)
+    and those in _categories as int32 codes into self.categories
+    (MISSING_CODE for None). Rows are not kept, only the typed buffers.
+    """
+    collection = None
+    _ints = ()
+    _timestamps = ()
+    _categories = ()
+
+    def __init__(self, results=None):
+        """Initialize a Table.
+
+        Optional Parameters:
+            results (list)
+                Results to add with extend()
+        """
+        self._columns = {name: array('q') for name in self._ints + self._timestamps}
+        self._codes = {name: array('i') for name in self._categories}
+        self.categories = {name: [] for name in self._categories}
+        self._lookup = {name: {} for name in self._categories}
+        self._length = 0
+        for result in results or []:
+            self.extend(result)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def fields(self):
+        return self._ints + self._timestamps + self._categories
+
+    def extend(self, result):
+        """Add the objects of a result.
+
+        Parameters
+            result (dict or list)
+                Endpoint response (dicts or models), or a list of its objects
+        """
+        rows = result.get(self.collection, []) if isinstance(result, dict) else result
+        if not rows:
+            return
+        for name in self._ints:
+            self._columns[name].extend([MISSING_ID if value is None else value
+                for value in _values(rows, name)])
+        for name in self._timestamps:
+            self._columns[name].frombytes(epoch_seconds(_values(rows, name)).tobytes())
+        for name in self._categories:
+            lookup, values = self._lookup[name], self.categories[name]
+            codes = []
+            for value in _values(rows, name):
+                if value is None:
+                    codes.append(MISSING_CODE)
+                    continue
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(values)
+                    values.append(value)
+                codes.append(code)
+            self._codes[name].extend(codes)
+        self._length += len(rows)
+
+    def column(self, name):
+        """Return a column's buffer: an array('q') of ids or seconds, or array('i') of codes."""
+        return self._codes[name] if name in self._codes else self._columns[name]
+
+    def arrays(self):
+        """Return every column as a numpy array keyed by field name.
+
+        Ids are int64, timestamps datetime64[s] with NaT for missing values,
+        and categories int32 codes into self.categories. Requires numpy.
+        """
+        if np is None:
+            raise ImportError('Table.arrays requires numpy: pip install ptv-wrapper[numpy]')
+        arrays = {}
+        for name in self._ints:
+            arrays[name] = np.array(self._columns[name], np.int64)
+        for name in self._timestamps:
+            arrays[name] = np.array(self._columns[name], np.int64).view('datetime64[s]')
+        for name in self._categories:
+            arrays[name] = np.array(self._codes[name], np.int32)
+        return arrays
+
+    def _seconds(self, name):
+        seconds = np.array(self._columns[name], np.float64)
+        seconds[np.array(self._columns[name], np.int64) == MISSING_TIME] = np.nan
+        return seconds
+
+
+class DepartureTable(Table):
+    """ Columnar departures, e.g. from get_departure_from_stop or get_stopping_pattern_for_run."""
+    collection = 'departures'
+    _ints = ('stop_id', 'route_id', 'run_id', 'direction_id', 'departure_sequence')
+    _timestamps = ('scheduled_departure_utc', 'estimated_departure_utc')
+    _categories = ('run_ref', 'platform_number')
+
+    def delays(self):
+        """Return estimated minus scheduled departure in seconds, NaN without an estimate.
+
+        Requires numpy.
+        """
+        if np is None:
+            raise ImportError('DepartureTable.delays requires numpy: pip install ptv-wrapper[numpy]')
+        return self._seconds('estimated_departure_utc') - self._seconds('scheduled_departure_utc')
+
+    def headways(self):
+        """Return the seconds since the previous scheduled departure on the same stop,
+        route and direction, NaN for the first.
+
+        Rows are compared as stored, so departures repeated across batches
+        should be added once. Requires numpy.
+        """
+        if np is None:
+            raise ImportError('DepartureTable.headways requires numpy: pip install ptv-wrapper[numpy]')
+        scheduled = self._seconds('scheduled_departure_utc')
+        groups = [np.array(self._columns[name], np.int64)
+            for name in ('stop_id', 'route_id', 'direction_id')]
+        order = np.lexsort([scheduled] + groups[::-1])
+        ordered = scheduled[order]
+        headways = np.full(len(self), np.nan)
+        if len(order) > 1:
+            same = np.ones(len(order) - 1, bool)
+            for group in groups:
+                same &= group[order][1:] == group[order][:-1]
+            headways[order[1:]] = np.where(same, np.diff(ordered), np.nan)
+        return headways
+
+
+class RunTable(Table):
+    """ Columnar runs from get_runs_for_route or get_run."""
+    collection = 'runs'
+    _ints = ('run_id', 'route_id', 'route_type', 'final_stop_id', 'direction_id',
+        'run_sequence', 'express_stop_count')
+    _categories = ('run_ref', 'destination_name', 'status')
@@ -0,0 +1,88 @@
+from hashlib import sha1
+import hmac
+import itertools
+import threading
+import urllib
+
+
+class Credential(object):
+    """ A developer ID and API key, with the keyed HMAC state used to sign requests."""
+    __slots__ = ('dev_id', 'api_key', 'devid_query', '_hmac')
+
+    def __init__(self, dev_id, api_key):
+        """Initialize a Credential.
+
+        Parameters
+            dev_id (str)
+                Developer ID from PTV
+            api_key (str)
+                API key from PTV
+        """
+        self.dev_id = dev_id
+        self.api_key = api_key
+        self.devid_query = urllib.parse.urlencode({'devid': dev_id})
+        self._hmac = hmac.new(bytes(api_key, 'UTF-8'), digestmod=sha1)
+
+    def sign(self, path):
+        """Return the hex signature of a path and query signed with this key."""
+        signer = self._hmac.copy()
+        signer.update(bytes(path, 'UTF-8'))
+        return signer.hexdigest().upper()
+
+    def __repr__(self):
+        return 'Credential({!r})'.format(self.dev_id)
+
+
+class CredentialPool(object):
+    """ Several (dev_id, api_key) pairs sharing a client's requests.
+
+    With a rate limiter, every request goes to the key that can send
+    soonest, so no key is driven past its budget; a SharedRateLimiter
+    extends that to every process on the host. Without one, keys are used
+    in turn.
+    """
+
+    def __init__(self, credentials):
+        """Initialize a CredentialPool.
+
+        Parameters
+            credentials (array[tuple])
+                (dev_id, api_key) pairs, or Credential objects
+        """
+        self.credentials = [credential if isinstance(credential, Credential)
+            else Credential(*credential) for credential in credentials]
+        if not self.credentials:
+            raise ValueError('A CredentialPool needs at least one credential')
+        self.dev_ids = [credential.dev_id for credential in self.credentials]
+        self.requests = dict.fromkeys(self.dev_ids, 0)
+        self._by_dev_id = {credential.dev_id: credential for credential in self.credentials}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def reserve(self, rate_limiter=None):
+        """Choose the credential for a request.
+
+        Optional Parameters:
+            rate_limiter (RateLimiter)
+                Limiter whose budget picks the key and is charged for it
+                (default = use the keys in turn)
+
+        Returns
+            Tuple of (Credential, seconds the caller must wait)
+        """
+        if rate_limiter is None:
+            credential, wait = self.credentials[next(self._turn) % len(self.credentials)], 0
+        else:
+            dev_id, wait = rate_limiter.reserve_any(self.dev_ids)
+            credential = self._by_dev_id[dev_id]
+        with self._lock:
+            self.requests[credential.dev_id] += 1
+        return credential, wait
+
+    def stats(self):
+        """Return the requests sent with each developer ID as a dict."""
+        with self._lock:
+            return dict(self.requests)
@@ -0,0 +1,142 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from .cli import COMMANDS
+from .cli import call
+from .cli import describe_error
+from .cli import format_output
+from .cli import key_fingerprint
+from .cli import owned_socket
+from .client import BASE_URL
+
+
+def _mismatch(client, request):
+    """Return the name of the first setting the request asks for that the
+    client doesn't have, or None; unset values accept the client's own."""
+    if request.get('dev_id') not in (None, client.dev_id):
+        return 'dev_id'
+    if request.get('key') not in (None, key_fingerprint(client.api_key)):
+        return 'api_key'
+    base_url = request.get('base_url') or BASE_URL
+    if base_url.rstrip('/') != client.base_url.rstrip('/'):
+        return 'base_url'
+    return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answers one call: a JSON request line in, a JSON header line and the output back."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request['command']
+            mismatch = _mismatch(self.server.client, request)
+            if mismatch is not None:
+                # The caller makes the call itself rather than with our credentials.
+                header = {'error': 'daemon serves another {}'.format(mismatch), 'mismatch': True}
+                self.wfile.write((json.dumps(header) + '\n').encode('UTF-8'))
+                return
+            if command not in COMMANDS:
+                raise ValueError('unknown command {!r}'.format(command))
+            result = call(self.server.client, command, request.get('kwargs', {}))
+            output = format_output(result, COMMANDS[command][4], request.get('format', 'json'),
+                request.get('indent'))
+            header = {'error': None}
+        except Exception as e:
+            message, status = describe_error(e)
+            header, output = {'error': message, 'status': status}, ''
+        self.wfile.write((json.dumps(header) + '\n' + output).encode('UTF-8'))
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Calls are signed with the owner's key, so only the owner may connect;
+        # the umask keeps the socket private from the moment it is created.
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+
+
+class Daemon(object):
+    """ Serves calls from the ptv command with one long-lived client.
+
+    The client's connection pool and cache stay warm between invocations,
+    so a repeated call costs a local socket round trip instead of an
+    interpreter start, imports and a new TLS connection.
+    """
+
+    def __init__(self, client, path):
+        """Initialize a Daemon.
+
+        Parameters
+            client (PTVClient)
+                Client every call is made with; not closed by the daemon
+            path (str)
+                Unix socket to listen on; a missing directory is created
+                private to the user, and a stale socket of theirs left by a
+                daemon that died is replaced
+        """
+        self.client = client
+        self.path = path
+        self._server = None
+        self._thread = None
+
+    def _listen(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700)
+        if os.path.lexists(self.path):
+            if not owned_socket(self.path):
+                raise RuntimeError('{} is not a socket owned by this user'.format(self.path))
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except ConnectionRefusedError:
+                os.unlink(self.path)
+            else:
+                raise RuntimeError('A daemon is already listening on {}'.format(self.path))
+            finally:
+                probe.close()
+        self._server = _Server(self.path, _Handler)
+        self._server.client = self.client
+
+    def serve_forever(self):
+        """Serve calls on this thread until interrupted or stopped."""
+        self._listen()
+        self._server.serve_forever(0.1)
+
+    def start(self):
+        """Start serving on a background thread."""
+        self._listen()
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and remove the socket."""
+        if self._server is None:
+            return
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
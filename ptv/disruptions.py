@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import time
+
+from .models import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+RESOLVED = 'resolved'
+
+STATE_VERSION = 1
+
+
+def _get(disruption, field):
+    if isinstance(disruption, dict):
+        return disruption.get(field)
+    return getattr(disruption, field, None)
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return value.timestamp()
+
+
+def _flatten(disruptions):
+    # get_disruptions groups disruptions by mode; get_disruptions_on_route may return a list.
+    if isinstance(disruptions, dict):
+        for group in disruptions.values():
+            yield from group
+    else:
+        yield from disruptions or []
+
+
+class DisruptionEvent(object):
+    """ A disruption that was created, updated or resolved since the last poll."""
+    __slots__ = ('kind', 'disruption_id', 'disruption')
+
+    def __init__(self, kind, disruption_id, disruption):
+        """Initialize a DisruptionEvent.
+
+        Parameters
+            kind (str)
+                CREATED, UPDATED or RESOLVED
+            disruption_id (int)
+                Identifier of disruption
+            disruption
+                Full disruption from get_disruption for CREATED and UPDATED,
+                None for RESOLVED
+        """
+        self.kind = kind
+        self.disruption_id = disruption_id
+        self.disruption = disruption
+
+    def __eq__(self, other):
+        return isinstance(other, DisruptionEvent) and \
+            (self.kind, self.disruption_id, self.disruption) == \
+            (other.kind, other.disruption_id, other.disruption)
+
+    def __repr__(self):
+        return 'DisruptionEvent({!r}, disruption_id={!r})'.format(self.kind, self.disruption_id)
+
+
+class DisruptionTracker(object):
+    """ Turns repeated get_disruptions calls into a created/updated/resolved feed.
+
+    The last known (last_updated, disruption_status) of every disruption is
+    kept by disruption_id. Each poll makes one get_disruptions call plus one
+    get_disruption call per disruption that is new or whose metadata changed;
+    if that call fails, no event is emitted and it is retried on the next poll.
+    State can be persisted so a restarted process resumes without replaying
+    every current disruption as created.
+    """
+
+    def __init__(self, client, state_path=None, emit_initial=True):
+        """Initialize a DisruptionTracker.
+
+        Parameters
+            client (PTVClient)
+                Client used to poll
+
+        Optional Parameters:
+            state_path (str)
+                JSON file the state is loaded from, if it exists, and saved to
+                after every poll (default = None, state is kept in memory)
+            emit_initial (bool)
+                Emit a created event for each disruption seen on the first poll
+                with no saved state (default = true)
+        """
+        self.client = client
+        self.state_path = state_path
+        self.emit_initial = emit_initial
+        self.state = {}
+        self.initialized = False
+        if state_path is not None and os.path.exists(state_path):
+            self.load(state_path)
+
+    def poll(self):
+        """Fetch the current disruptions and return what changed since the last poll.
+
+        Returns
+            List of DisruptionEvent
+        """
+        current = {}
+        for disruption in _flatten(self.client.get_disruptions().get('disruptions')):
+            current[_get(disruption, 'disruption_id')] = (
+                _timestamp(_get(disruption, 'last_updated')), _get(disruption, 'disruption_status'))
+        events = []
+        state = dict(current)
+        if self.initialized or self.emit_initial:
+            for disruption_id, meta in current.items():
+                previous = self.state.get(disruption_id)
+                if previous == meta:
+                    continue
+                try:
+                    details = self.client.get_disruption(disruption_id).get('disruption')
+                except Exception as e:
+                    # Keep the old metadata so the next poll fetches it again.
+                    logger.warning('Fetching disruption %s failed: %s', disruption_id, e)
+                    if previous is None:
+                        del state[disruption_id]
+                    else:
+                        state[disruption_id] = previous
+                    continue
+                kind = CREATED if previous is None else UPDATED
+                events.append(DisruptionEvent(kind, disruption_id, details))
+            for disruption_id in self.state:
+                if disruption_id not in current:
+                    events.append(DisruptionEvent(RESOLVED, disruption_id, None))
+        self.state = state
+        self.initialized = True
+        if self.state_path is not None:
+            self.save(self.state_path)
+        return events
+
+    def watch(self, interval=60, sleep=time.sleep):
+        """Poll forever, yielding each DisruptionEvent.
+
+        Optional Parameters:
+            interval (float)
+                Seconds between polls (default = 60, the disruptions cache TTL)
+            sleep (callable)
+                Waits for a number of seconds (default = time.sleep)
+        """
+        while True:
+            yield from self.poll()
+            sleep(interval)
+
+    # Persistence
+    def save(self, path):
+        """Atomically write the tracked state to a JSON file."""
+        state = {
+            'version': STATE_VERSION,
+            'disruptions': [[disruption_id, last_updated, status]
+                for disruption_id, (last_updated, status) in self.state.items()],
+        }
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='UTF-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Replace the tracked state with one written by save()."""
+        with open(path, encoding='UTF-8') as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError('Unsupported state version: {}'.format(state.get('version')))
+        self.state = {row[0]: (row[1], row[2]) for row in state['disruptions']}
+        self.initialized = True
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+import threading
+
+from .models import COLLECTION_MODELS
+
+# Fields identifying the entities of each collection. Members holding one
+# entity use the singular name (e.g. 'stop' in get_stop).
+KEYS = {
+    'stops': ('route_type', 'stop_id'),
+    'routes': ('route_id',),
+    'runs': ('run_ref',),
+    'directions': ('direction_id', 'route_id'),
+    'disruptions': ('disruption_id',),
+}
+SINGLE = {'stop': 'stops', 'route': 'routes', 'run': 'runs', 'disruption': 'disruptions'}
+# Lists of stops carry a sequence or distance that depends on the route or
+# location asked for, so only expanded and single stops are shared.
+_UNSHARED_LISTS = ('stops',)
+
+_MISSING = object()
+
+
+class EntityStore(object):
+    """ Stops, routes, runs, directions and disruptions held once per id.
+
+    Responses normalised into the store reference its entities instead of
+    carrying their own copies, so memory grows with the size of the network
+    rather than the number of calls. An entity is refreshed in place when a
+    later response carries different values, which every response
+    referencing it then sees, and the store's version is incremented.
+
+    Entities are the dicts decoded from the API and should not be mutated
+    by callers. The store never evicts.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._entities = {}
+        # (kind, key) -> version of its last change, oldest first.
+        self._versions = OrderedDict()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entities)
+
+    def _key(self, kind, raw):
+        fields = KEYS[kind]
+        if len(fields) == 1:
+            return raw.get(fields[0])
+        key = tuple(raw.get(field) for field in fields)
+        return None if None in key else key
+
+    def _touch(self, ident):
+        self.version += 1
+        self._versions[ident] = self.version
+        self._versions.move_to_end(ident)
+
+    def _intern(self, kind, raw, refresh):
+        if not isinstance(raw, dict):
+            return raw
+        key = self._key(kind, raw)
+        if key is None:
+            return raw
+        ident = (kind, key)
+        entity = self._entities.get(ident)
+        if entity is None:
+            self._entities[ident] = raw
+            self._touch(ident)
+            return raw
+        if entity is raw:
+            return entity
+        if refresh and any(entity.get(field, _MISSING) != value for field, value in raw.items()):
+            entity.update(raw)
+            self._touch(ident)
+            model = self._models.get(ident)
+            if model is not None:
+                model.__init__(entity)
+        return entity
+
+    def _intern_all(self, kind, value, refresh):
+        if isinstance(value, list):
+            return [self._intern(kind, item, refresh) for item in value]
+        # Expansions are keyed by id; disruptions are grouped by mode in lists.
+        return {name: self._intern_all(kind, item, refresh) if isinstance(item, list)
+            else self._intern(kind, item, refresh) for name, item in value.items()}
+
+    def normalize(self, payload, refresh=True):
+        """Replace the entities in a response by the store's copies.
+
+        Parameters
+            payload (dict)
+                Decoded JSON response; not modified
+
+        Optional Parameters:
+            refresh (bool)
+                Update held entities from the payload when their values
+                differ; false for responses that may be older than the
+                store, e.g. from a cache (default = true)
+
+        Returns
+            A new dict with the same keys, referencing the store's entities
+        """
+        result = dict(payload)
+        with self._lock:
+            for member, value in payload.items():
+                kind = SINGLE.get(member)
+                if kind is not None:
+                    result[member] = self._intern(kind, value, refresh)
+                elif member in KEYS and (isinstance(value, dict) or
+                        (isinstance(value, list) and member not in _UNSHARED_LISTS)):
+                    result[member] = self._intern_all(member, value, refresh)
+        return result
+
+    def get(self, kind, key):
+        """Return an entity, or None when it isn't held.
+
+        Parameters
+            kind (str)
+                Collection name: stops, routes, runs, directions or disruptions
+            key
+                Value of the identifying fields in KEYS, a tuple when there
+                are several (e.g. (route_type, stop_id) for stops)
+        """
+        return self._entities.get((kind, key))
+
+    def changed_since(self, version):
+        """Return the entities added or refreshed after a version.
+
+        Parameters
+            version (int)
+                A previous value of self.version (0 for every entity)
+
+        Returns
+            List of (kind, entity) tuples, oldest change first
+        """
+        with self._lock:
+            changed = []
+            for ident in reversed(self._versions):
+                if self._versions[ident] <= version:
+                    break
+                changed.append((ident[0], self._entities[ident]))
+        changed.reverse()
+        return changed
+
+    def model(self, kind, raw):
+        """Return the model for an object, shared by every response when the
+        store holds it.
+
+        Parameters
+            kind (str)
+                Collection name the object belongs to (e.g. 'departures')
+            raw (dict)
+                Object from a normalised response
+        """
+        model = COLLECTION_MODELS[kind]
+        if kind not in KEYS or not isinstance(raw, dict):
+            return model(raw)
+        ident = (kind, self._key(kind, raw))
+        with self._lock:
+            if self._entities.get(ident) is not raw:
+                return model(raw)
+            shared = self._models.get(ident)
+            if shared is None:
+                shared = self._models[ident] = model(raw)
+            return shared
+
+    def stats(self):
+        """Return the number of entities of each kind and the version as a dict."""
+        with self._lock:
+            counts = dict.fromkeys(KEYS, 0)
+            for kind, key in self._entities:
+                counts[kind] += 1
+        return dict(counts, version=self.version)
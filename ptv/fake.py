@@ -0,0 +1,665 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import hmac
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib
+
+from .cassette import Cassette
+from .cassette import request_key
+from .models import parse_datetime
+from .spatial import METRES_PER_DEGREE
+from .spatial import haversine
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+STATUS = {'version': '3.0', 'health': 1}
+
+HUB = (-37.8183, 144.9671)
+ROUTE_TYPE_NAMES = ('Train', 'Tram', 'Bus', 'Vline', 'Night Bus')
+# Minutes between runs in each direction, by route type.
+HEADWAYS = (10, 8, 15, 60, 60)
+TRAIN_LINES = ('Alamein', 'Belgrave', 'Craigieburn', 'Frankston', 'Glen Waverley', 'Hurstbridge',
+    'Lilydale', 'Mernda', 'Pakenham', 'Sandringham', 'Sunbury', 'Upfield', 'Werribee', 'Williamstown')
+DISRUPTION_MODES = ('general', 'metro_train', 'metro_tram', 'metro_bus', 'regional_train',
+    'regional_coach', 'regional_bus', 'school_bus', 'telebus', 'night_bus', 'ferry',
+    'interstate_train', 'skybus', 'taxi')
+MODE_FOR_ROUTE_TYPE = ('metro_train', 'metro_tram', 'metro_bus', 'regional_train', 'night_bus')
+STOP_SPACING = 800
+MINUTES_BETWEEN_STOPS = 2
+DEFAULT_DEPARTURES = 5
+
+
+def _flag(query, name):
+    return query.get(name, ['false'])[0].lower() == 'true'
+
+
+def _ints(query, name):
+    return [int(value) for value in query.get(name, [])]
+
+
+def _expansions(query):
+    expand = set(value.lower() for value in query.get('expand', []))
+    if 'all' in expand:
+        return {'stop', 'route', 'run', 'direction', 'disruption'}
+    return expand
+
+
+class SyntheticNetwork(object):
+    """ Deterministic network answering every endpoint PTVClient covers.
+
+    Routes radiate from a hub at Flinders Street; train route 1 is the
+    Alamein line and the train hub is stop 1071. Runs repeat every day at
+    a fixed headway, so departures and stopping patterns can be generated
+    for any date_utc.
+    """
+
+    def __init__(self, routes_per_type=4, stops_per_route=12):
+        """Initialize a SyntheticNetwork.
+
+        Optional Parameters:
+            routes_per_type (int)
+                Routes of each route type (default = 4)
+            stops_per_route (int)
+                Stops on each route, including the hub (default = 12)
+        """
+        self.routes = {}
+        self.stops = {}
+        self.route_stops = {}
+        self.directions = {}
+        self.runs = {}
+        self.route_runs = {}
+        self.disruptions = {}
+        cos_hub = math.cos(math.radians(HUB[0]))
+        run_id = 0
+        for route_type, type_name in enumerate(ROUTE_TYPE_NAMES):
+            hub_id = 1071 if route_type == 0 else route_type * 100000
+            hub_name = 'Flinders Street Station' if route_type == 0 else type_name + ' Interchange'
+            self.stops[(route_type, hub_id)] = self._stop(route_type, hub_id, hub_name,
+                'Melbourne City', HUB[0] + route_type * 0.0005, HUB[1])
+            for i in range(routes_per_type):
+                route_id = i + 1 if route_type == 0 else route_type * 1000 + i + 1
+                if route_type == 0:
+                    name, number = TRAIN_LINES[i % len(TRAIN_LINES)], ''
+                else:
+                    name, number = '{} Route {}'.format(type_name, i + 1), str(i + 1)
+                self.routes[route_id] = {
+                    'route_id': route_id,
+                    'route_type': route_type,
+                    'route_name': name,
+                    'route_number': number,
+                    'route_gtfs_id': '{}-{}'.format(route_type + 2, route_id),
+                }
+                stop_ids = [hub_id]
+                bearing = 2 * math.pi * (i + route_type / len(ROUTE_TYPE_NAMES)) / routes_per_type
+                for k in range(1, stops_per_route):
+                    stop_id = route_type * 100000 + 10000 + i * 100 + k
+                    distance = k * STOP_SPACING
+                    self.stops[(route_type, stop_id)] = self._stop(route_type, stop_id,
+                        '{} Stop {}'.format(name, k), name,
+                        HUB[0] + distance * math.cos(bearing) / METRES_PER_DEGREE,
+                        HUB[1] + distance * math.sin(bearing) / (METRES_PER_DEGREE * cos_hub))
+                    stop_ids.append(stop_id)
+                self.route_stops[route_id] = stop_ids
+                self.directions[route_id] = [
+                    {'direction_id': 1, 'direction_name': 'City (Flinders Street)',
+                        'route_id': route_id, 'route_type': route_type,
+                        'route_direction_description': 'Towards the city'},
+                    {'direction_id': route_id * 10 + 2, 'direction_name': name,
+                        'route_id': route_id, 'route_type': route_type,
+                        'route_direction_description': 'Away from the city'},
+                ]
+                runs = []
+                headway = HEADWAYS[route_type]
+                for direction in self.directions[route_id]:
+                    inbound = direction['direction_id'] == 1
+                    for trip in range(24 * 60 // headway):
+                        run_id += 1
+                        self.runs[run_id] = {
+                            'run_id': run_id,
+                            'run_ref': str(run_id),
+                            'route_id': route_id,
+                            'route_type': route_type,
+                            'final_stop_id': stop_ids[0] if inbound else stop_ids[-1],
+                            'destination_name': hub_name if inbound else name,
+                            'status': 'scheduled',
+                            'direction_id': direction['direction_id'],
+                            'run_sequence': 0,
+                            'express_stop_count': 0,
+                            'vehicle_position': None,
+                            'vehicle_descriptor': None,
+                        }
+                        # Minutes after midnight UTC the run leaves its first stop.
+                        runs.append((run_id, inbound, trip * headway + i))
+                self.route_runs[route_id] = runs
+            disruption_id = route_type + 1
+            first_route = 1 if route_type == 0 else route_type * 1000 + 1
+            self.disruptions[disruption_id] = {
+                'disruption_id': disruption_id,
+                'title': '{} works'.format(self.routes[first_route]['route_name']),
+                'url': 'https://www.ptv.vic.gov.au/disruptions/{}'.format(disruption_id),
+                'description': 'Buses replace services on part of the route.',
+                'disruption_status': 'Current',
+                'disruption_type': 'Planned Works',
+                'published_on': '2020-01-01T00:00:00Z',
+                'last_updated': '2020-01-01T00:00:00Z',
+                'from_date': '2020-01-01T00:00:00Z',
+                'to_date': None,
+                'routes': [self._route_ref(first_route)],
+                'stops': [],
+                'colour': '#ffd500',
+                'display_on_board': False,
+                'display_status': False,
+            }
+
+    @staticmethod
+    def _stop(route_type, stop_id, name, suburb, latitude, longitude):
+        return {
+            'stop_id': stop_id,
+            'stop_name': name,
+            'stop_suburb': suburb,
+            'route_type': route_type,
+            'stop_latitude': latitude,
+            'stop_longitude': longitude,
+        }
+
+    def _route_ref(self, route_id):
+        route = self.routes[route_id]
+        return {key: route[key] for key in ('route_type', 'route_id', 'route_name', 'route_number',
+            'route_gtfs_id')}
+
+    def _route_disruption_ids(self, route_id):
+        return [disruption_id for disruption_id, disruption in self.disruptions.items()
+            if any(route['route_id'] == route_id for route in disruption['routes'])]
+
+    def _stop_routes(self, route_type, stop_id):
+        return [route_id for route_id, stop_ids in self.route_stops.items()
+            if stop_id in stop_ids and self.routes[route_id]['route_type'] == route_type]
+
+    def _calls(self, route_id, inbound, first_minute, day):
+        stop_ids = self.route_stops[route_id]
+        order = list(reversed(stop_ids)) if inbound else stop_ids
+        start = day + timedelta(minutes=first_minute)
+        for sequence, stop_id in enumerate(order):
+            yield sequence, stop_id, start + timedelta(minutes=sequence * MINUTES_BETWEEN_STOPS)
+
+    def _departure(self, route_id, run_id, stop_id, sequence, when):
+        run = self.runs[run_id]
+        return {
+            'stop_id': stop_id,
+            'route_id': route_id,
+            'run_id': run_id,
+            'run_ref': run['run_ref'],
+            'direction_id': run['direction_id'],
+            'disruption_ids': self._route_disruption_ids(route_id),
+            'scheduled_departure_utc': when.strftime(DATE_FORMAT),
+            'estimated_departure_utc': None,
+            'at_platform': False,
+            'platform_number': ('1' if run['direction_id'] == 1 else '2')
+                if run['route_type'] == 0 else None,
+            'flags': '',
+            'departure_sequence': sequence,
+        }
+
+    def _expanded(self, departures, expand):
+        result = {'stops': {}, 'routes': {}, 'runs': {}, 'directions': {}, 'disruptions': {}}
+        for departure in departures:
+            run = self.runs[departure['run_id']]
+            route_id = departure['route_id']
+            if 'stop' in expand:
+                result['stops'][str(departure['stop_id'])] = \
+                    self.stops[(run['route_type'], departure['stop_id'])]
+            if 'route' in expand:
+                result['routes'][str(route_id)] = self.routes[route_id]
+            if 'run' in expand:
+                result['runs'][departure['run_ref']] = run
+            if 'direction' in expand:
+                for direction in self.directions[route_id]:
+                    if direction['direction_id'] == departure['direction_id']:
+                        result['directions'][str(direction['direction_id'])] = direction
+            if 'disruption' in expand:
+                for disruption_id in departure['disruption_ids']:
+                    result['disruptions'][str(disruption_id)] = self.disruptions[disruption_id]
+        return result
+
+    def _grouped(self, disruptions):
+        grouped = {mode: [] for mode in DISRUPTION_MODES}
+        for disruption in disruptions:
+            route_type = disruption['routes'][0]['route_type'] if disruption['routes'] else None
+            mode = MODE_FOR_ROUTE_TYPE[route_type] if route_type is not None else 'general'
+            grouped[mode].append(disruption)
+        return grouped
+
+    # Endpoints
+    def departures(self, route_type, stop_id, query, now, route_id=None):
+        if (route_type, stop_id) not in self.stops:
+            return 404, {'message': 'Stop not found'}
+        since = parse_datetime(query['date_utc'][0]) if 'date_utc' in query else now
+        limit = int(query.get('max_results', [DEFAULT_DEPARTURES])[0]) or DEFAULT_DEPARTURES
+        directions = _ints(query, 'direction_id')
+        platforms = query.get('platform_numbers', [])
+        day = datetime(since.year, since.month, since.day, tzinfo=timezone.utc)
+        departures = []
+        route_ids = [route_id] if route_id else self._stop_routes(route_type, stop_id)
+        for rid in route_ids:
+            stop_ids = self.route_stops[rid]
+            outbound = stop_ids.index(stop_id)
+            inbound = len(stop_ids) - 1 - outbound
+            groups = {}
+            # Runs are listed in time order per direction, so each group fills in order.
+            for offset in (-1, 0, 1):
+                for run_id, is_inbound, first_minute in self.route_runs[rid]:
+                    position = inbound if is_inbound else outbound
+                    direction_id = self.runs[run_id]['direction_id']
+                    group = groups.setdefault(direction_id, [])
+                    # No departures from the last stop of a run.
+                    if position == len(stop_ids) - 1 or len(group) >= limit or \
+                        (directions and direction_id not in directions):
+                        continue
+                    when = day + timedelta(days=offset,
+                        minutes=first_minute + position * MINUTES_BETWEEN_STOPS)
+                    if when >= since:
+                        group.append(self._departure(rid, run_id, stop_id, 0, when))
+            for group in groups.values():
+                departures.extend(group)
+        if platforms:
+            departures = [d for d in departures if d['platform_number'] in platforms]
+        departures.sort(key=lambda departure: departure['scheduled_departure_utc'])
+        result = {'departures': departures}
+        result.update(self._expanded(departures, _expansions(query)))
+        return 200, result
+
+    def directions_for_route(self, route_id):
+        if route_id not in self.directions:
+            return 404, {'message': 'Route not found'}
+        return 200, {'directions': self.directions[route_id]}
+
+    def direction(self, direction_id, route_type=None):
+        directions = [direction for directions in self.directions.values()
+            for direction in directions if direction['direction_id'] == direction_id and
+            route_type in (None, direction['route_type'])]
+        return 200, {'directions': directions}
+
+    def all_disruptions(self, query, route_id=None):
+        status = query.get('disruption_status', [None])[0]
+        if route_id is not None:
+            disruptions = [self.disruptions[disruption_id]
+                for disruption_id in self._route_disruption_ids(route_id)]
+        else:
+            disruptions = list(self.disruptions.values())
+        if status is not None:
+            disruptions = [disruption for disruption in disruptions
+                if disruption['disruption_status'].lower() == status]
+        return 200, {'disruptions': self._grouped(disruptions)}
+
+    def disruption(self, disruption_id):
+        if disruption_id not in self.disruptions:
+            return 404, {'message': 'Disruption not found'}
+        return 200, {'disruption': self.disruptions[disruption_id]}
+
+    def pattern(self, run_id, route_type, query, now):
+        run = self.runs.get(run_id)
+        if run is None or run['route_type'] != route_type:
+            return 404, {'message': 'Run not found'}
+        since = parse_datetime(query['date_utc'][0]) if 'date_utc' in query else now
+        day = datetime(since.year, since.month, since.day, tzinfo=timezone.utc)
+        route_id = run['route_id']
+        inbound, first_minute = next((inbound, first_minute)
+            for rid, inbound, first_minute in self.route_runs[route_id] if rid == run_id)
+        stop_filter = _ints(query, 'stop_id')
+        departures = [self._departure(route_id, run_id, stop_id, sequence, when)
+            for sequence, stop_id, when in self._calls(route_id, inbound, first_minute, day)
+            if not stop_filter or stop_id in stop_filter]
+        result = {'departures': departures}
+        result.update(self._expanded(departures, _expansions(query) or {'disruption'}))
+        return 200, result
+
+    def all_routes(self, query):
+        route_types = _ints(query, 'route_types')
+        name = query.get('route_name', [''])[0].lower()
+        routes = [route for route in self.routes.values()
+            if (not route_types or route['route_type'] in route_types) and
+            name in route['route_name'].lower()]
+        return 200, {'routes': routes}
+
+    def route(self, route_id):
+        if route_id not in self.routes:
+            return 404, {'message': 'Route not found'}
+        return 200, {'route': self.routes[route_id]}
+
+    def route_types(self):
+        return 200, {'route_types': [{'route_type_name': name, 'route_type': route_type}
+            for route_type, name in enumerate(ROUTE_TYPE_NAMES)]}
+
+    def runs_for_route(self, route_id):
+        if route_id not in self.route_runs:
+            return 404, {'message': 'Route not found'}
+        return 200, {'runs': [self.runs[run_id] for run_id, _, _ in self.route_runs[route_id]]}
+
+    def run(self, run_id, route_type=None):
+        run = self.runs.get(run_id)
+        if route_type is None:
+            return 200, {'runs': [run] if run else []}
+        if run is None or run['route_type'] != route_type:
+            return 404, {'message': 'Run not found'}
+        return 200, {'run': run}
+
+    def search(self, term, query):
+        term = urllib.parse.unquote(term).lower()
+        route_types = _ints(query, 'route_types')
+        routes_only = len(term) < 3 or term.replace(' ', '').isdigit()
+        routes = [route for route in self.routes.values()
+            if (term in route['route_name'].lower() or term == route['route_number'])
+            and (not route_types or route['route_type'] in route_types)]
+        stops = []
+        if not routes_only:
+            origin = None
+            if 'latitude' in query and 'longitude' in query:
+                origin = (float(query['latitude'][0]), float(query['longitude'][0]))
+            max_distance = float(query.get('max_distance', [0])[0])
+            for (route_type, stop_id), stop in self.stops.items():
+                if term not in stop['stop_name'].lower() or \
+                    (route_types and route_type not in route_types):
+                    continue
+                stop = dict(stop)
+                if origin is not None:
+                    stop['stop_distance'] = haversine(origin[0], origin[1], stop['stop_latitude'],
+                        stop['stop_longitude'])
+                    if max_distance and stop['stop_distance'] > max_distance:
+                        continue
+                stops.append(stop)
+        stops.sort(key=lambda stop: stop['route_type'])
+        routes.sort(key=lambda route: route['route_type'])
+        return 200, {'stops': stops, 'routes': routes, 'outlets': []}
+
+    def stop(self, stop_id, route_type, query):
+        stop = self.stops.get((route_type, stop_id))
+        if stop is None:
+            return 404, {'message': 'Stop not found'}
+        result = {
+            'stop_id': stop_id,
+            'stop_name': stop['stop_name'],
+            'route_type': route_type,
+            'disruption_ids': [],
+            'stop_location': None,
+            'stop_amenities': None,
+            'stop_accessibility': None,
+        }
+        if _flag(query, 'stop_location'):
+            result['stop_location'] = {'suburb': stop['stop_suburb'],
+                'gps': {'latitude': stop['stop_latitude'], 'longitude': stop['stop_longitude']}}
+        if _flag(query, 'stop_amenities'):
+            result['stop_amenities'] = {'toilet': False, 'taxi_rank': False, 'car_parking': '0'}
+        if _flag(query, 'stop_accessibility'):
+            result['stop_accessibility'] = {'lighting': True, 'platform_number': 0}
+        return 200, {'stop': result}
+
+    def stops_for_route(self, route_id, route_type):
+        if route_id not in self.route_stops or self.routes[route_id]['route_type'] != route_type:
+            return 404, {'message': 'Route not found'}
+        stops = [dict(self.stops[(route_type, stop_id)], stop_sequence=sequence)
+            for sequence, stop_id in enumerate(self.route_stops[route_id], 1)]
+        return 200, {'stops': stops}
+
+    def stops_near(self, latitude, longitude, query):
+        route_types = _ints(query, 'route_types')
+        max_results = int(query.get('max_results', [30])[0])
+        max_distance = float(query.get('max_distance', [300])[0])
+        stops = []
+        for (route_type, stop_id), stop in self.stops.items():
+            if route_types and route_type not in route_types:
+                continue
+            distance = haversine(latitude, longitude, stop['stop_latitude'], stop['stop_longitude'])
+            if distance <= max_distance:
+                stops.append(dict(stop, stop_distance=distance))
+        stops.sort(key=lambda stop: stop['stop_distance'])
+        return 200, {'stops': stops[:max_results]}
+
+    def respond(self, path, query, now):
+        """Answer a request.
+
+        Parameters
+            path (str)
+                Request path, still percent-encoded (e.g. '/v3/search/Flinders%20St')
+            query (dict)
+                Parsed query parameters, as from urllib.parse.parse_qs
+            now (datetime)
+                Time used when date_utc is not given
+
+        Returns
+            (status, payload) tuple
+        """
+        for pattern, handler in _ROUTES:
+            match = pattern.match(path)
+            if match:
+                return handler(self, query, now, *match.groups())
+        return 404, {'message': 'Unknown endpoint'}
+
+
+_ROUTES = [(re.compile('^/v3/' + pattern + '$'), handler) for pattern, handler in [
+    (r'departures/route_type/(\d+)/stop/(\d+)',
+        lambda n, q, now, rt, stop: n.departures(int(rt), int(stop), q, now)),
+    (r'departures/route_type/(\d+)/stop/(\d+)/route/(\d+)',
+        lambda n, q, now, rt, stop, route: n.departures(int(rt), int(stop), q, now, int(route))),
+    (r'directions/route/(\d+)', lambda n, q, now, route: n.directions_for_route(int(route))),
+    (r'directions/(\d+)', lambda n, q, now, direction: n.direction(int(direction))),
+    (r'directions/(\d+)/route_type/(\d+)',
+        lambda n, q, now, direction, rt: n.direction(int(direction), int(rt))),
+    (r'disruptions', lambda n, q, now: n.all_disruptions(q)),
+    (r'disruptions/route/(\d+)', lambda n, q, now, route: n.all_disruptions(q, int(route))),
+    (r'disruptions/(\d+)', lambda n, q, now, disruption: n.disruption(int(disruption))),
+    (r'pattern/run/(\d+)/route_type/(\d+)',
+        lambda n, q, now, run, rt: n.pattern(int(run), int(rt), q, now)),
+    (r'routes', lambda n, q, now: n.all_routes(q)),
+    (r'routes/(\d+)', lambda n, q, now, route: n.route(int(route))),
+    (r'route_types', lambda n, q, now: n.route_types()),
+    (r'runs/route/(\d+)', lambda n, q, now, route: n.runs_for_route(int(route))),
+    (r'runs/(\d+)', lambda n, q, now, run: n.run(int(run))),
+    (r'runs/(\d+)/route_type/(\d+)', lambda n, q, now, run, rt: n.run(int(run), int(rt))),
+    (r'search/([^/]+)', lambda n, q, now, term: n.search(term, q)),
+    (r'stops/(\d+)/route_type/(\d+)', lambda n, q, now, stop, rt: n.stop(int(stop), int(rt), q)),
+    (r'stops/route/(\d+)/route_type/(\d+)',
+        lambda n, q, now, route, rt: n.stops_for_route(int(route), int(rt))),
+    (r'stops/location/(-?[\d.]+),(-?[\d.]+)',
+        lambda n, q, now, lat, lon: n.stops_near(float(lat), float(lon), q)),
+]]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY each
+    # response can stall on the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, headers, body = self.server.fake.respond(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            if name.lower() not in ('content-type', 'content-length'):
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once.
+    request_queue_size = 1024
+
+
+class FakePTVServer(object):
+    """ Local stand-in for timetableapi.ptv.vic.gov.au.
+
+    Checks devid and signature exactly as the API does: the signature must
+    be the upper-case hex HMAC-SHA1, keyed with the developer's API key, of
+    the request path and query up to '&signature='. Requests are answered
+    from a cassette when one was recorded, otherwise from a
+    SyntheticNetwork. Latency, errors and throttling can be injected to
+    exercise the client's retry, rate limiting and pooling under load.
+    """
+
+    def __init__(self, keys, network=None, cassette=None, latency=0, error_rate=0,
+        error_status=503, rate=None, burst=None, host='127.0.0.1', port=0, seed=0,
+        clock=time.time):
+        """Initialize a FakePTVServer.
+
+        Parameters
+            keys (dict)
+                API keys by developer ID
+
+        Optional Parameters:
+            network (SyntheticNetwork)
+                Data served for requests not in the cassette (default = SyntheticNetwork())
+            cassette (Cassette or str)
+                Recorded responses served first, or the path of a cassette file
+            latency (float or callable)
+                Seconds added to every response, or a callable returning them
+            error_rate (float)
+                Fraction of authenticated requests answered with error_status (default = 0)
+            error_status (int)
+                Status of injected errors (default = 503)
+            rate (float)
+                Requests per second allowed per developer ID before answering
+                429 with Retry-After (default = unlimited)
+            burst (int)
+                Requests allowed at once before throttling (default = rate)
+            host (str)
+                Interface to listen on (default = '127.0.0.1')
+            port (int)
+                Port to listen on (default = 0, any free port)
+            seed (int)
+                Seed for error injection (default = 0)
+            clock (callable)
+                Returns the current Unix time, used when date_utc is not given
+        """
+        self.keys = keys
+        self.network = network if network is not None else SyntheticNetwork()
+        self.cassette = Cassette.load(cassette) if isinstance(cassette, str) else cassette
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate or 1)
+        self.host = host
+        self.port = port
+        self.clock = clock
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Scheme, host and port to pass to a client as base_url."""
+        return 'http://{}:{}'.format(self.host, self._server.server_port)
+
+    def start(self):
+        """Start serving on a background thread."""
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """Return request, rejected, error and throttled counters as a dict."""
+        return {'requests': self.requests, 'rejected': self.rejected, 'errors': self.errors,
+            'throttled': self.throttled}
+
+    def _reply(self, status, payload, headers=None):
+        if 'status' not in payload:
+            payload = dict(payload, status=STATUS)
+        return status, headers or {}, json.dumps(payload).encode('UTF-8')
+
+    def _authenticate(self, target):
+        signed, found, signature = target.rpartition('&signature=')
+        if not found:
+            return 'Forbidden (signature missing)'
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(signed).query)
+        key = self.keys.get(query.get('devid', [None])[0])
+        if key is None:
+            return 'Forbidden (invalid devid)'
+        expected = hmac.new(bytes(key, 'UTF-8'), bytes(signed, 'UTF-8'), sha1).hexdigest().upper()
+        if not hmac.compare_digest(expected, signature.upper()):
+            return 'Forbidden (invalid signature)'
+        return None
+
+    def _throttle(self, dev_id):
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(dev_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[dev_id] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[dev_id] = (tokens - 1, now)
+        return 0
+
+    def respond(self, target):
+        """Answer a request target (path and query, as sent by the client).
+
+        Returns
+            (status, headers, body bytes) tuple
+        """
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        error = self._authenticate(target)
+        parts = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(parts.query, keep_blank_values=True)
+        with self._lock:
+            self.requests += 1
+            if error is not None:
+                self.rejected += 1
+                return self._reply(403, {'message': error})
+            if self.rate is not None:
+                wait = self._throttle(query['devid'][0])
+                if wait:
+                    self.throttled += 1
+                    return self._reply(429, {'message': 'Too many requests'},
+                        {'Retry-After': str(int(math.ceil(wait)))})
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return self._reply(self.error_status, {'message': 'Injected error'})
+        if self.cassette is not None:
+            recorded = self.cassette.play(request_key(target))
+            if recorded is not None:
+                return recorded
+        now = datetime.fromtimestamp(self.clock(), timezone.utc)
+        try:
+            status, payload = self.network.respond(parts.path, query, now)
+        except (ValueError, KeyError) as e:
+            return self._reply(400, {'message': 'Bad request ({})'.format(e)})
+        except Exception as e:
+            return self._reply(500, {'message': 'Internal error ({})'.format(e)})
+        return self._reply(status, payload)
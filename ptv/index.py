@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+import time
+
+from .client import RouteType
+
+SNAPSHOT_VERSION = 1
+
+
+def _as_dict(obj):
+    return obj.to_dict() if hasattr(obj, 'to_dict') else obj
+
+
+def _key(name):
+    return name.strip().lower() if name else ''
+
+
+class NetworkIndex(object):
+    """ Offline tables of route types, routes, stops and directions.
+
+    Built by crawling the API once, then answers id to name and name to id
+    lookups without network calls. Snapshots can be saved and loaded so new
+    workers start warm.
+
+    Tables
+        route_types
+            route_type -> name
+        routes
+            route_id -> (route_type, route_name, route_number)
+        stops
+            (route_type, stop_id) -> (stop_name, stop_suburb, latitude, longitude)
+        directions
+            (route_id, direction_id) -> direction_name
+        route_stops
+            route_id -> tuple of stop_ids
+    """
+
+    def __init__(self):
+        self.route_types = {}
+        self.routes = {}
+        self.stops = {}
+        self.directions = {}
+        self.route_stops = {}
+        self.built_at = None
+        self._route_names = {}
+        self._stop_names = {}
+        self._direction_names = {}
+
+    @classmethod
+    def build(cls, client, route_types=None, max_workers=8):
+        """Crawl the API and build an index.
+
+        Calls get_route_types and get_routes once, then get_stops and
+        get_direction_for_route for every route.
+
+        Parameters
+            client (PTVClient)
+                Client used to crawl
+
+        Optional Parameters:
+            route_types (array[RouteType])
+                Only index these route types (default = all)
+            max_workers (int)
+                Number of requests made in parallel (default = 8)
+        """
+        index = cls()
+        for route_type in client.get_route_types()['route_types']:
+            route_type = _as_dict(route_type)
+            index.route_types[route_type['route_type']] = route_type['route_type_name']
+        routes = [_as_dict(route) for route in client.get_routes(route_types or [])['routes']]
+        for route in routes:
+            index.routes[route['route_id']] = (route['route_type'], route['route_name'],
+                route['route_number'])
+
+        def crawl(route):
+            route_type = RouteType(route['route_type'])
+            stops = client.get_stops(route['route_id'], route_type)['stops']
+            directions = client.get_direction_for_route(route['route_id'])['directions']
+            return route['route_id'], stops, directions
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for route_id, stops, directions in executor.map(crawl, routes):
+                stop_ids = []
+                for stop in map(_as_dict, stops):
+                    index.stops[(stop['route_type'], stop['stop_id'])] = (stop['stop_name'],
+                        stop.get('stop_suburb'), stop.get('stop_latitude'),
+                        stop.get('stop_longitude'))
+                    stop_ids.append(stop['stop_id'])
+                index.route_stops[route_id] = tuple(stop_ids)
+                for direction in map(_as_dict, directions):
+                    index.directions[(route_id, direction['direction_id'])] = \
+                        direction['direction_name']
+        index.built_at = time.time()
+        index._reindex()
+        return index
+
+    def _reindex(self):
+        self._route_names = {}
+        for route_id, (route_type, name, number) in self.routes.items():
+            self._route_names.setdefault(_key(name), []).append(route_id)
+            if number:
+                self._route_names.setdefault(_key(number), []).append(route_id)
+        self._stop_names = {}
+        for key, stop in self.stops.items():
+            self._stop_names.setdefault(_key(stop[0]), []).append(key)
+        self._direction_names = {}
+        for key, name in self.directions.items():
+            self._direction_names.setdefault(_key(name), []).append(key)
+
+    # Lookups
+    def route_type_name(self, route_type):
+        """Return the name of a route type (RouteType enum or int)."""
+        return self.route_types.get(getattr(route_type, 'value', route_type))
+
+    def route_name(self, route_id):
+        """Return the name of a route, or None if unknown."""
+        route = self.routes.get(route_id)
+        return route[1] if route else None
+
+    def route_ids(self, name, route_type=None):
+        """Return ids of routes whose name or number matches (case-insensitive).
+
+        Optional Parameters:
+            route_type (RouteType enum)
+                Only match routes of this type
+        """
+        route_ids = self._route_names.get(_key(name), [])
+        if route_type is None:
+            return list(route_ids)
+        return [route_id for route_id in route_ids if self.routes[route_id][0] == route_type.value]
+
+    def stop_name(self, stop_id, route_type):
+        """Return the name of a stop, or None if unknown.
+
+        Parameters
+            stop_id (int)
+                Identifier of stop
+            route_type (RouteType enum)
+                Type of Transport
+        """
+        stop = self.stops.get((route_type.value, stop_id))
+        return stop[0] if stop else None
+
+    def stop_ids(self, name, route_type=None):
+        """Return (route_type, stop_id) keys of stops whose name matches (case-insensitive).
+
+        Optional Parameters:
+            route_type (RouteType enum)
+                Only match stops of this type
+        """
+        keys = self._stop_names.get(_key(name), [])
+        if route_type is None:
+            return list(keys)
+        return [key for key in keys if key[0] == route_type.value]
+
+    def stops_on_route(self, route_id):
+        """Return the stop ids on a route, in the order returned by the API."""
+        return self.route_stops.get(route_id, ())
+
+    def direction_name(self, route_id, direction_id):
+        """Return the name of a direction of travel on a route, or None if unknown."""
+        return self.directions.get((route_id, direction_id))
+
+    def directions_for_route(self, route_id):
+        """Return (direction_id, direction_name) pairs for a route."""
+        return [(direction_id, name) for (rid, direction_id), name in self.directions.items()
+            if rid == route_id]
+
+    def direction_ids(self, name, route_id=None):
+        """Return (route_id, direction_id) keys of directions whose name matches (case-insensitive)."""
+        keys = self._direction_names.get(_key(name), [])
+        return [key for key in keys if route_id is None or key[0] == route_id]
+
+    # Snapshots
+    def save(self, path):
+        """Write a gzip-compressed JSON snapshot of the index to path."""
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'built_at': self.built_at,
+            'route_types': [[k, v] for k, v in self.route_types.items()],
+            'routes': [[k] + list(v) for k, v in self.routes.items()],
+            'stops': [list(k) + list(v) for k, v in self.stops.items()],
+            'directions': [list(k) + [v] for k, v in self.directions.items()],
+            'route_stops': [[k, list(v)] for k, v in self.route_stops.items()],
+        }
+        with gzip.open(path, 'wt', encoding='UTF-8', compresslevel=6) as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Read a snapshot written by save()."""
+        with gzip.open(path, 'rt', encoding='UTF-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version: {}'.format(snapshot.get('version')))
+        index = cls()
+        index.built_at = snapshot['built_at']
+        index.route_types = {k: v for k, v in snapshot['route_types']}
+        index.routes = {row[0]: tuple(row[1:]) for row in snapshot['routes']}
+        index.stops = {(row[0], row[1]): tuple(row[2:]) for row in snapshot['stops']}
+        index.directions = {(row[0], row[1]): row[2] for row in snapshot['directions']}
+        index.route_stops = {k: tuple(v) for k, v in snapshot['route_stops']}
+        index._reindex()
+        return index
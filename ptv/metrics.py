@@ -0,0 +1,270 @@
+from bisect import bisect_left
+import threading
+
+# Upper bounds in seconds of the default histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Values of CallEvent.cache
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class CallEvent(object):
+    """ One endpoint method call, reported to the client's observers when it completes.
+
+    Attributes
+        endpoint (str)
+            Path template of the endpoint, e.g. 'departures/route_type/{}/stop/{}'
+        path (str)
+            Request path
+        params (dict)
+            Query parameters of the request, excluding devid and signature
+        key (str)
+            Canonical cache key of the request, or None when it was not cacheable
+        status (int)
+            HTTP status of the last response, or None if no response was received
+        bytes (int)
+            Size of the response body
+        connect_time (float)
+            Seconds spent opening a connection, 0 when one was reused, or None
+            when the transport does not report it
+        ttfb (float)
+            Seconds from sending the request to receiving the response headers,
+            or None when the transport does not report it
+        decode_time (float)
+            Seconds spent decoding the JSON body, or None
+        duration (float)
+            Seconds the whole call took
+        cache (str)
+            HIT, STALE or MISS, or None when the request was not cacheable
+        requests (int)
+            Requests sent, including retries
+        retries (int)
+            Requests repeated after an error or retryable status
+        coalesced (bool)
+            True when the call shared another call's in-flight request
+        error (Exception)
+            Exception raised to the caller, if any
+    """
+    __slots__ = ('endpoint', 'path', 'params', 'key', 'status', 'bytes', 'connect_time', 'ttfb',
+        'decode_time', 'duration', 'cache', 'requests', 'retries', 'coalesced', 'error')
+
+    def __init__(self, endpoint, path, params=None):
+        self.endpoint = endpoint
+        self.path = path
+        self.params = params
+        self.key = None
+        self.status = None
+        self.bytes = 0
+        self.connect_time = None
+        self.ttfb = None
+        self.decode_time = None
+        self.duration = 0.0
+        self.cache = None
+        self.requests = 0
+        self.retries = 0
+        self.coalesced = False
+        self.error = None
+
+    def record_response(self, response):
+        """Take the status, size and timings of a transport response."""
+        self.status = response.status_code
+        self.bytes = len(response.content)
+        self.connect_time = getattr(response, 'connect_time', None)
+        self.ttfb = getattr(response, 'ttfb', None)
+
+    def __repr__(self):
+        return 'CallEvent({!r}, status={!r}, duration={:.6f})'.format(self.endpoint, self.status,
+            self.duration)
+
+
+class Histogram(object):
+    """ Cumulative histogram with fixed bucket bounds, as exposed by Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize a Histogram.
+
+        Optional Parameters:
+            buckets (tuple)
+                Upper bounds of the buckets (default = DEFAULT_BUCKETS)
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket, or None if empty.
+
+        Values above the last bound are reported as the last bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """Yield (upper bound, count of values at or below it), ending with infinity."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class _EndpointMetrics(object):
+
+    def __init__(self, buckets):
+        self.calls = {}
+        self.cache = {}
+        self.duration = Histogram(buckets)
+        self.connect = Histogram(buckets)
+        self.ttfb = Histogram(buckets)
+        self.decode = Histogram(buckets)
+        self.bytes = 0
+        self.retries = 0
+
+
+def _outcome(event):
+    if event.error is not None and event.status is None and not event.coalesced:
+        return 'error'
+    if event.cache in (HIT, STALE):
+        return 'cached'
+    if event.coalesced:
+        return 'coalesced'
+    return str(event.status)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsCollector(object):
+    """ Observer aggregating CallEvents into per-endpoint counters and histograms.
+
+    Pass it to a client with observers=[collector] or client.add_observer(collector).
+    """
+
+    # (attribute, metric name, help) of the histograms kept per endpoint
+    HISTOGRAMS = (
+        ('duration', 'call_duration_seconds', 'Duration of endpoint method calls.'),
+        ('connect', 'connect_duration_seconds', 'Time spent opening new connections.'),
+        ('ttfb', 'time_to_first_byte_seconds', 'Time from sending a request to its response headers.'),
+        ('decode', 'decode_duration_seconds', 'Time spent decoding response bodies.'),
+    )
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, namespace='ptv'):
+        """Initialize a MetricsCollector.
+
+        Optional Parameters:
+            buckets (tuple)
+                Upper bounds in seconds of every histogram (default = DEFAULT_BUCKETS)
+            namespace (str)
+                Prefix of the exposed metric names (default = 'ptv')
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.namespace = namespace
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            metrics = self._endpoints.get(event.endpoint)
+            if metrics is None:
+                metrics = self._endpoints[event.endpoint] = _EndpointMetrics(self.buckets)
+            outcome = _outcome(event)
+            metrics.calls[outcome] = metrics.calls.get(outcome, 0) + 1
+            if event.cache is not None:
+                metrics.cache[event.cache] = metrics.cache.get(event.cache, 0) + 1
+            metrics.duration.observe(event.duration)
+            if event.connect_time:
+                metrics.connect.observe(event.connect_time)
+            if event.ttfb is not None:
+                metrics.ttfb.observe(event.ttfb)
+            if event.decode_time is not None:
+                metrics.decode.observe(event.decode_time)
+            metrics.bytes += event.bytes
+            metrics.retries += event.retries
+
+    def reset(self):
+        """Discard everything collected so far."""
+        with self._lock:
+            self._endpoints = {}
+
+    def summary(self):
+        """Return call counts and latency percentiles keyed by endpoint template.
+
+        Percentiles are estimated from the histogram buckets.
+        """
+        with self._lock:
+            summary = {}
+            for endpoint, metrics in self._endpoints.items():
+                summary[endpoint] = {
+                    'calls': dict(metrics.calls),
+                    'cache': dict(metrics.cache),
+                    'bytes': metrics.bytes,
+                    'retries': metrics.retries,
+                    'p50': metrics.duration.quantile(0.5),
+                    'p90': metrics.duration.quantile(0.9),
+                    'p99': metrics.duration.quantile(0.99),
+                    'ttfb_p99': metrics.ttfb.quantile(0.99),
+                }
+            return summary
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        prefix = self.namespace + '_' if self.namespace else ''
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+
+            def counter(name, help, values):
+                lines.append('# HELP {}{} {}'.format(prefix, name, help))
+                lines.append('# TYPE {}{} counter'.format(prefix, name))
+                for labels, value in values:
+                    lines.append('{}{}{{{}}} {}'.format(prefix, name, labels, _number(value)))
+
+            counter('calls_total', 'Endpoint method calls by outcome.', [
+                ('endpoint="{}",outcome="{}"'.format(_label(endpoint), _label(outcome)), count)
+                for endpoint, metrics in endpoints for outcome, count in sorted(metrics.calls.items())])
+            counter('cache_lookups_total', 'Cache lookups by result.', [
+                ('endpoint="{}",result="{}"'.format(_label(endpoint), result), count)
+                for endpoint, metrics in endpoints for result, count in sorted(metrics.cache.items())])
+            counter('response_bytes_total', 'Bytes of response bodies received.', [
+                ('endpoint="{}"'.format(_label(endpoint)), metrics.bytes)
+                for endpoint, metrics in endpoints])
+            counter('retries_total', 'Requests repeated after a failure.', [
+                ('endpoint="{}"'.format(_label(endpoint)), metrics.retries)
+                for endpoint, metrics in endpoints])
+            for attribute, name, help in self.HISTOGRAMS:
+                lines.append('# HELP {}{} {}'.format(prefix, name, help))
+                lines.append('# TYPE {}{} histogram'.format(prefix, name))
+                for endpoint, metrics in endpoints:
+                    histogram = getattr(metrics, attribute)
+                    labels = 'endpoint="{}"'.format(_label(endpoint))
+                    for bound, count in histogram.cumulative():
+                        lines.append('{}{}_bucket{{{},le="{}"}} {}'.format(prefix, name, labels,
+                            _number(bound), count))
+                    lines.append('{}{}_sum{{{}}} {}'.format(prefix, name, labels,
+                        _number(histogram.sum)))
+                    lines.append('{}{}_count{{{}}} {}'.format(prefix, name, labels, histogram.count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,198 @@
+from datetime import datetime
+from datetime import timezone
+import functools
+import sys
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 UTC timestamp from the API (e.g. '2020-01-01T08:30:00Z').
+
+    Returns
+        Timezone aware datetime, or None if value is None
+    """
+    if value is None:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class Timestamp(object):
+    """ Descriptor exposing a timestamp slot as a datetime, parsed on first access."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if value.__class__ is str:
+            value = parse_datetime(value)
+            setattr(obj, self.slot, value)
+        return value
+
+
+class Model(object):
+    """ Base class for compact result objects.
+
+    Fields listed in _fields are copied from the payload into slots; those
+    in _interned are interned so repeated names share one string; those in
+    _timestamps keep the raw string until first accessed. Unlisted payload
+    keys are dropped.
+    """
+    __slots__ = ()
+    _fields = ()
+    _interned = ()
+    _timestamps = ()
+
+    def __init__(self, raw):
+        """Initialize a Model.
+
+        Parameters
+            raw (dict)
+                Object from an API response
+        """
+        get = raw.get
+        for field in self._fields:
+            setattr(self, field, get(field))
+        for field in self._interned:
+            value = get(field)
+            setattr(self, field, sys.intern(value) if value.__class__ is str else value)
+        for field in self._timestamps:
+            setattr(self, '_' + field, get(field))
+
+    def to_dict(self):
+        """Return the fields as a dict, with timestamps as datetimes."""
+        names = self._fields + self._interned + self._timestamps
+        return {name: getattr(self, name) for name in names}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        key = self._fields[0]
+        return '{}({}={!r})'.format(type(self).__name__, key, getattr(self, key))
+
+
+class Departure(Model):
+    """ A departure of a run from a stop."""
+    __slots__ = ('stop_id', 'route_id', 'run_id', 'direction_id', 'disruption_ids',
+        'at_platform', 'departure_sequence', 'run_ref', 'platform_number', 'flags',
+        '_scheduled_departure_utc', '_estimated_departure_utc')
+    _fields = ('stop_id', 'route_id', 'run_id', 'direction_id', 'disruption_ids',
+        'at_platform', 'departure_sequence')
+    _interned = ('run_ref', 'platform_number', 'flags')
+    _timestamps = ('scheduled_departure_utc', 'estimated_departure_utc')
+    scheduled_departure_utc = Timestamp('_scheduled_departure_utc')
+    estimated_departure_utc = Timestamp('_estimated_departure_utc')
+
+
+class Run(Model):
+    """ A trip/service run."""
+    __slots__ = ('run_id', 'route_id', 'route_type', 'final_stop_id', 'direction_id',
+        'run_sequence', 'express_stop_count', 'vehicle_position', 'vehicle_descriptor',
+        'run_ref', 'destination_name', 'status')
+    _fields = ('run_id', 'route_id', 'route_type', 'final_stop_id', 'direction_id',
+        'run_sequence', 'express_stop_count', 'vehicle_position', 'vehicle_descriptor')
+    _interned = ('run_ref', 'destination_name', 'status')
+
+
+class Stop(Model):
+    """ A stop, with location, amenity and accessibility details when requested."""
+    __slots__ = ('stop_id', 'route_type', 'stop_latitude', 'stop_longitude', 'stop_sequence',
+        'stop_distance', 'stop_location', 'stop_amenities', 'stop_accessibility', 'routes',
+        'stop_name', 'stop_suburb', 'stop_landmark')
+    _fields = ('stop_id', 'route_type', 'stop_latitude', 'stop_longitude', 'stop_sequence',
+        'stop_distance', 'stop_location', 'stop_amenities', 'stop_accessibility', 'routes')
+    _interned = ('stop_name', 'stop_suburb', 'stop_landmark')
+
+
+class Route(Model):
+    """ A route and its name and number."""
+    __slots__ = ('route_id', 'route_type', 'route_name', 'route_number', 'route_gtfs_id')
+    _fields = ('route_id', 'route_type')
+    _interned = ('route_name', 'route_number', 'route_gtfs_id')
+
+
+class Direction(Model):
+    """ A direction of travel on a route."""
+    __slots__ = ('direction_id', 'route_id', 'route_type', 'direction_name',
+        'route_direction_description')
+    _fields = ('direction_id', 'route_id', 'route_type')
+    _interned = ('direction_name', 'route_direction_description')
+
+
+class Disruption(Model):
+    """ A current or planned disruption."""
+    __slots__ = ('disruption_id', 'title', 'url', 'description', 'display_on_board',
+        'display_status', 'routes', 'stops', 'disruption_status', 'disruption_type', 'colour',
+        '_published_on', '_last_updated', '_from_date', '_to_date')
+    _fields = ('disruption_id', 'title', 'url', 'description', 'display_on_board',
+        'display_status', 'routes', 'stops')
+    _interned = ('disruption_status', 'disruption_type', 'colour')
+    _timestamps = ('published_on', 'last_updated', 'from_date', 'to_date')
+    published_on = Timestamp('_published_on')
+    last_updated = Timestamp('_last_updated')
+    from_date = Timestamp('_from_date')
+    to_date = Timestamp('_to_date')
+
+
+# Response keys holding one object, and keys holding a collection of objects.
+SINGLE_MODELS = {
+    'run': Run,
+    'stop': Stop,
+    'route': Route,
+    'disruption': Disruption,
+}
+
+COLLECTION_MODELS = {
+    'departures': Departure,
+    'runs': Run,
+    'stops': Stop,
+    'routes': Route,
+    'directions': Direction,
+    'disruptions': Disruption,
+}
+
+
+def _convert_collection(model, value):
+    if isinstance(value, list):
+        return [model(item) for item in value]
+    if isinstance(value, dict):
+        # Expansions are keyed by id; disruptions are grouped by mode in lists.
+        return {key: _convert_collection(model, item) if isinstance(item, list) else model(item)
+            for key, item in value.items()}
+    return value
+
+
+def parse_response(payload, entities=None):
+    """Convert the objects in an API response into model instances.
+
+    Parameters
+        payload (dict)
+            Decoded JSON response
+
+    Optional Parameters:
+        entities (EntityStore)
+            Store whose entities are converted to one shared model each
+
+    Returns
+        A new dict with the same keys; known objects are replaced by
+        Departure, Run, Stop, Route, Direction and Disruption instances
+    """
+    result = {}
+    for key, value in payload.items():
+        if key in SINGLE_MODELS and isinstance(value, dict):
+            result[key] = (SINGLE_MODELS[key](value) if entities is None
+                else entities.model(key + 's', value))
+        elif key in COLLECTION_MODELS:
+            model = (COLLECTION_MODELS[key] if entities is None
+                else functools.partial(entities.model, key))
+            result[key] = _convert_collection(model, value)
+        else:
+            result[key] = value
+    return result
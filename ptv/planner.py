@@ -0,0 +1,351 @@
+from bisect import bisect_left
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timezone
+
+from .client import RouteType
+from .columnar import MISSING_TIME
+from .columnar import epoch_seconds
+
+# Later than any arrival.
+NEVER = 2 ** 62
+
+
+def _as_dict(obj):
+    return obj.to_dict() if hasattr(obj, 'to_dict') else obj
+
+
+def _seconds(value):
+    """Seconds since the epoch of a datetime (naive taken as UTC), ISO 8601 string or number."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(epoch_seconds([value])[0])
+
+
+def _datetime(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def _stop_key(stop):
+    route_type, stop_id = stop
+    return getattr(route_type, 'value', route_type), stop_id
+
+
+def _run_ref(departure):
+    run_ref = departure.get('run_ref')
+    return run_ref if run_ref is not None else str(departure.get('run_id'))
+
+
+class JourneyPlanner(object):
+    """ Earliest-arrival journeys answered locally from crawled stopping patterns.
+
+    Every pair of consecutive stops on a run is a connection; connections
+    are kept sorted by departure time and scanned once per query (the
+    connection scan algorithm). Real-time estimates are patched into the
+    affected connections without rebuilding.
+
+    Stops are identified by (route_type, stop_id) keys, as in NetworkIndex.
+    """
+
+    def __init__(self):
+        self._stops = {}
+        self._stop_keys = []
+        self._transfers = {}
+        # Per trip: run_ref, (route_type, route_id), stop indexes, scheduled,
+        # current and real-time flag for each stop, in order of travel.
+        self._trip_runs = []
+        self._trip_routes = []
+        self._trip_stops = []
+        self._trip_scheduled = []
+        self._trip_times = []
+        self._trip_estimated = []
+        self._runs = {}
+        # Connections as parallel lists sorted by departure time.
+        self._dep = []
+        self._arr = []
+        self._from = []
+        self._to = []
+        self._trip = []
+        self._seq = []
+        self._sorted = True
+
+    @classmethod
+    def build(cls, client, route_ids, date_utc=None, max_workers=8):
+        """Crawl the runs of routes and build a planner from their stopping patterns.
+
+        Calls get_runs_for_route for every route, then
+        get_stopping_pattern_for_run for every run.
+
+        Parameters
+            client (PTVClient)
+                Client used to crawl
+            route_ids (array[int])
+                Routes to include
+
+        Optional Parameters:
+            date_utc (datetime or str)
+                Day of the patterns (default = today, as returned by the API)
+            max_workers (int)
+                Number of requests made in parallel (default = 8)
+        """
+        planner = cls()
+        if isinstance(date_utc, datetime):
+            date_utc = date_utc.strftime('%Y-%m-%dT%H:%M:%SZ')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            runs = [_as_dict(run) for result in executor.map(client.get_runs_for_route, route_ids)
+                for run in result['runs']]
+
+            def crawl(run):
+                return client.get_stopping_pattern_for_run(run['run_id'],
+                    RouteType(run['route_type']), date_utc=date_utc)
+
+            for run, pattern in zip(runs, executor.map(crawl, runs)):
+                planner.add_pattern(run['route_type'], pattern['departures'], run['route_id'])
+        planner._sort()
+        return planner
+
+    def __len__(self):
+        return len(self._dep)
+
+    def _stop(self, key):
+        index = self._stops.get(key)
+        if index is None:
+            index = self._stops[key] = len(self._stop_keys)
+            self._stop_keys.append(key)
+        return index
+
+    def add_pattern(self, route_type, departures, route_id=None):
+        """Add the connections of one run.
+
+        Parameters
+            route_type (RouteType enum or int)
+                Type of transport of the run
+            departures (list)
+                Departures of a stopping pattern (dicts or models)
+
+        Optional Parameters:
+            route_id (int)
+                Route of the run (default = taken from the departures)
+        """
+        route_type = getattr(route_type, 'value', route_type)
+        departures = [_as_dict(departure) for departure in departures]
+        if len(departures) < 2:
+            return
+        scheduled = epoch_seconds([d['scheduled_departure_utc'] for d in departures]).tolist()
+        estimated = epoch_seconds([d.get('estimated_departure_utc') for d in departures]).tolist()
+        calls = sorted(zip(scheduled, [d.get('departure_sequence') or 0 for d in departures],
+            estimated, departures), key=lambda call: call[:2])
+        trip = len(self._trip_runs)
+        run_ref = _run_ref(departures[0])
+        self._trip_runs.append(run_ref)
+        self._trip_routes.append((route_type, route_id if route_id is not None
+            else departures[0].get('route_id')))
+        self._trip_stops.append([self._stop((route_type, call[3]['stop_id'])) for call in calls])
+        self._trip_scheduled.append([call[0] for call in calls])
+        self._trip_estimated.append([call[2] != MISSING_TIME for call in calls])
+        self._trip_times.append([call[2] if call[2] != MISSING_TIME else call[0] for call in calls])
+        self._runs.setdefault(run_ref, []).append(trip)
+        times, stops = self._trip_times[trip], self._trip_stops[trip]
+        for seq in range(len(calls) - 1):
+            self._dep.append(times[seq])
+            self._arr.append(times[seq + 1])
+            self._from.append(stops[seq])
+            self._to.append(stops[seq + 1])
+            self._trip.append(trip)
+            self._seq.append(seq)
+        self._sorted = False
+
+    def add_transfer(self, origin, destination, seconds, both_ways=True):
+        """Allow walking between two stops.
+
+        Parameters
+            origin (tuple)
+                (route_type, stop_id) of the stop walked from
+            destination (tuple)
+                (route_type, stop_id) of the stop walked to
+            seconds (int)
+                Walking time, including any time needed to change
+
+        Optional Parameters:
+            both_ways (bool)
+                Also allow walking back (default = true)
+        """
+        a, b = self._stop(_stop_key(origin)), self._stop(_stop_key(destination))
+        self._transfers.setdefault(a, []).append((b, seconds))
+        if both_ways:
+            self._transfers.setdefault(b, []).append((a, seconds))
+
+    def _sort(self):
+        if self._sorted:
+            return
+        order = sorted(range(len(self._dep)), key=self._dep.__getitem__)
+        for name in ('_dep', '_arr', '_from', '_to', '_trip', '_seq'):
+            column = getattr(self, name)
+            setattr(self, name, [column[i] for i in order])
+        self._sorted = True
+
+    def plan(self, origin, destination, departure_time, min_change=0):
+        """Find the earliest arrival at a stop leaving at or after a time.
+
+        Parameters
+            origin (tuple)
+                (route_type, stop_id) to leave from
+            destination (tuple)
+                (route_type, stop_id) to arrive at
+            departure_time (datetime or str)
+                Earliest time to leave (naive datetimes are taken as UTC)
+
+        Optional Parameters:
+            min_change (int)
+                Seconds needed to change between runs at a stop (default = 0)
+
+        Returns
+            dict with departure_utc, arrival_utc and legs, or None when the
+            destination can't be reached. Each leg has from_stop, to_stop,
+            departure_utc, arrival_utc, and the run_ref, route_type and
+            route_id of the run ridden (None for walks).
+        """
+        self._sort()
+        source = self._stops.get(_stop_key(origin))
+        target = self._stops.get(_stop_key(destination))
+        if source is None or target is None:
+            return None
+        start = _seconds(departure_time)
+        arrival = [NEVER] * len(self._stop_keys)
+        ready = [NEVER] * len(self._stop_keys)
+        via = [None] * len(self._stop_keys)
+        # Runs ridden to reach each stop; ties on arrival go to fewer runs.
+        rides = [NEVER] * len(self._stop_keys)
+        arrival[source] = ready[source] = start
+        rides[source] = 0
+        transfers = self._transfers
+        for stop, seconds in transfers.get(source, ()):
+            if start + seconds < arrival[stop]:
+                arrival[stop] = ready[stop] = start + seconds
+                rides[stop] = 0
+                via[stop] = (None, source, seconds)
+        boarded = {}
+        dep, arr, from_, to, trips = self._dep, self._arr, self._from, self._to, self._trip
+        for c in range(bisect_left(dep, start), len(dep)):
+            if dep[c] > arrival[target]:
+                break
+            trip = trips[c]
+            board = boarded.get(trip)
+            if ready[from_[c]] <= dep[c] and (board is None or
+                    rides[from_[c]] <= rides[from_[board]]):
+                # Boarding as late as possible avoids riding out and back.
+                board = boarded[trip] = c
+            elif board is None:
+                continue
+            stop, time, count = to[c], arr[c], rides[from_[board]] + 1
+            if time < arrival[stop] or (time == arrival[stop] and count < rides[stop]):
+                arrival[stop], ready[stop], rides[stop] = time, time + min_change, count
+                via[stop] = (trip, board, c)
+                for other, seconds in transfers.get(stop, ()):
+                    if time + seconds < arrival[other]:
+                        arrival[other] = ready[other] = time + seconds
+                        rides[other] = count
+                        via[other] = (None, stop, seconds)
+        if arrival[target] == NEVER:
+            return None
+        return self._journey(source, target, start, arrival, via)
+
+    def _journey(self, source, target, start, arrival, via):
+        legs = []
+        stop = target
+        while stop != source:
+            trip, first, last = via[stop]
+            if trip is None:
+                legs.append({
+                    'from_stop': self._stop_keys[first],
+                    'to_stop': self._stop_keys[stop],
+                    'departure_utc': _datetime(arrival[stop] - last),
+                    'arrival_utc': _datetime(arrival[stop]),
+                    'run_ref': None,
+                    'route_type': None,
+                    'route_id': None,
+                })
+                stop = first
+                continue
+            route_type, route_id = self._trip_routes[trip]
+            legs.append({
+                'from_stop': self._stop_keys[self._from[first]],
+                'to_stop': self._stop_keys[self._to[last]],
+                'departure_utc': _datetime(self._dep[first]),
+                'arrival_utc': _datetime(self._arr[last]),
+                'run_ref': self._trip_runs[trip],
+                'route_type': route_type,
+                'route_id': route_id,
+            })
+            stop = self._from[first]
+        legs.reverse()
+        return {
+            'departure_utc': legs[0]['departure_utc'] if legs else _datetime(start),
+            'arrival_utc': _datetime(arrival[target]),
+            'legs': legs,
+        }
+
+    def update(self, departures):
+        """Patch real-time estimates into the runs they belong to.
+
+        Each estimate moves its run's later stops by the same delay, up to
+        the next stop with an estimate of its own. Only the connections of
+        the stops that moved are re-sorted.
+
+        Parameters
+            departures (dict or list)
+                Response of get_departure_from_stop or get_stopping_pattern_for_run,
+                or a list of departures (dicts or models)
+
+        Returns
+            Number of stop times changed (int)
+        """
+        self._sort()
+        rows = departures.get('departures', []) if isinstance(departures, dict) else departures
+        changed = 0
+        for departure in map(_as_dict, rows):
+            estimated = departure.get('estimated_departure_utc')
+            if estimated is None:
+                continue
+            found = self._find(_run_ref(departure), departure['stop_id'],
+                _seconds(departure['scheduled_departure_utc']))
+            if found is not None:
+                changed += self._patch(found[0], found[1], _seconds(estimated))
+        return changed
+
+    def _find(self, run_ref, stop_id, scheduled):
+        for trip in self._runs.get(run_ref, ()):
+            for seq, stop in enumerate(self._trip_stops[trip]):
+                if self._stop_keys[stop][1] == stop_id and self._trip_scheduled[trip][seq] == scheduled:
+                    return trip, seq
+        return None
+
+    def _patch(self, trip, seq, estimated):
+        scheduled, times = self._trip_scheduled[trip], self._trip_times[trip]
+        flags = self._trip_estimated[trip]
+        previous = list(times)
+        delay = estimated - scheduled[seq]
+        times[seq], flags[seq] = estimated, True
+        for later in range(seq + 1, len(times)):
+            if flags[later]:
+                break
+            times[later] = scheduled[later] + delay
+        moved = [i for i in range(len(times)) if times[i] != previous[i]]
+        # A stop's time is the departure of its connection and the arrival of the one before.
+        for connection in sorted(set(moved) | set(i - 1 for i in moved)):
+            if 0 <= connection < len(times) - 1:
+                self._move(trip, connection, previous[connection])
+        return len(moved)
+
+    def _move(self, trip, seq, old_departure):
+        i = bisect_left(self._dep, old_departure)
+        while self._trip[i] != trip or self._seq[i] != seq:
+            i += 1
+        columns = (self._dep, self._arr, self._from, self._to, self._trip, self._seq)
+        row = [column.pop(i) for column in columns]
+        times = self._trip_times[trip]
+        row[0], row[1] = times[seq], times[seq + 1]
+        i = bisect_right(self._dep, row[0])
+        for column, value in zip(columns, row):
+            column.insert(i, value)
@@ -0,0 +1,283 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from .metrics import HIT
+from .metrics import MISS
+from .metrics import STALE
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry(object):
+    __slots__ = ('path', 'params', 'ttl', 'score', 'seen', 'expires', 'prefetched', 'in_flight',
+        'deferred')
+
+    def __init__(self, path, params, ttl):
+        self.path = path
+        self.params = params
+        self.ttl = ttl
+        self.score = 0.0
+        self.seen = None
+        # None until the entry's expiry is known.
+        self.expires = None
+        self.prefetched = False
+        self.in_flight = False
+        # True once counted over budget until its expiry moves.
+        self.deferred = False
+
+
+class PrefetchScheduler(object):
+    """ Refreshes hot cache entries shortly before they expire.
+
+    Attached to a client as an observer, it counts calls per canonical
+    request (the cache key), decaying the count with a half life. When an
+    entry is about to expire it is fetched again if it is still hot and the
+    upstream budget allows, hottest first; cold entries are left to lapse
+    and forgotten. Works with PTVClient (refreshing on a background thread)
+    and AsyncPTVClient (refreshing in a task on the running event loop).
+
+    A prefetch is a hit when the refreshed entry is served from the cache
+    before its next refresh, and wasted otherwise.
+    """
+
+    def __init__(self, client, lead=2, min_hits=2, half_life=60, rate=1, burst=None,
+        interval=0.5, max_workers=4, clock=time.monotonic):
+        """Initialize a PrefetchScheduler.
+
+        Parameters
+            client (PTVClient or AsyncPTVClient)
+                Client whose cache is kept warm; must have a cache
+
+        Optional Parameters:
+            lead (float)
+                Seconds before expiry that an entry is refreshed, at most half
+                its time to live (default = 2)
+            min_hits (float)
+                Decayed number of calls that makes an entry hot (default = 2)
+            half_life (float)
+                Seconds for an entry's call count to halve (default = 60)
+            rate (float)
+                Prefetch requests per second allowed upstream (default = 1)
+            burst (int)
+                Prefetch requests that may be made at once (default = rate)
+            interval (float)
+                Seconds between checks for entries due (default = 0.5)
+            max_workers (int)
+                Prefetches made in parallel by PTVClient (default = 4)
+            clock (callable)
+                Returns the current time in seconds, the clock of the client's
+                cache (default = time.monotonic)
+        """
+        if client.cache is None:
+            raise ValueError('PrefetchScheduler needs a client with a cache')
+        self.client = client
+        self.lead = lead
+        self.min_hits = min_hits
+        self.half_life = half_life
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.interval = interval
+        self.max_workers = max_workers
+        self.clock = clock
+        self.prefetches = 0
+        self.prefetch_hits = 0
+        self.wasted = 0
+        self.lapsed = 0
+        self.over_budget = 0
+        self.errors = 0
+        self._entries = {}
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._task = None
+        client.add_observer(self)
+
+    def _decayed(self, entry, now):
+        if entry.seen is None:
+            return entry.score
+        return entry.score * 0.5 ** ((now - entry.seen) / self.half_life)
+
+    def __call__(self, event):
+        """Record a call; the client calls this for every endpoint method call."""
+        if event.key is None or event.error is not None:
+            return
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(event.key)
+            if entry is None:
+                entry = self._entries[event.key] = _Entry(event.path, dict(event.params or {}),
+                    self.client.cache_policy.ttl_for(event.path))
+            entry.score = self._decayed(entry, now) + 1
+            entry.seen = now
+            if event.cache == MISS:
+                entry.expires = now + entry.ttl
+                entry.deferred = False
+            elif event.cache in (HIT, STALE):
+                if entry.prefetched:
+                    self.prefetch_hits += 1
+                    entry.prefetched = False
+                if event.cache == STALE:
+                    # The client is refreshing it in the background.
+                    entry.expires = now + entry.ttl
+                    entry.deferred = False
+                elif entry.expires is None:
+                    # Cached before it was tracked; refresh it once it is hot.
+                    entry.expires = now
+
+    def due(self):
+        """Return the (key, entry) pairs to refresh now, hottest first, taking
+        their share of the budget and forgetting cold entries that are due."""
+        now = self.clock()
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            candidates = []
+            for key, entry in list(self._entries.items()):
+                if entry.in_flight or entry.expires is None:
+                    continue
+                if now < entry.expires - min(self.lead, entry.ttl / 2):
+                    continue
+                score = self._decayed(entry, now)
+                if score < self.min_hits:
+                    del self._entries[key]
+                    self.lapsed += 1
+                    if entry.prefetched:
+                        self.wasted += 1
+                    continue
+                candidates.append((score, key, entry))
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            selected = []
+            for score, key, entry in candidates:
+                if self._tokens < 1:
+                    if not entry.deferred:
+                        self.over_budget += 1
+                        entry.deferred = True
+                    continue
+                self._tokens -= 1
+                entry.in_flight = True
+                entry.deferred = False
+                selected.append((key, entry))
+            return selected
+
+    def _load(self, key, entry):
+        client = self.client
+        if client.single_flight is None:
+            return client._load(key, entry.ttl, entry.path, entry.params)
+        # Share the request with callers missing the cache at the same time.
+        return client.single_flight.do(key, client._load, key, entry.ttl, entry.path, entry.params)
+
+    def _finish(self, key, entry, error=None):
+        with self._lock:
+            entry.in_flight = False
+            if error is not None:
+                self.errors += 1
+                # Wait for the next call to find out when it expires.
+                entry.expires = None
+                logger.warning('Prefetch of %s failed', key, exc_info=error)
+                return
+            self.prefetches += 1
+            if entry.prefetched:
+                self.wasted += 1
+            entry.prefetched = True
+            entry.expires = self.clock() + entry.ttl
+
+    def _prefetch(self, item):
+        key, entry = item
+        try:
+            self._load(key, entry)
+        except Exception as e:
+            self._finish(key, entry, e)
+        else:
+            self._finish(key, entry)
+
+    async def _prefetch_async(self, item):
+        key, entry = item
+        try:
+            await self._load(key, entry)
+        except Exception as e:
+            self._finish(key, entry, e)
+        else:
+            self._finish(key, entry)
+        finally:
+            # Also when cancelled by stop(), so a restart can refresh it again.
+            with self._lock:
+                entry.in_flight = False
+
+    def tick(self):
+        """Refresh the entries due with a PTVClient, returning how many were fetched."""
+        due = self.due()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        list(self._executor.map(self._prefetch, due))
+        return len(due)
+
+    async def tick_async(self):
+        """Refresh the entries due with an AsyncPTVClient, returning how many were fetched."""
+        due = self.due()
+        await asyncio.gather(*[self._prefetch_async(item) for item in due])
+        return len(due)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                logger.warning('Prefetch check failed', exc_info=True)
+
+    async def _run_async(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick_async()
+            except Exception:
+                logger.warning('Prefetch check failed', exc_info=True)
+
+    def start(self):
+        """Start refreshing in the background, tracking calls again after stop().
+
+        With an AsyncPTVClient this must be called from a coroutine, and the
+        refreshes run in a task on its event loop.
+        """
+        self._stopped.clear()
+        if self not in self.client.observers:
+            self.client.add_observer(self)
+        if asyncio.iscoroutinefunction(self.client._load):
+            self._task = asyncio.get_running_loop().create_task(self._run_async())
+        else:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop refreshing in the background and stop tracking calls."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self in self.client.observers:
+            self.client.remove_observer(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        """Return tracking and prefetch counters as a dict."""
+        with self._lock:
+            return {'tracked': len(self._entries), 'prefetches': self.prefetches,
+                'prefetch_hits': self.prefetch_hits, 'wasted': self.wasted,
+                'lapsed': self.lapsed, 'over_budget': self.over_budget, 'errors': self.errors}
@@ -0,0 +1,267 @@
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+class RateLimiter(object):
+    """ Token bucket rate limiter with one bucket per developer ID."""
+
+    def __init__(self, rate, burst=None, rates=None, clock=time.monotonic):
+        """Initialize a RateLimiter.
+
+        Parameters
+            rate (float)
+                Requests per second allowed for each developer ID
+
+        Optional Parameters:
+            burst (int)
+                Requests that may be made at once before throttling (default = rate)
+            rates (dict)
+                (rate, burst) tuples keyed by developer ID, overriding rate and burst
+            clock (callable)
+                Returns the current time in seconds (default = time.monotonic)
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.rates = rates or {}
+        self.clock = clock
+        self.throttled = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        """Hold the buckets, (tokens, updated) keyed by developer ID, for one update."""
+        with self._lock:
+            yield self._buckets
+
+    def _tokens(self, buckets, dev_id, now):
+        rate, burst = self.rates.get(dev_id, (self.rate, self.burst))
+        tokens, updated = buckets.get(dev_id, (burst, now))
+        return min(burst, tokens + (now - updated) * rate), rate
+
+    def _take(self, buckets, dev_id, now):
+        tokens, rate = self._tokens(buckets, dev_id, now)
+        tokens -= 1
+        buckets[dev_id] = (tokens, now)
+        if tokens >= 0:
+            return 0
+        self.throttled += 1
+        return -tokens / rate
+
+    def reserve(self, dev_id):
+        """Take a token for dev_id.
+
+        Returns
+            Seconds the caller must wait before sending the request (float)
+        """
+        with self._state() as buckets:
+            return self._take(buckets, dev_id, self.clock())
+
+    def reserve_any(self, dev_ids):
+        """Take a token from whichever developer ID can send soonest.
+
+        Parameters
+            dev_ids (array[str])
+                Developer IDs to choose from
+
+        Returns
+            Tuple of (dev_id, seconds the caller must wait)
+        """
+        with self._state() as buckets:
+            now = self.clock()
+
+            def wait(dev_id):
+                tokens, rate = self._tokens(buckets, dev_id, now)
+                return max(0, 1 - tokens) / rate, -tokens
+
+            dev_id = min(dev_ids, key=wait)
+            return dev_id, self._take(buckets, dev_id, now)
+
+    def acquire(self, dev_id):
+        """Take a token for dev_id, sleeping until the request may be sent."""
+        wait = self.reserve(dev_id)
+        if wait > 0:
+            time.sleep(wait)
+
+    def stats(self):
+        """Return the number of throttled requests as a dict."""
+        return {'throttled': self.throttled}
+
+
+class SharedRateLimiter(RateLimiter):
+    """ RateLimiter whose buckets are shared by every process on a host.
+
+    The buckets are kept in a small JSON file updated under an exclusive
+    lock (fcntl.flock), so workers forked by gunicorn or multiprocessing
+    draw from one budget per developer ID. Requires a Unix platform.
+    """
+
+    def __init__(self, path, rate, burst=None, rates=None, clock=time.time):
+        """Initialize a SharedRateLimiter.
+
+        Parameters
+            path (str)
+                File holding the buckets, created if missing; every process
+                sharing the budget must use the same path
+            rate (float)
+                Requests per second allowed for each developer ID
+
+        Optional Parameters:
+            burst (int)
+                Requests that may be made at once before throttling (default = rate)
+            rates (dict)
+                (rate, burst) tuples keyed by developer ID, overriding rate and burst
+            clock (callable)
+                Returns the current time in seconds, the same in every process
+                (default = time.time)
+        """
+        if fcntl is None:
+            raise ImportError('SharedRateLimiter requires fcntl, which is only available on Unix')
+        super().__init__(rate, burst, rates, clock)
+        self.path = path
+        self._file = None
+        self._pid = None
+
+    def _open(self):
+        # flock locks belong to the open file, which a forked child would share
+        # with its parent, so every process opens its own.
+        if self._file is None or self._pid != os.getpid():
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._file = os.fdopen(fd, 'r+', encoding='UTF-8')
+            self._pid = os.getpid()
+        return self._file
+
+    @contextmanager
+    def _state(self):
+        with self._lock:
+            f = self._open()
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    buckets = json.loads(f.read() or '{}')
+                except ValueError:
+                    # A process died mid-write; start with full buckets.
+                    buckets = {}
+                yield buckets
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(buckets))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def close(self):
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        self._file = None
+
+
+class RetryPolicy(object):
+    """ Retry policy with jittered exponential backoff.
+
+    Requests are retried on connection errors, timeouts and the statuses in
+    RETRY_STATUSES; the API only takes GET requests, which are idempotent.
+    A Retry-After header from the server takes precedence over the computed
+    backoff.
+    """
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30, budget=60,
+        statuses=RETRY_STATUSES, exceptions=RETRY_EXCEPTIONS, rng=random.random):
+        """Initialize a RetryPolicy.
+
+        Optional Parameters:
+            max_retries (int)
+                Maximum retries after the first attempt (default = 3)
+            backoff (float)
+                Base backoff in seconds, doubled on each retry (default = 0.5)
+            max_backoff (float)
+                Upper bound for a single backoff in seconds (default = 30)
+            budget (float)
+                Total seconds a call may spend including retries (default = 60)
+            statuses (tuple)
+                HTTP statuses that are retried (default = RETRY_STATUSES)
+            exceptions (tuple)
+                Exception types that are retried (default = RETRY_EXCEPTIONS)
+            rng (callable)
+                Returns a random float in [0, 1) used for jitter
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.statuses = statuses
+        self.exceptions = exceptions
+        self.rng = rng
+        self.retried = 0
+        self.given_up = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt, elapsed, response=None, error=None):
+        """Decide whether to retry a request.
+
+        Parameters
+            attempt (int)
+                Number of retries already made
+            elapsed (float)
+                Seconds since the first attempt started
+
+        Optional Parameters:
+            response
+                Response received, if any
+            error (Exception)
+                Exception raised by the transport, if any
+
+        Returns
+            Seconds to wait before retrying, or None to stop (float)
+        """
+        if error is not None:
+            if not isinstance(error, self.exceptions):
+                return None
+        elif response.status_code not in self.statuses:
+            return None
+        with self._lock:
+            if response is not None and response.status_code == 429:
+                self.throttled += 1
+            wait = self._retry_after(response)
+            if wait is None:
+                wait = self.rng() * min(self.max_backoff, self.backoff * 2 ** attempt)
+            if attempt >= self.max_retries or elapsed + wait > self.budget:
+                self.given_up += 1
+                return None
+            self.retried += 1
+            return wait
+
+    def stats(self):
+        """Return throttled, retried and given up counters as a dict."""
+        return {'throttled': self.throttled, 'retried': self.retried, 'given_up': self.given_up}
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,221 @@
+from bisect import bisect_left
+from collections import Counter
+import re
+
+from .spatial import haversine
+
+_SEPARATORS = re.compile(r'[^0-9a-z]+')
+
+# Match quality, best first; results are ranked by route_type and then by quality.
+EXACT = 0
+NAME_PREFIX = 1
+WORD_PREFIX = 2
+FUZZY = 3
+
+
+def normalize(text):
+    """Lower-case text and collapse punctuation to single spaces."""
+    return _SEPARATORS.sub(' ', text.lower()).strip() if text else ''
+
+
+def trigrams(text):
+    """Return the set of character trigrams of normalized text, padded at word edges."""
+    grams = set()
+    for word in text.split():
+        word = '  ' + word + ' '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class SearchIndex(object):
+    """ Local prefix and fuzzy search over stop and route names.
+
+    Mirrors PTVClient.search for stops and routes: numeric terms and terms
+    shorter than 3 characters only match routes, results are ordered by
+    route_type, and the route_types and latitude/longitude/max_distance
+    filters are applied locally. Terms whose words prefix a name match
+    through a sorted token list; otherwise names sharing enough trigrams
+    with the term match. Only a term with no local match is sent to the API.
+    """
+
+    def __init__(self, client=None, similarity=0.3):
+        """Initialize a SearchIndex.
+
+        Optional Parameters:
+            client (PTVClient)
+                Client whose search() answers terms with no local match
+                (default = None, misses return empty results)
+            similarity (float)
+                Minimum trigram similarity for a fuzzy match (default = 0.3)
+        """
+        self.client = client
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self._entries = []
+        self._compiled = None
+
+    @classmethod
+    def from_index(cls, index, **kwargs):
+        """Build a SearchIndex from the routes and stops of a NetworkIndex."""
+        search = cls(**kwargs)
+        for route_id, (route_type, name, number) in index.routes.items():
+            search.add_route(route_type, route_id, name, number)
+        for (route_type, stop_id), (name, suburb, latitude, longitude) in index.stops.items():
+            search.add_stop(route_type, stop_id, name, suburb, latitude, longitude)
+        return search
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_route(self, route_type, route_id, route_name, route_number=None):
+        """Add a route to the index."""
+        self._entries.append(('routes', getattr(route_type, 'value', route_type), route_name, {
+            'route_id': route_id,
+            'route_name': route_name,
+            'route_number': route_number,
+            'route_type': getattr(route_type, 'value', route_type),
+        }))
+        self._compiled = None
+
+    def add_stop(self, route_type, stop_id, stop_name, stop_suburb=None, latitude=None, longitude=None):
+        """Add a stop to the index."""
+        self._entries.append(('stops', getattr(route_type, 'value', route_type), stop_name, {
+            'stop_id': stop_id,
+            'stop_name': stop_name,
+            'stop_suburb': stop_suburb,
+            'route_type': getattr(route_type, 'value', route_type),
+            'stop_latitude': latitude,
+            'stop_longitude': longitude,
+        }))
+        self._compiled = None
+
+    def _compile(self):
+        if self._compiled is not None:
+            return self._compiled
+        names = []
+        tokens = []
+        grams = {}
+        sizes = []
+        for i, (kind, route_type, name, obj) in enumerate(self._entries):
+            name = normalize(name)
+            names.append(name)
+            words = set(name.split())
+            if kind == 'routes' and obj['route_number']:
+                words.add(normalize(obj['route_number']))
+            tokens.extend((word, i) for word in words)
+            entry_grams = trigrams(name)
+            sizes.append(len(entry_grams))
+            for gram in entry_grams:
+                grams.setdefault(gram, []).append(i)
+        tokens.sort()
+        self._compiled = (names, [token for token, _ in tokens], [i for _, i in tokens], grams, sizes)
+        return self._compiled
+
+    def _prefixed(self, words, ids, word):
+        matches = set()
+        start = bisect_left(words, word)
+        for j in range(start, len(words)):
+            if not words[j].startswith(word):
+                break
+            matches.add(ids[j])
+        return matches
+
+    def _match(self, term):
+        names, words, ids, grams, sizes = self._compile()
+        terms = term.split()
+        matches = None
+        for word in terms:
+            found = self._prefixed(words, ids, word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        if matches:
+            result = {}
+            for i in matches:
+                if names[i] == term:
+                    result[i] = (EXACT, 0)
+                elif names[i].startswith(term):
+                    result[i] = (NAME_PREFIX, 0)
+                else:
+                    result[i] = (WORD_PREFIX, 0)
+            return result
+        if len(term) < 3:
+            return {}
+        term_grams = trigrams(term)
+        shared = Counter()
+        for gram in term_grams:
+            shared.update(grams.get(gram, ()))
+        result = {}
+        for i, count in shared.items():
+            score = count / (len(term_grams) + sizes[i] - count)
+            if score >= self.similarity:
+                result[i] = (FUZZY, -score)
+        return result
+
+    def lookup(self, search_term, route_types=[], latitude=None, longitude=None, max_distance=None):
+        """Search the local index only. Arguments are as for search().
+
+        Returns
+            Dict with 'stops' and 'routes' lists shaped like the API response
+        """
+        term = normalize(search_term)
+        routes_only = len(term) < 3 or term.replace(' ', '').isdigit()
+        wanted = set(route_type.value for route_type in route_types)
+        located = latitude is not None and longitude is not None
+        ranked = []
+        for i, (quality, score) in (self._match(term) if term else {}).items():
+            kind, route_type, name, obj = self._entries[i]
+            if (routes_only and kind != 'routes') or (wanted and route_type not in wanted):
+                continue
+            if kind == 'stops' and located and obj['stop_latitude'] is not None:
+                obj = dict(obj, stop_distance=haversine(latitude, longitude,
+                    obj['stop_latitude'], obj['stop_longitude']))
+                if max_distance and obj['stop_distance'] > max_distance:
+                    continue
+            ranked.append(((route_type, quality, score, name or ''), kind, obj))
+        ranked.sort(key=lambda item: item[0])
+        result = {'stops': [], 'routes': []}
+        for _, kind, obj in ranked:
+            result[kind].append(dict(obj))
+        return result
+
+    def search(self, search_term, route_types=[], latitude=None, longitude=None,
+        max_distance=None, include_outlets=True):
+        """Get Stops and routes that contain the search term, from the local index
+        when possible (note: stops and routes are ordered by route_type).
+
+        Parameters:
+            search_term (str)
+                Search text (note: if search text is numeric and/or less than 3 characters,
+                only routes are returned)
+
+        Optional Parameters:
+            route_types (array[RouteType])
+                An array of RouteType we want to filter by
+            latitude
+                Filter by geographic coordinate of latitude
+            longitude
+                Filter by geographic coordinate of longitude
+            max_distance
+                Filter by maximum distance (in metres) from location specified via
+                latitude and longitude parameters
+            include_outlets (bool)
+                Passed to the API on a miss; outlets are not indexed (default = true)
+
+        Returns
+            Dict with 'stops' and 'routes' lists, or the API response on a miss
+        """
+        result = self.lookup(search_term, route_types, latitude, longitude, max_distance)
+        if result['stops'] or result['routes']:
+            self.hits += 1
+            return result
+        self.misses += 1
+        if self.client is None:
+            return result
+        return self.client.search(search_term, route_types, latitude, longitude,
+            max_distance, include_outlets)
+
+    def stats(self):
+        """Return local hit and remote fallback counters as a dict."""
+        return {'hits': self.hits, 'misses': self.misses}
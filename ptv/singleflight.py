@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+
+class _Call(object):
+    """ An in-flight call shared by every thread asking for the same key."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """ Collapses concurrent calls with the same key into a single call.
+
+    The first thread to ask for a key runs the function; threads asking for
+    the same key while it is running wait and receive the same result or
+    exception. Nothing is retained once the call completes.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        """Run fn(*args) unless a call for key is already in flight, then share its outcome.
+
+        Parameters
+            key (str)
+                Identifies equivalent calls
+            fn (callable)
+                Function to run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class AsyncSingleFlight(object):
+    """ Collapses concurrent coroutine calls with the same key into a single task.
+
+    Callers are shielded from each other: cancelling one waiter does not
+    cancel the shared call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key, fn, *args):
+        """Await fn(*args) unless a call for key is already in flight, then share its outcome.
+
+        Parameters
+            key (str)
+                Identifies equivalent calls
+            fn (coroutine function)
+                Function to run
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
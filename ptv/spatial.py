@@ -0,0 +1,220 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def _as_dict(obj):
+    return obj.to_dict() if hasattr(obj, 'to_dict') else obj
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between points given in degrees.
+
+    Accepts floats, or numpy arrays (broadcast together) when numpy is installed.
+    """
+    if np is not None and any(isinstance(v, np.ndarray) for v in (lat1, lon1, lat2, lon2)):
+        lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + \
+            np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class StopLocator(object):
+    """ Grid index over stop coordinates answering nearest-stop queries locally.
+
+    Mirrors get_stop_near_location: the same route_types, max_results and
+    max_distance filters, with results ordered by distance. Distances are
+    computed with vectorized haversine when numpy is installed.
+    """
+
+    def __init__(self, cell_size=0.01):
+        """Initialize a StopLocator.
+
+        Optional Parameters:
+            cell_size (float)
+                Grid cell size in degrees (default = 0.01, about 1.1 km)
+        """
+        self.cell_size = cell_size
+        self._stops = {}
+        self._compiled = None
+
+    @classmethod
+    def from_index(cls, index, **kwargs):
+        """Build a StopLocator from the stops of a NetworkIndex."""
+        locator = cls(**kwargs)
+        for (route_type, stop_id), (name, suburb, latitude, longitude) in index.stops.items():
+            locator.add(route_type, stop_id, name, suburb, latitude, longitude)
+        return locator
+
+    def __len__(self):
+        return len(self._stops)
+
+    def add(self, route_type, stop_id, stop_name, stop_suburb, latitude, longitude):
+        """Add or replace a stop. Stops without coordinates are ignored."""
+        if latitude is None or longitude is None:
+            return
+        route_type = getattr(route_type, 'value', route_type)
+        self._stops[(route_type, stop_id)] = (stop_name, stop_suburb, float(latitude), float(longitude))
+        self._compiled = None
+
+    def add_stop(self, stop):
+        """Add a stop object from get_stops, or from get_stop with stop_location=True."""
+        stop = _as_dict(stop)
+        latitude = stop.get('stop_latitude')
+        longitude = stop.get('stop_longitude')
+        gps = _as_dict(stop.get('stop_location') or {}).get('gps') or {}
+        if latitude is None:
+            latitude = gps.get('latitude')
+            longitude = gps.get('longitude')
+        self.add(stop['route_type'], stop['stop_id'], stop.get('stop_name'),
+            stop.get('stop_suburb'), latitude, longitude)
+
+    def _compile(self):
+        if self._compiled is not None:
+            return self._compiled
+        keys = list(self._stops)
+        values = [self._stops[key] for key in keys]
+        lats = [value[2] for value in values]
+        lons = [value[3] for value in values]
+        grid = {}
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            grid.setdefault(self._cell(lat, lon), []).append(i)
+        if np is not None:
+            lats, lons = np.array(lats, dtype=float), np.array(lons, dtype=float)
+            route_types = np.array([key[0] for key in keys], dtype=int)
+            grid = {cell: np.array(indices, dtype=int) for cell, indices in grid.items()}
+        else:
+            route_types = [key[0] for key in keys]
+        self._compiled = (keys, values, lats, lons, route_types, grid)
+        return self._compiled
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def _candidates(self, grid, lat, lon, max_distance):
+        lat_cells = int(math.ceil(max_distance / METRES_PER_DEGREE / self.cell_size))
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        lon_cells = int(math.ceil(max_distance / (METRES_PER_DEGREE * cos_lat) / self.cell_size))
+        row, col = self._cell(lat, lon)
+        found = []
+        for r in range(row - lat_cells, row + lat_cells + 1):
+            for c in range(col - lon_cells, col + lon_cells + 1):
+                cell = grid.get((r, c))
+                if cell is not None:
+                    found.append(cell)
+        return found
+
+    def _result(self, keys, values, i, distance):
+        route_type, stop_id = keys[i]
+        name, suburb, lat, lon = values[i]
+        return {
+            'stop_id': stop_id,
+            'stop_name': name,
+            'stop_suburb': suburb,
+            'route_type': route_type,
+            'stop_latitude': lat,
+            'stop_longitude': lon,
+            'stop_distance': distance,
+        }
+
+    def nearest(self, latitude, longitude, route_types=[], max_results=30, max_distance=300):
+        """Get All stops near the specified location, without a network call.
+
+        Parameters:
+            latitude
+                Geographic coordinate of latitude
+            longitude
+                Geographic coordinate of longitude
+
+        Optional Parameters:
+            route_types (array[RouteType])
+                An array of RouteType we want to filter by
+            max_results (int)
+                Maximum number of results returned (default = 30)
+            max_distance
+                Filter by maximum distance (in metres) from location specified
+                via latitude and longitude parameters (default = 300)
+
+        Returns
+            List of stop dicts ordered by stop_distance, as in get_stop_near_location
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        keys, values, lats, lons, types, grid = self._compile()
+        wanted = set(route_type.value for route_type in route_types)
+        cells = self._candidates(grid, latitude, longitude, max_distance)
+        if not cells:
+            return []
+        if np is not None:
+            indices = np.sort(np.concatenate(cells))
+            if wanted:
+                indices = indices[np.isin(types[indices], list(wanted))]
+            distances = haversine(latitude, longitude, lats[indices], lons[indices])
+            keep = distances <= max_distance
+            indices, distances = indices[keep], distances[keep]
+            order = np.argsort(distances, kind='stable')[:max_results]
+            return [self._result(keys, values, int(indices[j]), float(distances[j])) for j in order]
+        found = []
+        for cell in cells:
+            for i in cell:
+                if wanted and types[i] not in wanted:
+                    continue
+                distance = haversine(latitude, longitude, lats[i], lons[i])
+                if distance <= max_distance:
+                    found.append((distance, i))
+        found.sort()
+        return [self._result(keys, values, i, distance) for distance, i in found[:max_results]]
+
+    def nearest_many(self, points, route_types=[], max_results=30, max_distance=300, chunk_size=256):
+        """Resolve many locations at once.
+
+        With numpy, each chunk of points is compared against the stops inside
+        the chunk's bounding box in a single vectorized distance computation.
+
+        Parameters:
+            points (array[tuple])
+                (latitude, longitude) pairs
+
+        Optional Parameters:
+            route_types, max_results, max_distance
+                As for nearest()
+            chunk_size (int)
+                Points resolved per vectorized step (default = 256)
+
+        Returns
+            List with one result list per point, in the order given
+        """
+        if np is None:
+            return [self.nearest(lat, lon, route_types, max_results, max_distance)
+                for lat, lon in points]
+        keys, values, lats, lons, types, grid = self._compile()
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        candidates = np.arange(len(keys))
+        if route_types:
+            candidates = candidates[np.isin(types, [route_type.value for route_type in route_types])]
+        margin_lat = max_distance / METRES_PER_DEGREE
+        results = []
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            lat_min, lat_max = chunk[:, 0].min(), chunk[:, 0].max()
+            cos_lat = max(math.cos(math.radians(max(abs(lat_min), abs(lat_max)))), 1e-6)
+            margin_lon = margin_lat / cos_lat
+            box = candidates[
+                (lats[candidates] >= lat_min - margin_lat) & (lats[candidates] <= lat_max + margin_lat) &
+                (lons[candidates] >= chunk[:, 1].min() - margin_lon) &
+                (lons[candidates] <= chunk[:, 1].max() + margin_lon)]
+            distances = haversine(chunk[:, :1], chunk[:, 1:], lats[box][None, :], lons[box][None, :])
+            for row in distances:
+                keep = np.flatnonzero(row <= max_distance)
+                order = keep[np.argsort(row[keep], kind='stable')][:max_results]
+                results.append([self._result(keys, values, int(box[j]), float(row[j])) for j in order])
+        return results
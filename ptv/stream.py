@@ -0,0 +1,165 @@
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER = '0123456789+-.eE'
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """ Incremental reader over an iterator of UTF-8 byte chunks.
+
+    Only the unconsumed tail of the document is kept in memory.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('UTF-8')()
+        self.buf = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        """Append the next chunk to the buffer. Returns False at end of stream."""
+        if self.exhausted:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            self.buf = self.buf[self.pos:] + self.decoder.decode(b'', final=True)
+            self.pos = 0
+            return False
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} at {!r}'.format(char, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def value(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number cut off by the end of the buffer may continue in the next chunk.
+            if not self.exhausted and (end == len(self.buf) or self.buf[end] in _NUMBER):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Consume the next JSON value without building it."""
+        depth = 0
+        in_string = False
+        escaped = False
+        self.peek()
+        while True:
+            buf = self.buf
+            while self.pos < len(buf):
+                char = buf[self.pos]
+                self.pos += 1
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == '\\':
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                        if depth == 0:
+                            return
+                elif char == '"':
+                    in_string = True
+                elif char in '[{':
+                    depth += 1
+                elif char in ']}':
+                    if depth == 0:
+                        self.pos -= 1
+                        return
+                    depth -= 1
+                    if depth == 0:
+                        return
+                elif depth == 0 and char == ',':
+                    self.pos -= 1
+                    return
+            if not self.fill():
+                if depth == 0 and not in_string:
+                    return
+                raise ValueError('Unexpected end of JSON document')
+
+    def items(self):
+        """Yield the items of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError('Expected "," or "]" in array')
+
+
+def iter_items(chunks, key):
+    """Yield the items of an array in a top-level JSON object while it is downloaded.
+
+    Peak memory is bounded by the size of one item plus one chunk, not by
+    the size of the document.
+
+    Parameters
+        chunks (iterable)
+            UTF-8 encoded byte chunks of the response body
+        key (str)
+            Name of the top-level member holding the array. If that member is
+            an object of arrays (e.g. disruptions grouped by mode), the items
+            of each array are yielded in turn.
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key:
+            if reader.peek() == '[':
+                yield from reader.items()
+                return
+            reader.expect('{')
+            if reader.peek() == '}':
+                return
+            while True:
+                reader.value()
+                reader.expect(':')
+                if reader.peek() == '[':
+                    yield from reader.items()
+                else:
+                    reader.skip()
+                if reader.peek() == '}':
+                    return
+                reader.expect(',')
+        reader.skip()
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import logging
+from queue import Empty
+from queue import Queue
+import threading
+
+from .models import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# Ends a slice's queue.
+_DONE = object()
+
+
+def _get(departure, field):
+    if isinstance(departure, dict):
+        return departure.get(field)
+    return getattr(departure, field, None)
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return parse_datetime(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _scheduled(departure):
+    value = _get(departure, 'scheduled_departure_utc')
+    return _as_datetime(value) if value is not None else None
+
+
+def _walk(client, route_type, stop_id, start, end, route_id, page_size, kwargs):
+    cursor = start
+    # Keys of departures already yielded at the cursor time; earlier ones can't reappear.
+    seen = set()
+    size = page_size
+    # Departures at the cursor on the last full page, to tell whether a larger page helped.
+    stuck = 0
+    while cursor < end:
+        page = client.get_departure_from_stop(route_type, stop_id, route_id,
+            date_utc=cursor.strftime(DATE_FORMAT), max_results=size, **kwargs)
+        returned = page.get('departures', [])
+        departures = []
+        for departure in returned:
+            scheduled = _scheduled(departure)
+            if scheduled is not None and cursor <= scheduled:
+                departures.append((scheduled, departure))
+        if not departures:
+            return
+        departures.sort(key=lambda item: item[0])
+        # max_results may apply per route and direction; a group that filled
+        # its quota is only complete up to its last departure.
+        groups = {}
+        for scheduled, departure in departures:
+            group = (_get(departure, 'route_id'), _get(departure, 'direction_id'))
+            groups[group] = (groups.get(group, (0,))[0] + 1, scheduled)
+        horizon = min([departures[-1][0]] +
+            [last for count, last in groups.values() if count >= size])
+        for scheduled, departure in departures:
+            if scheduled > horizon or scheduled >= end:
+                break
+            key = (_get(departure, 'run_ref') or _get(departure, 'run_id'), scheduled)
+            if key not in seen:
+                seen.add(key)
+                yield departure
+        if horizon > cursor:
+            cursor = horizon
+            seen = set(key for key in seen if key[1] >= cursor)
+            size, stuck = page_size, 0
+        elif len(returned) >= size:
+            # A whole page at one instant; refetch it with room for more.
+            size, stuck = size * 2, len(departures)
+        else:
+            if stuck and len(departures) <= stuck:
+                # A larger page brought nothing new; the API caps max_results.
+                logger.warning('More than %d departures from stop %s at %s; skipping the rest',
+                    stuck, stop_id, cursor.strftime(DATE_FORMAT))
+            cursor += timedelta(seconds=1)
+            seen = set()
+            size, stuck = page_size, 0
+
+
+def _feed(walker, pending, stopped):
+    # Checking stopped before every put means at most one put lands after the
+    # consumer's final drain, so a bounded queue can't block a worker forever.
+    try:
+        for departure in walker:
+            if stopped.is_set():
+                return
+            pending.put((departure, None))
+        error = None
+    except Exception as e:
+        error = e
+    if not stopped.is_set():
+        pending.put((_DONE, error))
+
+
+def walk_departures(client, route_type, stop_id, start, end, route_id=None, page_size=100,
+    slices=1, max_workers=None, **kwargs):
+    """Yield every departure from a stop scheduled within a time range.
+
+    Pages forward with date_utc from the last departure seen, skipping
+    departures repeated by overlapping pages. Departures are yielded in
+    scheduled order as each page arrives. A page filled by departures at one
+    instant is refetched with max_results doubled; if the API returns no
+    more, any further departures at that instant are skipped with a warning.
+
+    Parameters:
+        client (PTVClient)
+            Client used to fetch pages
+        route_type (RouteType enum)
+            Type of transport
+        stop_id (int)
+            ID of the Stop
+        start (datetime or str)
+            Start of the range, inclusive (naive datetimes are taken as UTC)
+        end (datetime or str)
+            End of the range, exclusive
+
+    Optional Parameters:
+        route_id (int)
+            Only walk departures of this route
+        page_size (int)
+            max_results requested per page (default = 100)
+        slices (int)
+            Split the range into this many disjoint slices walked in parallel
+            (default = 1); results are still yielded in scheduled order, the
+            first slice as it is fetched and later ones from queues holding
+            up to page_size departures each
+        max_workers (int)
+            Number of slices walked at once (default = slices)
+        Any other optional parameter of get_departure_from_stop except date_utc
+        and max_results; expansions are not returned
+
+    Yields
+        Departures, each once
+    """
+    start, end = _as_datetime(start), _as_datetime(end)
+    if slices <= 1:
+        yield from _walk(client, route_type, stop_id, start, end, route_id, page_size, kwargs)
+        return
+    step = (end - start) / slices
+    bounds = [start + step * i for i in range(slices)] + [end]
+    walkers = [_walk(client, route_type, stop_id, bounds[i], bounds[i + 1], route_id,
+        page_size, kwargs) for i in range(slices)]
+    queues = [Queue(maxsize=page_size) for _ in walkers[1:]]
+    stopped = threading.Event()
+    # The first slice is walked by the caller's thread.
+    with ThreadPoolExecutor(max_workers=max(1, (max_workers or slices) - 1)) as executor:
+        for walker, pending in zip(walkers[1:], queues):
+            executor.submit(_feed, walker, pending, stopped)
+        try:
+            yield from walkers[0]
+            for pending in queues:
+                while True:
+                    departure, error = pending.get()
+                    if error is not None:
+                        raise error
+                    if departure is _DONE:
+                        break
+                    yield departure
+        finally:
+            stopped.set()
+            for pending in queues:
+                try:
+                    while True:
+                        pending.get_nowait()
+                except Empty:
+                    pass
+
+
+def day_bounds(day, tz=timezone.utc):
+    """Return the (start, end) datetimes of a calendar day in a timezone.
+
+    Parameters
+        day (date)
+            Calendar day
+
+    Optional Parameters:
+        tz (tzinfo)
+            Timezone of the day, e.g. zoneinfo.ZoneInfo('Australia/Melbourne')
+            (default = UTC)
+    """
+    start = datetime(day.year, day.month, day.day, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
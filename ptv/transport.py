@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+
+
+class Response(object):
+    """ Minimal response returned by transports that do not wrap requests.
+
+    Mirrors the subset of requests.Response used by the client so that
+    stub, recorded and HTTP/2 responses can be handled identically.
+    """
+
+    def __init__(self, status_code, content, headers=None, url=None, connect_time=None, ttfb=None):
+        """Initialize a Response.
+
+        Parameters
+            status_code (int)
+                HTTP status code
+            content (bytes)
+                Raw response body
+            headers (dict)
+                Response headers
+            url (str)
+                URL that was requested
+            connect_time (float)
+                Seconds spent opening a connection (0 if one was reused)
+            ttfb (float)
+                Seconds from sending the request to receiving the headers
+        """
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.url = url
+        self.connect_time = connect_time
+        self.ttfb = ttfb
+
+    def json(self):
+        """Decode the body as JSON."""
+        return json.loads(self.content.decode('UTF-8'))
+
+    def iter_content(self, chunk_size=1):
+        """Yield the body in chunks of chunk_size bytes."""
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        """Raise requests.HTTPError for 4xx and 5xx responses."""
+        if 400 <= self.status_code < 600:
+            raise requests.HTTPError(
+                '{} Error for url: {}'.format(self.status_code, self.url),
+                response=self)
+
+
+class Transport(object):
+    """ Base class for the HTTP transport used by PTVClient.
+
+    Subclasses implement get() and return an object exposing status_code,
+    headers, content, json() and raise_for_status(). Responses may also
+    carry connect_time and ttfb in seconds, which are reported to observers.
+    """
+
+    def get(self, url):
+        """Perform a GET request.
+
+        Parameters
+            url (str)
+                Fully signed URL to request
+        """
+        raise NotImplementedError
+
+    def stream(self, url):
+        """Perform a GET request without reading the body up front.
+
+        The returned response must also expose iter_content(chunk_size) and
+        close(). Defaults to get(), which buffers the whole body.
+
+        Parameters
+            url (str)
+                Fully signed URL to request
+        """
+        return self.get(url)
+
+    def close(self):
+        """Release any pooled connections."""
+        pass
+
+
+# Seconds the current thread's last request spent opening a connection.
+_connect_times = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _connect_times.last = time.perf_counter() - started
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _connect_times.last = time.perf_counter() - started
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """ HTTPAdapter whose connections record how long they took to open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class RequestsTransport(Transport):
+    """ Transport backed by a pooled, keep-alive requests.Session."""
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, keep_alive=True,
+        connect_timeout=5, read_timeout=30, pool_block=False):
+        """Initialize a RequestsTransport.
+
+        Optional Parameters:
+            pool_connections (int)
+                Number of host pools to cache (default = 10)
+            pool_maxsize (int)
+                Maximum number of connections kept per host (default = 10)
+            keep_alive (bool)
+                Reuse connections between requests (default = true)
+            connect_timeout (float)
+                Seconds to wait when establishing a connection (default = 5)
+            read_timeout (float)
+                Seconds to wait between bytes from the server (default = 30)
+            pool_block (bool)
+                Block rather than open extra connections when the pool is
+                exhausted (default = false)
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = _TimedHTTPAdapter(pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def get(self, url):
+        _connect_times.last = 0.0
+        response = self.session.get(url, timeout=self.timeout)
+        response.connect_time = _connect_times.last
+        # elapsed runs from sending the request until the headers are parsed
+        response.ttfb = response.elapsed.total_seconds()
+        return response
+
+    def stream(self, url):
+        return self.session.get(url, timeout=self.timeout, stream=True)
+
+    def close(self):
+        self.session.close()
+
+
+class HTTPXTransport(Transport):
+    """ Transport backed by httpx, supporting HTTP/2.
+
+    Requires the optional httpx dependency (pip install ptv-wrapper[http2]).
+    """
+
+    def __init__(self, pool_maxsize=10, keep_alive=True, connect_timeout=5,
+        read_timeout=30, http2=True):
+        """Initialize a HTTPXTransport.
+
+        Optional Parameters:
+            pool_maxsize (int)
+                Maximum number of connections kept open (default = 10)
+            keep_alive (bool)
+                Reuse connections between requests (default = true)
+            connect_timeout (float)
+                Seconds to wait when establishing a connection (default = 5)
+            read_timeout (float)
+                Seconds to wait between bytes from the server (default = 30)
+            http2 (bool)
+                Negotiate HTTP/2 where the server supports it (default = true)
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError('HTTPXTransport requires httpx: pip install ptv-wrapper[http2]')
+        limits = httpx.Limits(max_connections=pool_maxsize,
+            max_keepalive_connections=pool_maxsize if keep_alive else 0)
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.client = httpx.Client(http2=http2, limits=limits, timeout=timeout)
+        self._httpx = httpx
+
+    def get(self, url):
+        # Trace events are named e.g. 'connection.connect_tcp.complete' or
+        # 'http2.receive_response_headers.complete'; keep them without the prefix.
+        timings = {}
+
+        def trace(event, info):
+            timings[event.split('.', 1)[1]] = time.perf_counter()
+
+        started = time.perf_counter()
+        try:
+            response = self.client.get(url, extensions={'trace': trace})
+        except self._httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except self._httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+        connected = timings.get('start_tls.complete', timings.get('connect_tcp.complete'))
+        headers = timings.get('receive_response_headers.complete')
+        return Response(response.status_code, response.content, dict(response.headers), url,
+            connect_time=connected - timings['connect_tcp.started'] if connected else 0.0,
+            ttfb=headers - started if headers else None)
+
+    def close(self):
+        self.client.close()
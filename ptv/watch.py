@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+from .models import parse_datetime
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+# Fields compared between polls; a difference in any of them is a change.
+WATCHED_FIELDS = ('scheduled_departure_utc', 'estimated_departure_utc', 'platform_number',
+    'at_platform', 'flags', 'disruption_ids')
+
+
+def _get(departure, field):
+    if isinstance(departure, dict):
+        return departure.get(field)
+    return getattr(departure, field, None)
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return value.timestamp()
+
+
+class DepartureChange(object):
+    """ A departure that was added, removed or changed between two polls."""
+    __slots__ = ('kind', 'key', 'departure', 'previous')
+
+    def __init__(self, kind, key, departure, previous=None):
+        """Initialize a DepartureChange.
+
+        Parameters
+            kind (str)
+                ADDED, REMOVED or CHANGED
+            key (tuple)
+                (run_id, stop_id) identifying the departure
+            departure
+                The departure as last seen (for REMOVED, the departure that disappeared)
+
+        Optional Parameters:
+            previous
+                The departure from the previous poll, for CHANGED
+        """
+        self.kind = kind
+        self.key = key
+        self.departure = departure
+        self.previous = previous
+
+    def changed_fields(self):
+        """Return the names of the watched fields that differ from the previous poll."""
+        if self.previous is None:
+            return []
+        return [field for field in WATCHED_FIELDS
+            if _get(self.departure, field) != _get(self.previous, field)]
+
+    def __eq__(self, other):
+        return isinstance(other, DepartureChange) and \
+            (self.kind, self.key, self.departure, self.previous) == \
+            (other.kind, other.key, other.departure, other.previous)
+
+    def __repr__(self):
+        return 'DepartureChange({!r}, run_id={!r}, stop_id={!r})'.format(self.kind, *self.key)
+
+
+class DepartureTracker(object):
+    """ Diffs successive departures results keyed by (run_id, stop_id)."""
+
+    def __init__(self):
+        self.departures = {}
+
+    def update(self, result):
+        """Apply a get_departures_for_stops result and return what changed.
+
+        Departures of stops that failed in this poll are kept, not reported
+        as removed.
+
+        Returns
+            List of DepartureChange, in the order the departures were returned
+        """
+        failed = set(error['stop_id'] for error in result.get('errors', []))
+        current = {}
+        for departure in result.get('departures', []):
+            current[(_get(departure, 'run_id'), _get(departure, 'stop_id'))] = departure
+        changes = []
+        for key, departure in current.items():
+            previous = self.departures.get(key)
+            if previous is None:
+                changes.append(DepartureChange(ADDED, key, departure))
+            elif any(_get(departure, field) != _get(previous, field) for field in WATCHED_FIELDS):
+                changes.append(DepartureChange(CHANGED, key, departure, previous))
+        for key, departure in self.departures.items():
+            if key in current:
+                continue
+            if key[1] in failed:
+                current[key] = departure
+            else:
+                changes.append(DepartureChange(REMOVED, key, departure))
+        self.departures = current
+        return changes
+
+
+def poll_interval(departures, now, min_interval=5, max_interval=60):
+    """Seconds to wait before the next poll.
+
+    A quarter of the time until the soonest upcoming departure, bounded by
+    min_interval and max_interval, so boards refresh quickly while a
+    departure is imminent and back off when nothing is due.
+
+    Parameters
+        departures (iterable)
+            Departures currently tracked
+        now (float)
+            Current time as a Unix timestamp
+    """
+    soonest = None
+    for departure in departures:
+        when = _timestamp(_get(departure, 'estimated_departure_utc') or
+            _get(departure, 'scheduled_departure_utc'))
+        if when is not None and when >= now and (soonest is None or when < soonest):
+            soonest = when
+    if soonest is None:
+        return max_interval
+    return min(max_interval, max(min_interval, (soonest - now) / 4))
+
+
+def watch_departures(client, stops, min_interval=5, max_interval=60, clock=time.time,
+    sleep=time.sleep, **kwargs):
+    """Poll departures for many stops and yield only what changed.
+
+    Parameters:
+        client (PTVClient)
+            Client used to poll
+        stops (array[tuple])
+            (route_type, stop_id) or (route_type, stop_id, route_id) tuples
+
+    Optional Parameters:
+        min_interval (float)
+            Shortest wait between polls in seconds (default = 5)
+        max_interval (float)
+            Longest wait between polls in seconds (default = 60)
+        clock (callable)
+            Returns the current Unix time (default = time.time)
+        sleep (callable)
+            Waits for a number of seconds (default = time.sleep)
+        Any optional parameter of get_departure_from_stop, applied to every stop
+
+    Yields
+        DepartureChange for each added, removed or changed departure
+    """
+    tracker = DepartureTracker()
+    while True:
+        changes = tracker.update(client.get_departures_for_stops(stops, **kwargs))
+        yield from changes
+        sleep(poll_interval(tracker.departures.values(), clock(), min_interval, max_interval))
+
+
+async def watch_departures_async(client, stops, min_interval=5, max_interval=60, clock=time.time,
+    **kwargs):
+    """Async version of watch_departures, polling with an AsyncPTVClient.
+
+    Yields
+        DepartureChange for each added, removed or changed departure
+    """
+    tracker = DepartureTracker()
+    while True:
+        changes = tracker.update(await client.get_departures_for_stops(stops, **kwargs))
+        for change in changes:
+            yield change
+        await asyncio.sleep(poll_interval(tracker.departures.values(), clock(),
+            min_interval, max_interval))
@@ -7,22 +7,32 @@ with open('README.rst') as f:
 setup(
     name='ptv-wrapper',
     version='0.1.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     description='An API Wrapper for Public Transport Victoria (PTV)',
     long_description=readme,
     url='https://github.com/abrizzz/ptv-wrapper',
     license='MIT',
     author='Akshay Brizmohun',
     author_email='aksh1000@gmail.com',
-    python_requires='>=3',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 4 - Beta',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5'
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11'
     ],
     keywords=['ptv', 'melbourne', 'victoria', 'public transport'],
     install_requires=['requests'],
+    extras_require={
+        'http2': ['httpx[http2]'],
+        'async': ['aiohttp'],
+        'numpy': ['numpy'],
+    },
     tests_require=['pytest'],
+    entry_points={
+        'console_scripts': ['ptv = ptv.cli:main'],
+    },
 )
@@ -0,0 +1,143 @@
+from datetime import datetime
+from datetime import timezone
+import json
+import urllib
+
+from ptv.transport import Response
+from ptv.transport import Transport
+
+
+def _respond(payload, status_code, url):
+    if callable(payload):
+        payload = payload(url)
+        if payload is None:
+            return Response(404, b'{"message": "not found"}', url=url)
+    return Response(status_code, json.dumps(payload).encode('UTF-8'), url=url)
+
+
+class StubTransport(Transport):
+    """Transport returning a canned payload and recording requested URLs.
+
+    payload may be a callable taking the URL; returning None gives a 404.
+    """
+
+    def __init__(self, payload=None, status_code=200):
+        self.payload = payload if payload is not None else {'status': {'health': 1}}
+        self.status_code = status_code
+        self.urls = []
+        self.closed = False
+
+    def get(self, url):
+        self.urls.append(url)
+        return _respond(self.payload, self.status_code, url)
+
+    def close(self):
+        self.closed = True
+
+
+class NetworkTransport(Transport):
+    """Transport answering from a SyntheticNetwork in process, without signing checks."""
+
+    def __init__(self, network, now=datetime(2020, 1, 1, tzinfo=timezone.utc)):
+        self.network = network
+        self.now = now
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        parts = urllib.parse.urlsplit(url)
+        status, payload = self.network.respond(parts.path, urllib.parse.parse_qs(parts.query),
+            self.now)
+        return Response(status, json.dumps(payload).encode('UTF-8'), url=url)
+
+
+class AsyncStubTransport(object):
+    """Async transport returning a canned payload and tracking concurrency."""
+
+    def __init__(self, payload=None, delay=0):
+        self.payload = payload if payload is not None else {'status': {'health': 1}}
+        self.delay = delay
+        self.urls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get(self, url):
+        import asyncio
+        self.urls.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return _respond(self.payload, 200, url)
+
+    async def close(self):
+        pass
+
+
+ROUTE_TYPES = [
+    {'route_type': 0, 'route_type_name': 'Train'},
+    {'route_type': 1, 'route_type_name': 'Tram'},
+    {'route_type': 2, 'route_type_name': 'Bus'},
+    {'route_type': 3, 'route_type_name': 'Vline'},
+    {'route_type': 4, 'route_type_name': 'Night Bus'},
+]
+
+ROUTES = [
+    {'route_id': 1, 'route_type': 0, 'route_name': 'Alamein', 'route_number': '', 'route_gtfs_id': '2-ALM'},
+    {'route_id': 6, 'route_type': 0, 'route_name': 'Frankston', 'route_number': '', 'route_gtfs_id': '2-FKN'},
+    {'route_id': 1041, 'route_type': 1, 'route_name': 'East Brunswick - St Kilda Beach',
+        'route_number': '96', 'route_gtfs_id': '3-96'},
+]
+
+STOPS = {
+    1: [
+        {'stop_id': 1071, 'stop_name': 'Flinders Street Station', 'stop_suburb': 'Melbourne City',
+            'route_type': 0, 'stop_latitude': -37.8183, 'stop_longitude': 144.9671},
+        {'stop_id': 1162, 'stop_name': 'Richmond Station', 'stop_suburb': 'Richmond',
+            'route_type': 0, 'stop_latitude': -37.8240, 'stop_longitude': 144.9901},
+        {'stop_id': 1002, 'stop_name': 'Alamein Station', 'stop_suburb': 'Ashburton',
+            'route_type': 0, 'stop_latitude': -37.8683, 'stop_longitude': 145.0797},
+    ],
+    6: [
+        {'stop_id': 1071, 'stop_name': 'Flinders Street Station', 'stop_suburb': 'Melbourne City',
+            'route_type': 0, 'stop_latitude': -37.8183, 'stop_longitude': 144.9671},
+        {'stop_id': 1162, 'stop_name': 'Richmond Station', 'stop_suburb': 'Richmond',
+            'route_type': 0, 'stop_latitude': -37.8240, 'stop_longitude': 144.9901},
+        {'stop_id': 1073, 'stop_name': 'Frankston Station', 'stop_suburb': 'Frankston',
+            'route_type': 0, 'stop_latitude': -38.1428, 'stop_longitude': 145.1260},
+    ],
+    1041: [
+        {'stop_id': 2500, 'stop_name': 'Flinders St/Elizabeth St', 'stop_suburb': 'Melbourne City',
+            'route_type': 1, 'stop_latitude': -37.8178, 'stop_longitude': 144.9646},
+        {'stop_id': 2501, 'stop_name': 'Acland St/Barkly St', 'stop_suburb': 'St Kilda',
+            'route_type': 1, 'stop_latitude': -37.8676, 'stop_longitude': 144.9776},
+    ],
+}
+
+DIRECTIONS = {
+    1: [{'direction_id': 1, 'direction_name': 'City (Flinders Street)', 'route_id': 1, 'route_type': 0},
+        {'direction_id': 2, 'direction_name': 'Alamein', 'route_id': 1, 'route_type': 0}],
+    6: [{'direction_id': 1, 'direction_name': 'City (Flinders Street)', 'route_id': 6, 'route_type': 0},
+        {'direction_id': 5, 'direction_name': 'Frankston', 'route_id': 6, 'route_type': 0}],
+    1041: [{'direction_id': 8, 'direction_name': 'St Kilda Beach', 'route_id': 1041, 'route_type': 1},
+        {'direction_id': 9, 'direction_name': 'East Brunswick', 'route_id': 1041, 'route_type': 1}],
+}
+
+
+def network_payload(url):
+    """Serve the small synthetic network above for the crawl endpoints."""
+    import re
+    status = {'health': 1}
+    if '/v3/route_types?' in url:
+        return {'route_types': ROUTE_TYPES, 'status': status}
+    if '/v3/routes?' in url:
+        return {'routes': ROUTES, 'status': status}
+    match = re.search(r'/v3/stops/route/(\d+)/route_type/\d+\?', url)
+    if match:
+        return {'stops': STOPS[int(match.group(1))], 'status': status}
+    match = re.search(r'/v3/directions/route/(\d+)\?', url)
+    if match:
+        return {'directions': DIRECTIONS[int(match.group(1))], 'status': status}
+    return None
@@ -0,0 +1,44 @@
+import asyncio
+
+from ptv.aio import AsyncPTVClient
+from ptv.aio import ThreadedAsyncTransport
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def test_async_client_builds_same_urls_as_sync_client():
+    sync_transport = StubTransport()
+    async_transport = AsyncStubTransport()
+    sync_client = PTVClient(DEV_ID, API_KEY, transport=sync_transport)
+    async_client = AsyncPTVClient(DEV_ID, API_KEY, transport=async_transport)
+
+    sync_client.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    sync_client.search('Flinders St', route_types=[RouteType.TRAM])
+
+    async def calls():
+        await async_client.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+        return await async_client.search('Flinders St', route_types=[RouteType.TRAM])
+
+    assert asyncio.run(calls()) == async_transport.payload
+    assert async_transport.urls == sync_transport.urls
+
+def test_concurrency_is_bounded_by_semaphore():
+    transport = AsyncStubTransport(delay=0.01)
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport, max_concurrency=4)
+
+    async def fan_out():
+        return await asyncio.gather(*[
+            client.get_departure_from_stop(RouteType.TRAM, stop_id) for stop_id in range(20)])
+
+    results = asyncio.run(fan_out())
+    assert len(results) == 20
+    assert transport.max_in_flight == 4
+
+def test_threaded_transport_wraps_sync_transport():
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=ThreadedAsyncTransport(StubTransport()))
+    assert asyncio.run(client.get_route_types()) == {'status': {'health': 1}}
@@ -0,0 +1,59 @@
+import asyncio
+import re
+
+from ptv.aio import AsyncPTVClient
+from ptv.bulk import merge_departures
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+STOPS = [(RouteType.TRAIN, 1071), (RouteType.TRAIN, 1181, 6), (RouteType.TRAIN, 404)]
+
+
+def departures_payload(url):
+    stop_id = int(re.search(r'/stop/(\d+)', url).group(1))
+    if stop_id == 404:
+        return None
+    return {
+        'departures': [{'stop_id': stop_id, 'route_id': 6, 'run_id': 100 + stop_id}],
+        'stops': {str(stop_id): {'stop_id': stop_id}},
+        'routes': {'6': {'route_id': 6, 'route_name': 'Frankston'}},
+        'runs': {str(100 + stop_id): {'run_id': 100 + stop_id}},
+        'directions': {'1': {'direction_id': 1}},
+        'disruptions': {},
+        'status': {'health': 1},
+    }
+
+def check_merged(merged):
+    assert [d['stop_id'] for d in merged['departures']] == [1071, 1181]
+    assert set(merged['stops']) == {'1071', '1181'}
+    assert list(merged['routes']) == ['6']
+    assert list(merged['directions']) == ['1']
+    assert len(merged['runs']) == 2
+    assert len(merged['errors']) == 1
+    error = merged['errors'][0]
+    assert (error['route_type'], error['stop_id'], error['route_id']) == (RouteType.TRAIN, 404, None)
+
+
+def test_bulk_departures_are_merged_and_errors_reported():
+    transport = StubTransport(departures_payload)
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    check_merged(client.get_departures_for_stops(STOPS, max_workers=2, expand=['all']))
+    assert any('/stop/1181/route/6?' in url for url in transport.urls)
+    assert all('expand=all' in url for url in transport.urls)
+
+def test_async_bulk_departures():
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=AsyncStubTransport(departures_payload))
+    check_merged(asyncio.run(client.get_departures_for_stops(STOPS, expand=['all'])))
+
+def test_cancelled_stops_are_reported():
+    stops = [(RouteType.TRAIN, 1071), (RouteType.TRAIN, 1181)]
+    results = [departures_payload('/stop/1071'), asyncio.CancelledError()]
+    merged = merge_departures(stops, results)
+    assert [d['stop_id'] for d in merged['departures']] == [1071]
+    assert merged['errors'][0]['stop_id'] == 1181
+    assert isinstance(merged['errors'][0]['error'], asyncio.CancelledError)
@@ -0,0 +1,116 @@
+import time
+
+from ptv.cache import CachePolicy
+from ptv.cache import MemoryCache
+from ptv.cache import SQLiteCache
+from ptv.cache import cache_key
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_sorts_query_and_ignores_credentials():
+    assert cache_key('/v3/routes', {'route_types': [1, 0], 'devid': DEV_ID, 'route_name': 'x'}) == \
+        '/v3/routes?route_name=x&route_types=1&route_types=0'
+
+def test_policy_ttl_by_endpoint():
+    policy = CachePolicy({'departures': 5}, default_ttl=1)
+    assert policy.ttl_for('/v3/departures/route_type/0/stop/1071') == 5
+    assert policy.ttl_for('/v3/route_types') == 6 * 3600
+    assert policy.ttl_for('/v3/unknown') == 1
+
+def test_ttl_expiry_and_counters():
+    clock = FakeClock()
+    cache = MemoryCache(clock=clock)
+    cache.set('a', {'x': 1}, ttl=10)
+    assert cache.get('a') == {'x': 1}
+    clock.now = 10
+    assert cache.get('a') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = MemoryCache(max_entries=2, max_bytes=100)
+    cache.set('a', 1, ttl=60, size=10)
+    cache.set('b', 2, ttl=60, size=10)
+    cache.get('a')
+    cache.set('c', 3, ttl=60, size=10)
+    assert cache.get('b') is None
+    cache.set('d', 4, ttl=60, size=85)
+    assert cache.get('a') is None
+    assert cache.get('c') == 3
+    assert cache.stats()['bytes'] == 95
+    assert cache.stats()['evictions'] == 2
+    cache.set('c', 5, ttl=60, size=101)
+    assert cache.get('c') is None
+    assert cache.stats()['bytes'] == 85
+
+def test_client_serves_static_endpoints_from_cache():
+    transport = StubTransport()
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache())
+    client.get_route_types()
+    client.get_route_types()
+    client.get_routes(route_types=[RouteType.TRAM])
+    client.get_routes(route_types=[RouteType.TRAM])
+    assert len(transport.urls) == 2
+    assert client.cache.hits == 2
+
+def test_uncached_endpoints_always_call_api():
+    transport = StubTransport()
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(),
+        cache_policy=CachePolicy({'departures': 0}))
+    client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    assert len(transport.urls) == 2
+
+def test_sqlite_cache_persists_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SQLiteCache(path).set('/v3/routes?', {'routes': [1]}, ttl=60)
+    other = SQLiteCache(path)
+    assert other.get('/v3/routes?') == {'routes': [1]}
+    assert other.get('/v3/route_types?') is None
+    assert other.stats()['entries'] == 1
+
+def test_sqlite_cache_stale_window_and_purge(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(str(tmp_path / 'cache.db'), max_entries=1, clock=clock)
+    cache.set('a', 1, ttl=10, stale_ttl=20)
+    clock.now = 15
+    assert cache.lookup('a') == (1, False)
+    assert cache.get('a') is None
+    clock.now = 30
+    assert cache.lookup('a') is None
+    cache.set('b', 2, ttl=10)
+    cache.set('c', 3, ttl=20)
+    assert len(cache) == 1
+    assert cache.get('c') == 3
+    cache.set('d', 4, ttl=5)
+    cache.purge()
+    assert len(cache) == 1
+    assert cache.get('c') == 3
+
+def test_stale_entries_are_served_while_revalidating(tmp_path):
+    clock = FakeClock()
+    transport = StubTransport({'routes': ['old']})
+    client = PTVClient(DEV_ID, API_KEY, transport=transport,
+        cache=SQLiteCache(str(tmp_path / 'cache.db'), clock=clock),
+        cache_policy=CachePolicy(stale_while_revalidate=60))
+    client.get_routes()
+    transport.payload = {'routes': ['new']}
+    clock.now = 6 * 3600 + 1
+    assert client.get_routes() == {'routes': ['old']}
+    deadline = time.time() + 5
+    while client.cache.get('/v3/routes?') != {'routes': ['new']} and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.get_routes() == {'routes': ['new']}
+    assert len(transport.urls) == 2
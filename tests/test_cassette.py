@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from ptv.cassette import ReplayTransport
+from ptv.cassette import RecordingTransport
+from ptv.cassette import request_key
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.transport import Response
+from tests.stubs import StubTransport
+from tests.stubs import network_payload
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def test_request_key_drops_credentials_and_sorts_query():
+    assert request_key('https://h/v3/routes?route_types=1&route_types=0&devid=1&signature=AB') == \
+        request_key('http://other/v3/routes?devid=2&route_types=1&route_types=0&signature=CD') == \
+        '/v3/routes?route_types=1&route_types=0'
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / 'cassette.json')
+    recorder = RecordingTransport(path, StubTransport(network_payload))
+    client = PTVClient(DEV_ID, API_KEY, transport=recorder)
+    routes = client.get_routes()
+    stops = client.get_stops(6, RouteType.TRAIN)
+    client.close()
+    with open(path) as f:
+        assert API_KEY not in f.read()
+
+    replay = PTVClient('another-id', 'another-key', transport=ReplayTransport(path))
+    assert replay.get_routes() == routes
+    assert replay.get_stops(6, RouteType.TRAIN) == stops
+    with pytest.raises(KeyError):
+        replay.get_stops(1, RouteType.TRAIN)
+
+def test_repeated_requests_replay_in_order(tmp_path):
+    path = str(tmp_path / 'cassette.json')
+    bodies = iter([{'n': 1}, {'n': 2}])
+    recorder = RecordingTransport(path, StubTransport(lambda url: next(bodies)))
+    client = PTVClient(DEV_ID, API_KEY, transport=recorder)
+    client.get_disruptions()
+    client.get_disruptions()
+    client.close()
+
+    replay = PTVClient(DEV_ID, API_KEY, transport=ReplayTransport(path))
+    assert [replay.get_disruptions()['n'] for _ in range(3)] == [1, 2, 2]
+
+def test_recorded_headers_and_status(tmp_path):
+    path = str(tmp_path / 'cassette.json')
+    transport = StubTransport()
+    transport.get = lambda url: Response(429, b'{}', {'Retry-After': '3', 'Set-Cookie': 'x'}, url)
+    recorder = RecordingTransport(path, transport)
+    recorder.get('https://h/v3/route_types?devid=1&signature=A')
+    recorder.save()
+    with open(path) as f:
+        interaction = json.load(f)['interactions'][0]
+    assert interaction['status'] == 429
+    assert interaction['headers'] == {'Retry-After': '3'}
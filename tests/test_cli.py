@@ -0,0 +1,93 @@
+import json
+import subprocess
+import sys
+import urllib
+
+import pytest
+
+import ptv
+from ptv.cache import MemoryCache
+from ptv.cli import format_output
+from ptv.cli import main
+from ptv.client import PTVClient
+from ptv.daemon import Daemon
+from ptv.fake import FakePTVServer
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+DEPARTURES = {'departures': [{'stop_id': 1071, 'run_id': 1}, {'stop_id': 1071, 'run_id': 2}]}
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'ptv.sock')
+
+
+def test_in_process_call(capsys, socket_path):
+    with FakePTVServer({DEV_ID: API_KEY}) as server:
+        status = main(['route-types', '--socket', socket_path, '--dev-id', DEV_ID,
+            '--api-key', API_KEY, '--base-url', server.base_url])
+    assert status == 0
+    assert json.loads(capsys.readouterr().out)['status']['health'] == 1
+
+def test_daemon_keeps_cache_warm(capsys, socket_path):
+    transport = StubTransport(DEPARTURES)
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache())
+    with Daemon(client, socket_path):
+        for _ in range(2):
+            assert main(['departures', 'train', '1071', '--max-results', '2', '-f', 'ndjson',
+                '--socket', socket_path]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['run_id'] for line in lines] == [1, 2, 1, 2]
+    assert len(transport.urls) == 1
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(transport.urls[0]).query)
+    assert query['max_results'] == ['2']
+
+def test_errors_are_reported(capsys, socket_path):
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(status_code=404))
+    with Daemon(client, socket_path):
+        assert main(['route', '1', '--socket', socket_path]) == 1
+        with pytest.raises(RuntimeError):
+            Daemon(client, socket_path).start()
+    assert capsys.readouterr().err.startswith('ptv: 404')
+    with pytest.raises(SystemExit):
+        main(['stops', '1', 'ferry', '--socket', socket_path])
+
+def test_daemon_refuses_other_credentials(capsys, socket_path):
+    transport = StubTransport(DEPARTURES)
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    with Daemon(client, socket_path), FakePTVServer({'1': 'key'}) as server:
+        assert main(['route-types', '--socket', socket_path, '--dev-id', '1',
+            '--api-key', 'key', '--base-url', server.base_url]) == 0
+        assert main(['route-types', '--socket', socket_path, '--dev-id', DEV_ID,
+            '--api-key', 'other', '--base-url', server.base_url]) == 1
+    assert transport.urls == []
+    assert json.loads(capsys.readouterr().out.splitlines()[0])['status']['health'] == 1
+
+def test_only_sockets_of_the_user_are_trusted(capsys, tmp_path):
+    path = tmp_path / 'ptv.sock'
+    path.write_text('')
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(DEPARTURES))
+    with pytest.raises(RuntimeError):
+        Daemon(client, str(path)).start()
+    with pytest.raises(SystemExit):
+        main(['route-types', '--socket', str(path)])
+    assert 'not a socket owned by you' in capsys.readouterr().err
+    nested = str(tmp_path / 'run' / 'ptv.sock')
+    with Daemon(client, nested):
+        assert (tmp_path / 'run').stat().st_mode & 0o777 == 0o700
+        assert (tmp_path / 'run' / 'ptv.sock').stat().st_mode & 0o777 == 0o600
+
+def test_ndjson_flattens_grouped_collections():
+    result = {'disruptions': {'metro_train': [{'disruption_id': 1}], 'general': [{'disruption_id': 2}]}}
+    assert format_output(result, 'disruptions', 'ndjson') == '{"disruption_id": 1}\n{"disruption_id": 2}\n'
+    assert format_output({'route': {}}, None, 'ndjson') == '{"route": {}}\n'
+
+def test_package_imports_lazily():
+    code = 'import sys, ptv.cli; print("requests" in sys.modules)'
+    assert subprocess.check_output([sys.executable, '-c', code]).strip() == b'False'
+    assert ptv.PTVClient is PTVClient
+    assert 'RouteType' in dir(ptv)
+    with pytest.raises(AttributeError):
+        ptv.Missing
@@ -1,9 +1,15 @@
+import os
+
 from pytest import fixture
 from ptv.client import PTVClient
 from ptv.client import RouteType
+from ptv.fake import FakePTVServer
 
-DEV_ID = "1000733"
-API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+# Set PTV_LIVE_API=1 to run these tests against timetableapi.ptv.vic.gov.au
+# (with PTV_DEV_ID and PTV_API_KEY) instead of a local fake server.
+LIVE_API = bool(os.environ.get('PTV_LIVE_API'))
+DEV_ID = os.environ.get('PTV_DEV_ID', "1000733")
+API_KEY = os.environ.get('PTV_API_KEY', "dfa5929b-04f9-11e6-a65e-029db85e733b")
 
 FLINDERS_ST_STATION_STOP_ID = 1071
 ROUTE_ID = 1
@@ -87,10 +93,20 @@ EXPECTED_STOPS_KEYS = set([
     'stops',
     'status'
 ])
+@fixture(scope='module')
+def server():
+    if LIVE_API:
+        yield None
+        return
+    with FakePTVServer({DEV_ID: API_KEY}) as server:
+        yield server
+
 @fixture
-def client():
+def client(server):
     """Instanciate the client class to query API """
-    return PTVClient(DEV_ID,API_KEY)
+    if server is None:
+        return PTVClient(DEV_ID,API_KEY)
+    return PTVClient(DEV_ID,API_KEY, base_url=server.base_url)
 
 # Departures Test
 def test_get_departure_from_stop(client):
@@ -0,0 +1,92 @@
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from ptv import columnar
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.columnar import MISSING_ID
+from ptv.columnar import MISSING_TIME
+from ptv.columnar import DepartureTable
+from ptv.columnar import RunTable
+from ptv.columnar import epoch_seconds
+from ptv.models import parse_response
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+NOON = 1577880000  # 2020-01-01T12:00:00Z
+
+
+def departure(run_id, scheduled, estimated=None, route_id=6, stop_id=1071, direction_id=1):
+    return {'stop_id': stop_id, 'route_id': route_id, 'run_id': run_id, 'run_ref': str(run_id),
+        'direction_id': direction_id, 'platform_number': '1', 'departure_sequence': 0,
+        'scheduled_departure_utc': scheduled, 'estimated_departure_utc': estimated}
+
+
+DEPARTURES = [
+    departure(1, '2020-01-01T12:00:00Z', '2020-01-01T12:01:30Z'),
+    departure(2, '2020-01-01T12:10:00Z'),
+    departure(3, '2020-01-01T12:05:00Z', '2020-01-01T12:05:00Z', route_id=11),
+    departure(4, '2020-01-01T12:20:00Z', '2020-01-01T12:19:00Z'),
+]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(columnar, 'np', None)
+    elif columnar.np is None:
+        pytest.skip('numpy not installed')
+    return request.param
+
+
+def test_epoch_seconds(backend):
+    values = ['2020-01-01T12:00:00Z', None, datetime(2020, 1, 1, 12, tzinfo=timezone.utc),
+        '2020-01-01T23:00:00+11:00']
+    assert list(epoch_seconds(values)) == [NOON, MISSING_TIME, NOON, NOON]
+    assert list(epoch_seconds(['2020-01-01T12:00:00Z', None])) == [NOON, MISSING_TIME]
+    assert len(epoch_seconds([])) == 0
+
+def test_tables_append_across_batches(backend):
+    table = DepartureTable()
+    table.extend({'departures': DEPARTURES[:2]})
+    table.extend(parse_response({'departures': DEPARTURES[2:]})['departures'])
+    table.extend({'departures': [dict(DEPARTURES[0], direction_id=None)]})
+    assert len(table) == 5
+    assert list(table.column('run_id')) == [1, 2, 3, 4, 1]
+    assert list(table.column('direction_id')) == [1, 1, 1, 1, MISSING_ID]
+    assert list(table.column('scheduled_departure_utc'))[:2] == [NOON, NOON + 600]
+    assert list(table.column('estimated_departure_utc'))[1] == MISSING_TIME
+    assert list(table.column('run_ref')) == [0, 1, 2, 3, 0]
+    assert table.categories['run_ref'] == ['1', '2', '3', '4']
+
+def test_runs_from_client():
+    runs = [{'run_id': 1, 'run_ref': '1', 'route_id': 6, 'route_type': 0, 'final_stop_id': 1071,
+        'destination_name': 'Flinders Street', 'status': 'scheduled', 'direction_id': 1,
+        'run_sequence': 0, 'express_stop_count': 2}]
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport({'runs': runs}))
+    table = RunTable([client.get_runs_for_route(6)])
+    assert list(table.column('express_stop_count')) == [2]
+    assert table.categories['destination_name'] == ['Flinders Street']
+
+def test_arrays_delays_and_headways():
+    np = pytest.importorskip('numpy')
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport({'departures': DEPARTURES}))
+    table = DepartureTable([client.get_departure_from_stop(RouteType.TRAIN, 1071)])
+    arrays = table.arrays()
+    assert arrays['scheduled_departure_utc'][0] == np.datetime64('2020-01-01T12:00:00')
+    assert np.isnat(arrays['estimated_departure_utc'][1])
+    assert arrays['route_id'].dtype == np.int64 and arrays['run_ref'].dtype == np.int32
+    np.testing.assert_array_equal(table.delays(), [90, np.nan, 0, -60])
+    # Route 11 is its own group, so run 3 has no previous departure.
+    np.testing.assert_array_equal(table.headways(), [np.nan, 600, np.nan, 600])
+
+def test_numpy_methods_require_numpy(monkeypatch):
+    monkeypatch.setattr(columnar, 'np', None)
+    table = DepartureTable([{'departures': DEPARTURES}])
+    with pytest.raises(ImportError):
+        table.arrays()
+    with pytest.raises(ImportError):
+        table.delays()
@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+import urllib
+
+import pytest
+
+from ptv.aio import AsyncPTVClient
+from ptv.client import PTVClient
+from ptv.credentials import Credential
+from ptv.credentials import CredentialPool
+from ptv.fake import FakePTVServer
+from ptv.retry import RateLimiter
+from ptv.retry import SharedRateLimiter
+from ptv.transport import RequestsTransport
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+KEYS = {DEV_ID: API_KEY, '2000001': 'a1b2c3d4-0000-4000-8000-000000000001'}
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def dev_ids(urls):
+    return [urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['devid'][0] for url in urls]
+
+
+def take(path, count):
+    limiter = SharedRateLimiter(path, rate=1, burst=5, clock=lambda: 0.0)
+    try:
+        return [limiter.reserve(DEV_ID) for _ in range(count)]
+    finally:
+        limiter.close()
+
+
+def test_credential_signs_like_client():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport())
+    path = '/v3/route_types?devid=' + DEV_ID
+    assert Credential(DEV_ID, API_KEY).sign(path) == client._computeSignature(path)
+
+def test_pool_uses_keys_in_turn():
+    transport = StubTransport()
+    pool = CredentialPool(KEYS.items())
+    client = PTVClient(transport=transport, credentials=pool)
+    assert client.dev_id == DEV_ID
+    for _ in range(4):
+        client.get_route_types()
+    assert dev_ids(transport.urls) == [DEV_ID, '2000001'] * 2
+    assert pool.stats() == {DEV_ID: 2, '2000001': 2}
+    with pytest.raises(ValueError):
+        CredentialPool([])
+
+def test_pool_picks_key_with_most_budget():
+    clock = Clock()
+    limiter = RateLimiter(rate=1, burst=2, rates={'2000001': (1, 4)}, clock=clock)
+    pool = CredentialPool(KEYS.items())
+    reserved = [pool.reserve(limiter) for _ in range(6)]
+    assert [wait for credential, wait in reserved] == [0] * 6
+    assert pool.stats() == {DEV_ID: 2, '2000001': 4}
+    credential, wait = pool.reserve(limiter)
+    assert wait == 1.0 and limiter.throttled == 1
+    clock.now = 10
+    assert pool.reserve(limiter)[1] == 0
+
+def test_every_key_is_accepted_by_the_server():
+    with FakePTVServer(KEYS) as server:
+        pool = CredentialPool(KEYS.items())
+        with PTVClient(transport=RequestsTransport(), base_url=server.base_url,
+            credentials=pool) as client:
+            for _ in range(4):
+                assert client.get_route_types()['status']['health'] == 1
+    assert pool.stats() == {DEV_ID: 2, '2000001': 2}
+
+def test_async_client_uses_pool():
+    transport = AsyncStubTransport()
+    client = AsyncPTVClient(transport=transport, credentials=CredentialPool(KEYS.items()))
+
+    async def run():
+        await client.get_route(1)
+        await client.get_route(2)
+
+    asyncio.run(run())
+    assert sorted(dev_ids(transport.urls)) == sorted(KEYS)
+
+def test_shared_budget_across_instances(tmp_path):
+    path = str(tmp_path / 'budget.json')
+    first = SharedRateLimiter(path, rate=1, burst=3, clock=lambda: 0.0)
+    second = SharedRateLimiter(path, rate=1, burst=3, clock=lambda: 0.0)
+    assert [first.reserve(DEV_ID), second.reserve(DEV_ID), first.reserve(DEV_ID)] == [0, 0, 0]
+    assert second.reserve(DEV_ID) == 1.0
+    first.close()
+    second.close()
+    with open(path, 'w') as f:
+        f.write('{"trunc')
+    assert take(path, 1) == [0]
+
+def test_shared_budget_across_processes(tmp_path):
+    path = str(tmp_path / 'budget.json')
+    with multiprocessing.get_context('spawn').Pool(2) as pool:
+        waits = sum(pool.starmap(take, [(path, 4), (path, 4)]), [])
+    assert sorted(waits) == [0] * 5 + [1.0, 2.0, 3.0]
@@ -0,0 +1,103 @@
+import re
+
+from ptv.client import PTVClient
+from ptv.disruptions import CREATED
+from ptv.disruptions import RESOLVED
+from ptv.disruptions import UPDATED
+from ptv.disruptions import DisruptionTracker
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def disruption(disruption_id, last_updated, status='Current'):
+    return {'disruption_id': disruption_id, 'title': 'Disruption {}'.format(disruption_id),
+        'last_updated': last_updated, 'disruption_status': status}
+
+
+def feed(groups):
+    def payload(url):
+        if '/v3/disruptions?' in url:
+            return {'disruptions': groups[0], 'status': {'health': 1}}
+        disruption_id = int(re.search(r'/v3/disruptions/(\d+)\?', url).group(1))
+        for group in groups[0].values():
+            for item in group:
+                if item['disruption_id'] == disruption_id:
+                    return {'disruption': dict(item, description='Details'), 'status': {'health': 1}}
+    return payload
+
+
+def tracker(groups, **kwargs):
+    transport = StubTransport(feed(groups))
+    return DisruptionTracker(PTVClient(DEV_ID, API_KEY, transport=transport), **kwargs), transport
+
+
+def test_events_and_detail_calls():
+    groups = [{'metro_train': [disruption(1, '2020-01-01T00:00:00Z'), disruption(2, '2020-01-01T00:00:00Z')],
+        'metro_tram': [disruption(3, '2020-01-01T00:00:00Z', 'Planned')]}]
+    disruptions, transport = tracker(groups)
+    events = disruptions.poll()
+    assert [(e.kind, e.disruption_id) for e in events] == [(CREATED, 1), (CREATED, 2), (CREATED, 3)]
+    assert events[0].disruption['description'] == 'Details'
+    assert len(transport.urls) == 4
+
+    assert disruptions.poll() == []
+    assert len(transport.urls) == 5
+
+    groups[0] = {'metro_train': [disruption(1, '2020-01-01T00:05:00Z')],
+        'metro_tram': [disruption(3, '2020-01-01T00:00:00Z', 'Current')]}
+    events = disruptions.poll()
+    assert [(e.kind, e.disruption_id) for e in events] == [(UPDATED, 1), (UPDATED, 3), (RESOLVED, 2)]
+    assert events[2].disruption is None
+    assert len(transport.urls) == 8
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'disruptions.json')
+    groups = [{'general': [disruption(1, '2020-01-01T00:00:00Z')]}]
+    first, _ = tracker(groups, state_path=path)
+    assert len(first.poll()) == 1
+
+    groups[0] = {'general': [disruption(1, '2020-01-01T00:00:00Z'), disruption(2, '2020-01-01T00:00:00Z')]}
+    restarted, transport = tracker(groups, state_path=path)
+    assert [(e.kind, e.disruption_id) for e in restarted.poll()] == [(CREATED, 2)]
+    assert len(transport.urls) == 2
+
+def test_first_poll_can_be_silent():
+    groups = [{'general': [disruption(1, '2020-01-01T00:00:00Z')]}]
+    disruptions, transport = tracker(groups, emit_initial=False)
+    assert disruptions.poll() == []
+    assert len(transport.urls) == 1
+    groups[0] = {'general': []}
+    assert [(e.kind, e.disruption_id) for e in disruptions.poll()] == [(RESOLVED, 1)]
+
+def test_models_and_dicts_share_state(tmp_path):
+    path = str(tmp_path / 'disruptions.json')
+    groups = [{'general': [disruption(1, '2020-01-01T00:00:00Z')]}]
+    tracker(groups, state_path=path)[0].poll()
+    transport = StubTransport(feed(groups))
+    restarted = DisruptionTracker(PTVClient(DEV_ID, API_KEY, transport=transport, models=True),
+        state_path=path)
+    assert restarted.poll() == []
+
+def test_failed_details_are_retried():
+    groups = [{'general': [disruption(1, '2020-01-01T00:00:00Z')]}]
+    payload = feed(groups)
+    failing = [True]
+
+    def flaky(url):
+        if '/v3/disruptions/' in url and failing[0]:
+            return None
+        return payload(url)
+    disruptions = DisruptionTracker(PTVClient(DEV_ID, API_KEY, transport=StubTransport(flaky)))
+    assert disruptions.poll() == []
+    failing[0] = False
+    events = disruptions.poll()
+    assert [(e.kind, e.disruption_id) for e in events] == [(CREATED, 1)]
+    assert events[0].disruption['description'] == 'Details'
+
+    groups[0] = {'general': [disruption(1, '2020-01-01T00:05:00Z')]}
+    failing[0] = True
+    assert disruptions.poll() == []
+    failing[0] = False
+    assert [(e.kind, e.disruption_id) for e in disruptions.poll()] == [(UPDATED, 1)]
@@ -0,0 +1,78 @@
+import copy
+
+from ptv.cache import MemoryCache
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.entities import EntityStore
+from ptv.models import Run
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+STOP = {'stop_id': 1071, 'route_type': 0, 'stop_name': 'Flinders Street'}
+RUN = {'run_id': 1, 'run_ref': '1', 'route_id': 6, 'route_type': 0, 'status': 'scheduled'}
+EXPANDED = {
+    'departures': [{'stop_id': 1071, 'route_id': 6, 'run_ref': '1', 'direction_id': 1}],
+    'stops': {'1071': STOP},
+    'routes': {'6': {'route_id': 6, 'route_type': 0, 'route_name': 'Frankston'}},
+    'runs': {'1': RUN},
+    'directions': {'1': {'direction_id': 1, 'route_id': 6, 'direction_name': 'City'}},
+    'disruptions': {},
+}
+
+
+def client(payload, **kwargs):
+    return PTVClient(DEV_ID, API_KEY, transport=StubTransport(payload), entities=EntityStore(),
+        **kwargs)
+
+
+def test_expansions_are_shared_between_responses():
+    ptv = client(EXPANDED)
+    first = ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    second = ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    assert first is not second and first['departures'] is not second['departures']
+    for member in ('stops', 'routes', 'runs', 'directions'):
+        for key, entity in first[member].items():
+            assert second[member][key] is entity
+    assert ptv.entities.get('stops', (0, 1071)) is first['stops']['1071']
+    assert ptv.entities.stats() == {'stops': 1, 'routes': 1, 'runs': 1, 'directions': 1,
+        'disruptions': 0, 'version': 4}
+
+def test_newer_payloads_refresh_entities_in_place():
+    ptv = client(EXPANDED)
+    first = ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    version = ptv.entities.version
+    ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    assert ptv.entities.changed_since(version) == []
+    ptv.transport.payload = {'run': dict(RUN, status='updated')}
+    ptv.get_run_for_route_type(1, RouteType.TRAIN)
+    assert first['runs']['1']['status'] == 'updated'
+    assert ptv.entities.changed_since(version) == [('runs', first['runs']['1'])]
+    assert [kind for kind, entity in ptv.entities.changed_since(0)] == [
+        'stops', 'routes', 'directions', 'runs']
+
+def test_cached_responses_do_not_refresh():
+    store = EntityStore()
+    store.normalize({'runs': [RUN]})
+    old = store.normalize({'runs': [dict(RUN, status='old')]}, refresh=False)
+    assert old['runs'][0]['status'] == 'scheduled' and store.version == 1
+    ptv = client({'runs': [RUN]}, cache=MemoryCache())
+    assert ptv.get_runs_for_route(6)['runs'][0] is ptv.get_runs_for_route(6)['runs'][0]
+
+def test_stop_lists_are_not_shared():
+    store = EntityStore()
+    payload = {'stops': [dict(STOP, stop_sequence=3)]}
+    result = store.normalize(copy.deepcopy(payload))
+    assert result == payload and len(store) == 0
+
+def test_models_are_shared_and_refreshed():
+    ptv = client(EXPANDED, models=True)
+    first = ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    second = ptv.get_departure_from_stop(RouteType.TRAIN, 1071, expand=['all'])
+    run = first['runs']['1']
+    assert isinstance(run, Run) and second['runs']['1'] is run
+    assert first['departures'][0] is not second['departures'][0]
+    ptv.transport.payload = {'runs': [dict(RUN, status='updated')]}
+    assert ptv.get_runs_for_route(6)['runs'][0] is run
+    assert run.status == 'updated'
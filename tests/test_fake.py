@@ -0,0 +1,101 @@
+import time
+
+import pytest
+import requests
+
+from ptv.cassette import Cassette
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.fake import FakePTVServer
+from ptv.fake import SyntheticNetwork
+from ptv.retry import RetryPolicy
+from ptv.transport import RequestsTransport
+from ptv.transport import Response
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def test_signature_is_verified():
+    with FakePTVServer({DEV_ID: API_KEY}) as server:
+        assert PTVClient(DEV_ID, API_KEY, base_url=server.base_url).get_route_types()['status']['health'] == 1
+        with pytest.raises(requests.HTTPError) as e:
+            PTVClient(DEV_ID, 'wrong-key', base_url=server.base_url).get_route_types()
+        assert e.value.response.status_code == 403
+        with pytest.raises(requests.HTTPError):
+            PTVClient('1', API_KEY, base_url=server.base_url).get_route_types()
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url)
+        url = client._build_url('/v3/routes', {'route_types': [0]})
+        transport = RequestsTransport()
+        assert transport.get(url).status_code == 200
+        assert transport.get(url.replace('route_types=0', 'route_types=1')).status_code == 403
+        assert transport.get(url.split('&signature=')[0]).status_code == 403
+        assert server.stats()['rejected'] == 4
+
+def test_every_endpoint_is_served():
+    with FakePTVServer({DEV_ID: API_KEY}) as server:
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url)
+        departures = client.get_departure_from_stop(RouteType.TRAIN, 1071, max_results=2,
+            date_utc='2020-01-01T08:00:00Z', expand=['run'])
+        assert [d['scheduled_departure_utc'] for d in departures['departures']][:2] == \
+            ['2020-01-01T08:00:00Z', '2020-01-01T08:01:00Z']
+        assert set(departures['runs']) == set(d['run_ref'] for d in departures['departures'])
+        route_stops = client.get_stops(1, RouteType.TRAIN)['stops']
+        assert route_stops[0]['stop_id'] == 1071
+        pattern = client.get_stopping_pattern_for_run(1, RouteType.TRAIN)['departures']
+        assert [d['stop_id'] for d in pattern] == [s['stop_id'] for s in reversed(route_stops)]
+        assert client.get_route(1)['route']['route_name'] == 'Alamein'
+        assert client.get_disruptions()['disruptions']['metro_train'][0]['disruption_id'] == 1
+        assert client.get_disruption(1)['disruption']['routes'][0]['route_id'] == 1
+        assert client.search('Alamein')['routes'][0]['route_id'] == 1
+        assert client.search('Alamein')['stops'][0]['stop_name'] == 'Alamein Stop 1'
+        near = client.get_stop_near_location(-37.8183, 144.9671, route_types=[RouteType.TRAIN])['stops']
+        assert near[0]['stop_id'] == 1071 and near[0]['stop_distance'] == 0
+        assert client.get_run_for_route_type(1, RouteType.TRAIN)['run']['route_id'] == 1
+        with pytest.raises(requests.HTTPError):
+            client.get_route(999)
+
+def test_throttling_is_retried_with_retry_after():
+    with FakePTVServer({DEV_ID: API_KEY}, rate=1, burst=3) as server:
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url,
+            retry_policy=RetryPolicy(max_retries=5))
+        for _ in range(4):
+            client.get_route_types()
+        assert server.stats()['throttled'] == 1
+        assert client.retry_policy.stats()['throttled'] == server.stats()['throttled']
+
+def test_errors_and_latency_are_injected():
+    with FakePTVServer({DEV_ID: API_KEY}, error_rate=1, error_status=500, latency=0.05) as server:
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url)
+        started = time.perf_counter()
+        with pytest.raises(requests.HTTPError) as e:
+            client.get_route_types()
+        assert e.value.response.status_code == 500
+        assert time.perf_counter() - started >= 0.05
+        assert server.stats() == {'requests': 1, 'rejected': 0, 'errors': 1, 'throttled': 0}
+
+def test_handler_errors_are_answered():
+    class BrokenNetwork(SyntheticNetwork):
+        def respond(self, path, query, now):
+            if 'route_types' in path:
+                raise RuntimeError('boom')
+            return super().respond(path, query, now)
+    with FakePTVServer({DEV_ID: API_KEY}, network=BrokenNetwork()) as server:
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url)
+        with pytest.raises(requests.HTTPError) as e:
+            client.get_departure_from_stop(RouteType.TRAIN, 1071, date_utc='garbage')
+        assert e.value.response.status_code == 400
+        with pytest.raises(requests.HTTPError) as e:
+            client.get_route_types()
+        assert e.value.response.status_code == 500
+        assert client.get_route(1)['route']['route_name'] == 'Alamein'
+
+def test_cassette_responses_take_precedence():
+    cassette = Cassette()
+    cassette.record('http://x/v3/route_types?devid=1&signature=A',
+        Response(200, b'{"route_types": [], "status": {"health": 1}}'))
+    with FakePTVServer({DEV_ID: API_KEY}, cassette=cassette,
+        network=SyntheticNetwork(routes_per_type=1, stops_per_route=3)) as server:
+        client = PTVClient(DEV_ID, API_KEY, base_url=server.base_url)
+        assert client.get_route_types()['route_types'] == []
+        assert len(client.get_routes()['routes']) == 5
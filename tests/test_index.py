@@ -0,0 +1,47 @@
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.index import NetworkIndex
+from tests.stubs import StubTransport
+from tests.stubs import network_payload
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def build_index(**kwargs):
+    transport = StubTransport(network_payload)
+    index = NetworkIndex.build(PTVClient(DEV_ID, API_KEY, transport=transport, **kwargs))
+    return index, transport
+
+
+def test_build_crawls_every_route():
+    index, transport = build_index()
+    assert len(transport.urls) == 2 + 2 * 3
+    assert index.route_type_name(RouteType.TRAM) == 'Tram'
+    assert index.route_name(6) == 'Frankston'
+    assert index.stops_on_route(6) == (1071, 1162, 1073)
+    assert len(index.stops) == 6
+
+def test_lookups_without_network():
+    index, transport = build_index()
+    calls = len(transport.urls)
+    assert index.route_ids('frankston') == [6]
+    assert index.route_ids('96', RouteType.TRAM) == [1041]
+    assert index.route_ids('96', RouteType.TRAIN) == []
+    assert index.stop_name(1071, RouteType.TRAIN) == 'Flinders Street Station'
+    assert index.stop_ids('Flinders Street Station') == [(0, 1071)]
+    assert index.direction_name(6, 5) == 'Frankston'
+    assert sorted(index.directions_for_route(1041)) == [(8, 'St Kilda Beach'), (9, 'East Brunswick')]
+    assert index.direction_ids('City (Flinders Street)', route_id=1) == [(1, 1)]
+    assert len(transport.urls) == calls
+
+def test_snapshot_round_trip(tmp_path):
+    index, _ = build_index(models=True)
+    path = str(tmp_path / 'network.json.gz')
+    index.save(path)
+    loaded = NetworkIndex.load(path)
+    assert loaded.routes == index.routes
+    assert loaded.stops == index.stops
+    assert loaded.directions == index.directions
+    assert loaded.route_stops == index.route_stops
+    assert loaded.route_ids('Alamein') == [1]
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+import requests
+
+from ptv.aio import AsyncPTVClient
+from ptv.cache import MemoryCache
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.fake import FakePTVServer
+from ptv.metrics import Histogram
+from ptv.metrics import MetricsCollector
+from ptv.retry import RetryPolicy
+from ptv.transport import RequestsTransport
+from ptv.transport import Response
+from ptv.transport import Transport
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+class FlakyTransport(Transport):
+    """Fails with a 503 the first time, then succeeds."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        status = 503 if self.calls == 1 else 200
+        return Response(status, b'{"route_types": []}', url=url, ttfb=0.02)
+
+
+def test_observer_receives_endpoint_template_and_cache_result():
+    events = []
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport({'departures': []}),
+        cache=MemoryCache(), observers=[events.append])
+    client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    first, second = events
+    assert first.endpoint == 'departures/route_type/{}/stop/{}'
+    assert first.path == '/v3/departures/route_type/0/stop/1071'
+    assert (first.status, first.cache, first.requests) == (200, 'miss', 1)
+    assert first.bytes == len(b'{"departures": []}')
+    assert first.decode_time is not None and first.duration > 0
+    assert (second.cache, second.requests, second.status) == ('hit', 0, None)
+    assert not second.coalesced
+
+def test_retries_and_errors_are_reported():
+    events = []
+    client = PTVClient(DEV_ID, API_KEY, transport=FlakyTransport(), observers=[events.append],
+        retry_policy=RetryPolicy(backoff=0.001, rng=lambda: 1.0))
+    client.get_route_types()
+    assert (events[0].retries, events[0].requests, events[0].ttfb) == (1, 2, 0.02)
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(status_code=404),
+        observers=[events.append])
+    with pytest.raises(requests.HTTPError):
+        client.get_route(1)
+    assert events[1].status == 404 and isinstance(events[1].error, requests.HTTPError)
+
+def test_failing_observer_does_not_break_calls():
+    def broken(event):
+        raise RuntimeError('observer failed')
+
+    collector = MetricsCollector()
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(), observers=[broken])
+    client.add_observer(collector)
+    assert client.get_route_types() == {'status': {'health': 1}}
+    client.remove_observer(collector)
+    client.get_route_types()
+    assert collector.summary()['route_types']['calls'] == {'200': 1}
+
+def test_async_calls_sharing_a_request_are_coalesced():
+    collector = MetricsCollector()
+    transport = AsyncStubTransport(delay=0.01)
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport, observers=[collector])
+
+    async def run():
+        await asyncio.gather(*[client.get_route_types() for _ in range(3)])
+
+    asyncio.run(run())
+    assert len(transport.urls) == 1
+    assert collector.summary()['route_types']['calls'] == {'200': 1, 'coalesced': 2}
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3, 5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(0.175)
+    assert histogram.quantile(1.0) == 0.4
+    assert list(histogram.cumulative()) == [(0.1, 1), (0.2, 3), (0.4, 4), (float('inf'), 5)]
+    assert Histogram().quantile(0.5) is None
+
+def test_prometheus_exposition():
+    collector = MetricsCollector(buckets=(0.1, 1))
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(), observers=[collector])
+    client.get_stops(1, RouteType.TRAIN)
+    text = collector.prometheus()
+    labels = 'endpoint="stops/route/{}/route_type/{}"'
+    assert '# TYPE ptv_call_duration_seconds histogram' in text
+    assert 'ptv_calls_total{' + labels + ',outcome="200"} 1\n' in text
+    assert 'ptv_call_duration_seconds_bucket{' + labels + ',le="0.1"} 1\n' in text
+    assert 'ptv_call_duration_seconds_bucket{' + labels + ',le="+Inf"} 1\n' in text
+    assert 'ptv_call_duration_seconds_count{' + labels + '} 1\n' in text
+
+def test_requests_transport_reports_connect_time_and_ttfb():
+    with FakePTVServer({DEV_ID: API_KEY}) as server:
+        events = []
+        with PTVClient(DEV_ID, API_KEY, transport=RequestsTransport(), base_url=server.base_url,
+            observers=[events.append]) as client:
+            client.get_route_types()
+            client.get_route_types()
+    assert events[0].connect_time > 0 and events[0].ttfb > 0
+    assert events[1].connect_time == 0
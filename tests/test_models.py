@@ -0,0 +1,66 @@
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.models import Departure
+from ptv.models import Disruption
+from ptv.models import Route
+from ptv.models import Stop
+from ptv.models import parse_datetime
+from ptv.models import parse_response
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+DEPARTURES = {
+    'departures': [{
+        'stop_id': 1071, 'route_id': 6, 'run_id': 950, 'direction_id': 1,
+        'scheduled_departure_utc': '2020-01-01T08:30:00Z', 'estimated_departure_utc': None,
+        'platform_number': '1' + '0', 'at_platform': False, 'flags': '', 'disruption_ids': [],
+    }],
+    'stops': {'1071': {'stop_id': 1071, 'stop_name': 'Flinders Street Station', 'route_type': 0}},
+    'routes': {'6': {'route_id': 6, 'route_type': 0, 'route_name': 'Frankston', 'route_number': ''}},
+    'runs': {}, 'directions': {}, 'disruptions': {},
+    'status': {'health': 1},
+}
+
+
+def test_parse_datetime():
+    assert parse_datetime('2020-01-01T08:30:00Z') == datetime(2020, 1, 1, 8, 30, tzinfo=timezone.utc)
+    assert parse_datetime(None) is None
+
+def test_models_use_slots_and_intern_strings():
+    departure = Departure(DEPARTURES['departures'][0])
+    with pytest.raises(AttributeError):
+        departure.__dict__
+    assert departure.platform_number is Departure({'platform_number': '1' + '0'}).platform_number
+    assert departure.scheduled_departure_utc == datetime(2020, 1, 1, 8, 30, tzinfo=timezone.utc)
+    assert departure.estimated_departure_utc is None
+
+def test_timestamps_parse_lazily():
+    disruption = Disruption({'disruption_id': 1, 'last_updated': '2020-01-01T00:00:00Z'})
+    assert disruption._last_updated == '2020-01-01T00:00:00Z'
+    assert disruption.last_updated.year == 2020
+    assert isinstance(disruption._last_updated, datetime)
+
+def test_parse_response_converts_lists_expansions_and_groups():
+    result = parse_response(DEPARTURES)
+    assert isinstance(result['departures'][0], Departure)
+    assert isinstance(result['stops']['1071'], Stop)
+    assert result['routes']['6'].route_name == 'Frankston'
+    assert result['status'] == {'health': 1}
+    grouped = parse_response({'disruptions': {'general': [{'disruption_id': 5}]}})
+    assert grouped['disruptions']['general'][0].disruption_id == 5
+    single = parse_response({'route': {'route_id': 6}, 'status': {}})
+    assert isinstance(single['route'], Route)
+
+def test_client_returns_models_when_requested():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(DEPARTURES), models=True)
+    result = client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    assert result['departures'][0].route_id == 6
+    assert PTVClient(DEV_ID, API_KEY, transport=StubTransport(DEPARTURES)).get_departure_from_stop(
+        RouteType.TRAIN, 1071) == DEPARTURES
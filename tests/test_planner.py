@@ -0,0 +1,82 @@
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.fake import SyntheticNetwork
+from ptv.planner import JourneyPlanner
+from tests.stubs import NetworkTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+DAY = '2020-01-01T00:00:00Z'
+
+# Trains on routes 1 and 2 run every 10 minutes, 2 minutes between stops,
+# and meet at Flinders Street (1071).
+ALAMEIN_1 = (RouteType.TRAIN, 10001)
+BELGRAVE_4 = (RouteType.TRAIN, 10104)
+
+
+def at(hour, minute):
+    return datetime(2020, 1, 1, hour, minute, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope='module')
+def network():
+    return SyntheticNetwork(routes_per_type=2, stops_per_route=5)
+
+
+@pytest.fixture
+def planner(network):
+    client = PTVClient(DEV_ID, API_KEY, transport=NetworkTransport(network))
+    return JourneyPlanner.build(client, [1, 2], date_utc=DAY)
+
+
+def test_build_crawls_patterns(planner, network):
+    runs = sum(len(network.route_runs[route_id]) for route_id in (1, 2))
+    assert len(planner) == runs * 4
+
+def test_earliest_arrival_with_a_change(planner):
+    journey = planner.plan(ALAMEIN_1, BELGRAVE_4, at(8, 0))
+    assert journey['arrival_utc'] == at(8, 19)
+    first, second = journey['legs']
+    assert (first['from_stop'], first['to_stop'], first['route_id']) == ((0, 10001), (0, 1071), 1)
+    assert (first['departure_utc'], first['arrival_utc']) == (at(8, 6), at(8, 8))
+    assert (second['departure_utc'], second['route_id']) == (at(8, 11), 2)
+    assert planner.plan(ALAMEIN_1, BELGRAVE_4, at(8, 0), min_change=300)['arrival_utc'] == at(8, 29)
+
+def test_unreachable_and_unknown_stops(planner):
+    assert planner.plan(ALAMEIN_1, BELGRAVE_4, at(23, 55)) is None
+    assert planner.plan(ALAMEIN_1, (RouteType.TRAM, 1), at(8, 0)) is None
+    journey = planner.plan(ALAMEIN_1, ALAMEIN_1, '2020-01-01T08:00:00Z')
+    assert journey['legs'] == [] and journey['arrival_utc'] == at(8, 0)
+
+def test_transfers_are_walked(planner):
+    planner.add_transfer(BELGRAVE_4, (RouteType.TRAM, 5), 120)
+    journey = planner.plan(ALAMEIN_1, (RouteType.TRAM, 5), at(8, 0))
+    assert journey['arrival_utc'] == at(8, 21)
+    assert journey['legs'][-1]['run_ref'] is None
+
+def test_shortest_transfer_from_origin_wins(planner):
+    tram = (RouteType.TRAM, 5)
+    planner.add_transfer(ALAMEIN_1, tram, 90)
+    planner.add_transfer(tram, ALAMEIN_1, 300)
+    journey = planner.plan(ALAMEIN_1, tram, at(8, 0))
+    assert journey['arrival_utc'] == datetime(2020, 1, 1, 8, 1, 30, tzinfo=timezone.utc)
+
+def test_realtime_delays_are_patched(planner, network):
+    journey = planner.plan(ALAMEIN_1, BELGRAVE_4, at(8, 0))
+    run_ref = journey['legs'][0]['run_ref']
+    delayed = {'stop_id': 10001, 'run_ref': run_ref, 'scheduled_departure_utc': '2020-01-01T08:06:00Z',
+        'estimated_departure_utc': '2020-01-01T08:11:00Z'}
+    # The delay moves this stop and the hub after it.
+    assert planner.update({'departures': [delayed]}) == 2
+    journey = planner.plan(ALAMEIN_1, BELGRAVE_4, at(8, 0))
+    assert journey['legs'][0]['run_ref'] == run_ref
+    assert journey['legs'][0]['departure_utc'] == at(8, 11)
+    assert journey['arrival_utc'] == at(8, 29)
+    assert planner._dep == sorted(planner._dep)
+    planner.update([dict(delayed, estimated_departure_utc='2020-01-01T08:06:00Z')])
+    assert planner.plan(ALAMEIN_1, BELGRAVE_4, at(8, 0))['arrival_utc'] == at(8, 19)
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from ptv.aio import AsyncPTVClient
+from ptv.cache import MemoryCache
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.prefetch import PrefetchScheduler
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def departures(client, *stops):
+    for stop_id in stops:
+        client.get_departure_from_stop(RouteType.TRAIN, stop_id)
+
+
+def test_hot_entries_are_refreshed_and_cold_ones_lapse():
+    clock = Clock()
+    transport = StubTransport({'departures': []})
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=10, clock=clock)
+    departures(client, 1071, 1071, 1071, 1072)
+    clock.now = 27
+    assert scheduler.tick() == 0
+    clock.now = 28.5
+    assert scheduler.tick() == 1
+    assert len(transport.urls) == 3 and transport.urls[-1] == transport.urls[0]
+    # Departures are cached for 30 seconds, so this call would have missed.
+    clock.now = 31
+    departures(client, 1071)
+    assert len(transport.urls) == 3
+    clock.now = 57
+    assert scheduler.tick() == 1
+    clock.now = 400
+    assert scheduler.tick() == 0
+    assert scheduler.stats() == {'tracked': 0, 'prefetches': 2, 'prefetch_hits': 1,
+        'wasted': 1, 'lapsed': 2, 'over_budget': 0, 'errors': 0}
+
+def test_budget_goes_to_the_hottest_entries():
+    clock = Clock()
+    transport = StubTransport({'departures': []})
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=1, clock=clock)
+    departures(client, 1071, 1071, 1071, 1072, 1072, 1072, 1072)
+    clock.now = 28.5
+    assert scheduler.tick() == 1
+    assert '/stop/1072?' in transport.urls[-1]
+    assert scheduler.stats()['over_budget'] == 1
+    # Still waiting for budget, which counts once.
+    clock.now = 28.6
+    assert scheduler.tick() == 0
+    assert scheduler.stats()['over_budget'] == 1
+    clock.now = 29.6
+    assert scheduler.tick() == 1
+    assert '/stop/1071?' in transport.urls[-1]
+    with pytest.raises(ValueError):
+        PrefetchScheduler(PTVClient(DEV_ID, API_KEY, transport=transport))
+
+def test_failed_prefetch_waits_for_next_call():
+    clock = Clock()
+    transport = StubTransport({'departures': []})
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=10, clock=clock)
+    departures(client, 1071, 1071, 1071)
+    transport.status_code = 503
+    clock.now = 28.5
+    assert scheduler.tick() == 1
+    clock.now = 29
+    assert scheduler.tick() == 0
+    assert scheduler.stats()['errors'] == 1
+
+def test_async_client():
+    clock = Clock()
+    transport = AsyncStubTransport({'departures': []})
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=10, interval=0.01, clock=clock)
+
+    async def run():
+        for _ in range(3):
+            await client.get_departure_from_stop(RouteType.TRAIN, 1071)
+        clock.now = 28.5
+        assert await scheduler.tick_async() == 1
+        clock.now = 31
+        await client.get_departure_from_stop(RouteType.TRAIN, 1071)
+        clock.now = 57
+        scheduler.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if scheduler.prefetches == 2:
+                break
+        scheduler.stop()
+
+    asyncio.run(run())
+    assert len(transport.urls) == 3
+    assert scheduler not in client.observers
+
+def test_restart_after_stop():
+    clock = Clock()
+    transport = StubTransport({'departures': []})
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=10, clock=clock)
+    scheduler.start().stop()
+    assert scheduler not in client.observers
+    with scheduler:
+        assert scheduler in client.observers
+        departures(client, 1071, 1071)
+    assert scheduler.stats()['tracked'] == 1
+
+def test_cancelled_prefetch_is_not_left_in_flight():
+    clock = Clock()
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=AsyncStubTransport({'departures': []}),
+        cache=MemoryCache(clock=clock))
+    scheduler = PrefetchScheduler(client, rate=10, clock=clock)
+
+    async def hang(*args):
+        await asyncio.sleep(10)
+
+    async def run():
+        for _ in range(3):
+            await client.get_departure_from_stop(RouteType.TRAIN, 1071)
+        clock.now = 28.5
+        client._load = hang
+        task = asyncio.ensure_future(scheduler.tick_async())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert [entry.in_flight for entry in scheduler._entries.values()] == [False]
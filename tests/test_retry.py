@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+import requests
+
+from ptv.aio import AsyncPTVClient
+from ptv.client import PTVClient
+from ptv.retry import RateLimiter
+from ptv.retry import RetryPolicy
+from ptv.transport import Response
+from ptv.transport import Transport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+class SequenceTransport(Transport):
+    """Returns (or raises) each queued outcome in turn."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, headers = outcome
+        return Response(status, json.dumps({'status': {'health': 1}}).encode('UTF-8'), headers, url)
+
+
+class AsyncSequenceTransport(SequenceTransport):
+    async def get(self, url):
+        return SequenceTransport.get(self, url)
+
+
+def policy(**kwargs):
+    return RetryPolicy(backoff=0.001, rng=lambda: 1.0, **kwargs)
+
+
+def test_transient_errors_are_retried():
+    transport = SequenceTransport((503, {}), requests.ConnectionError('reset'), (200, {}))
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, retry_policy=policy())
+    assert client.get_route_types() == {'status': {'health': 1}}
+    assert len(set(transport.urls)) == 1
+    assert client.retry_policy.stats() == {'throttled': 0, 'retried': 2, 'given_up': 0}
+
+def test_gives_up_after_max_retries():
+    transport = SequenceTransport((429, {'Retry-After': '0'}), (429, {'Retry-After': '0'}))
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, retry_policy=policy(max_retries=1))
+    with pytest.raises(requests.HTTPError):
+        client.get_route_types()
+    assert client.retry_policy.stats() == {'throttled': 2, 'retried': 1, 'given_up': 1}
+
+def test_client_errors_are_not_retried():
+    transport = SequenceTransport((403, {}))
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, retry_policy=policy())
+    with pytest.raises(requests.HTTPError):
+        client.get_route_types()
+    assert client.retry_policy.stats()['given_up'] == 0
+
+def test_retry_after_and_budget():
+    retry = policy(budget=10)
+    assert retry.delay(0, 0, Response(503, b'', {'retry-after': '3'})) == 3
+    assert retry.delay(1, 8, Response(503, b'', {'Retry-After': '3'})) is None
+
+def test_async_client_retries():
+    transport = AsyncSequenceTransport((502, {}), (200, {}))
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport, retry_policy=policy())
+    assert asyncio.run(client.get_route_types()) == {'status': {'health': 1}}
+    assert client.retry_policy.retried == 1
+
+def test_token_bucket_per_dev_id():
+    now = [0.0]
+    limiter = RateLimiter(2, burst=2, rates={'other': (1, 1)}, clock=lambda: now[0])
+    assert [limiter.reserve(DEV_ID) for _ in range(3)] == [0, 0, 0.5]
+    assert limiter.reserve('other') == 0
+    assert limiter.reserve('other') == 1
+    now[0] = 10
+    assert limiter.reserve(DEV_ID) == 0
+    assert limiter.stats() == {'throttled': 2}
@@ -0,0 +1,63 @@
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.index import NetworkIndex
+from ptv.search import SearchIndex
+from tests.stubs import StubTransport
+from tests.stubs import network_payload
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def build_search():
+    transport = StubTransport(lambda url: {'stops': [], 'routes': [], 'outlets': []}
+        if '/v3/search/' in url else network_payload(url))
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    search = SearchIndex.from_index(NetworkIndex.build(client), client=client)
+    del transport.urls[:]
+    return search, transport
+
+
+def test_prefix_matches_are_ranked_by_route_type():
+    search, transport = build_search()
+    result = search.search('Flin')
+    assert [(s['route_type'], s['stop_id']) for s in result['stops']] == [(0, 1071), (1, 2500)]
+    assert result['routes'] == []
+    assert [s['stop_id'] for s in search.search('flinders st')['stops']] == [1071, 2500]
+    assert [s['stop_id'] for s in search.search('Station', route_types=[RouteType.TRAIN])['stops']] == \
+        [1002, 1071, 1073, 1162]
+    assert transport.urls == []
+    assert search.stats() == {'hits': 3, 'misses': 0}
+
+def test_numeric_and_short_terms_only_match_routes():
+    search, transport = build_search()
+    result = search.search('96')
+    assert [r['route_id'] for r in result['routes']] == [1041]
+    assert result['stops'] == []
+    assert [r['route_id'] for r in search.search('Fr')['routes']] == [6]
+
+def test_exact_name_ranks_first_within_route_type():
+    search, transport = build_search()
+    assert [r['route_id'] for r in search.search('Frankston')['routes']] == [6]
+    assert [s['stop_id'] for s in search.search('Frankston')['stops']] == [1073]
+
+def test_fuzzy_match_on_typo():
+    search, transport = build_search()
+    assert [s['stop_id'] for s in search.search('Richmnd')['stops']] == [1162]
+    assert transport.urls == []
+
+def test_location_filter():
+    search, transport = build_search()
+    result = search.search('Station', latitude=-37.8183, longitude=144.9671, max_distance=3000)
+    assert [s['stop_id'] for s in result['stops']] == [1071, 1162]
+    assert result['stops'][0]['stop_distance'] == 0
+
+def test_miss_falls_back_to_api():
+    search, transport = build_search()
+    assert search.search('Southern Cross', route_types=[RouteType.TRAIN]) == \
+        {'stops': [], 'routes': [], 'outlets': []}
+    assert len(transport.urls) == 1
+    assert '/v3/search/Southern%20Cross?' in transport.urls[0]
+    assert 'route_types=0' in transport.urls[0]
+    assert 'include_outlets=true' in transport.urls[0]
+    assert search.stats() == {'hits': 0, 'misses': 1}
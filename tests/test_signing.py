@@ -0,0 +1,37 @@
+from hashlib import sha1
+import hmac
+
+from ptv.client import DEPARTURES_FOR_ROUTE
+from ptv.client import STOPS_NEAR_LOCATION
+from ptv.client import PTVClient
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def reference_signature(key, path):
+    return hmac.new(bytes(key, 'UTF-8'), bytes(path, 'UTF-8'), sha1).hexdigest().upper()
+
+
+def test_endpoint_templates():
+    assert DEPARTURES_FOR_ROUTE.path(0, 1071, 6) == '/v3/departures/route_type/0/stop/1071/route/6'
+    assert STOPS_NEAR_LOCATION.path('-37.8', '144.9') == '/v3/stops/location/-37.8,144.9'
+    assert DEPARTURES_FOR_ROUTE.template == 'departures/route_type/{}/stop/{}/route/{}'
+
+def test_signature_matches_reference_and_tracks_key_changes():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport())
+    path = '/v3/route_types?devid=' + DEV_ID
+    assert client._computeSignature(path) == reference_signature(API_KEY, path)
+    assert client._computeSignature(path) == reference_signature(API_KEY, path)
+    client.api_key = 'another-key'
+    assert client._computeSignature(path) == reference_signature('another-key', path)
+
+def test_build_url_does_not_modify_params():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(), base_url='http://h')
+    params = {'max_results': 5}
+    url = client._build_url('/v3/routes', params)
+    signed = '/v3/routes?max_results=5&devid=' + DEV_ID
+    assert url == 'http://h' + signed + '&signature=' + reference_signature(API_KEY, signed)
+    assert params == {'max_results': 5}
+    assert client._build_url('/v3/route_types').startswith('http://h/v3/route_types?devid=' + DEV_ID + '&')
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ptv.aio import AsyncPTVClient
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.singleflight import SingleFlight
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+class GatedTransport(StubTransport):
+    """Blocks every request until the gate is opened."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def get(self, url):
+        self.gate.wait(5)
+        return super().get(url)
+
+
+def test_identical_concurrent_calls_share_one_request():
+    transport = GatedTransport()
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        client.get_departure_from_stop(RouteType.TRAIN, 1071))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while client.single_flight.shared < 7 and time.time() < deadline:
+        time.sleep(0.001)
+    transport.gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(transport.urls) == 1
+    assert len(results) == 8
+    assert client.single_flight.calls == 1
+
+def test_errors_are_shared_and_not_retained():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('k', fail)
+    assert flight.do('k', lambda: 1) == 1
+
+def test_async_identical_calls_share_one_request():
+    transport = AsyncStubTransport(delay=0.01)
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport)
+
+    async def burst():
+        return await asyncio.gather(*[
+            client.get_departure_from_stop(RouteType.TRAIN, 1071) for _ in range(10)])
+
+    assert len(asyncio.run(burst())) == 10
+    assert len(transport.urls) == 1
+    assert client.single_flight.shared == 9
+
+def test_coalescing_can_be_disabled():
+    transport = StubTransport()
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, coalesce=False)
+    client.get_route_types()
+    assert client.single_flight is None
+    assert len(transport.urls) == 1
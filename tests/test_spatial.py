@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from ptv.client import RouteType
+from ptv.index import NetworkIndex
+from ptv.models import Stop
+from ptv import spatial
+from ptv.spatial import StopLocator
+from ptv.spatial import haversine
+from tests.stubs import STOPS
+
+FLINDERS = (-37.8183, 144.9671)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def locator(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(spatial, 'np', None)
+    elif spatial.np is None:
+        pytest.skip('numpy not installed')
+    locator = StopLocator()
+    for stops in STOPS.values():
+        for stop in stops:
+            locator.add_stop(stop)
+    return locator
+
+
+def test_haversine():
+    assert haversine(*FLINDERS, *FLINDERS) == 0
+    assert 2000 < haversine(*FLINDERS, -37.8240, 144.9901) < 2200
+
+def test_nearest_orders_by_distance_and_filters(locator):
+    results = locator.nearest(*FLINDERS, max_distance=1000)
+    assert [(r['route_type'], r['stop_id']) for r in results] == [(0, 1071), (1, 2500)]
+    assert results[0]['stop_distance'] == 0
+    assert results[1]['stop_distance'] > 0
+    assert [r['stop_id'] for r in locator.nearest(*FLINDERS, route_types=[RouteType.TRAM],
+        max_distance=1000)] == [2500]
+    assert len(locator.nearest(*FLINDERS, max_results=1, max_distance=5000)) == 1
+    assert len(locator.nearest(*FLINDERS, max_distance=5000)) == 3
+
+def test_stop_location_from_get_stop(locator):
+    locator.add_stop({'stop_id': 9999, 'route_type': 0, 'stop_name': 'Test',
+        'stop_location': {'gps': {'latitude': -37.8184, 'longitude': 144.9672}}})
+    assert [r['stop_id'] for r in locator.nearest(*FLINDERS, max_distance=50)] == [1071, 9999]
+
+def test_stop_models_are_added(locator):
+    locator.add_stop(Stop({'stop_id': 9998, 'route_type': 1, 'stop_name': 'Model',
+        'stop_latitude': -37.8184, 'stop_longitude': 144.9672}))
+    locator.add_stop(Stop({'stop_id': 9999, 'route_type': 0, 'stop_name': 'Located',
+        'stop_location': {'gps': {'latitude': -37.8185, 'longitude': 144.9673}}}))
+    results = locator.nearest(*FLINDERS, max_distance=50)
+    assert [(r['stop_id'], r['stop_name']) for r in results] == \
+        [(1071, 'Flinders Street Station'), (9998, 'Model'), (9999, 'Located')]
+
+def test_batch_matches_single_queries(locator):
+    rng = random.Random(1)
+    points = [(-37.8 - rng.random() * 0.4, 144.9 + rng.random() * 0.3) for _ in range(50)] + [FLINDERS]
+    batch = locator.nearest_many(points, max_distance=3000, chunk_size=16)
+    assert batch == [locator.nearest(lat, lon, max_distance=3000) for lat, lon in points]
+
+def test_from_index():
+    index = NetworkIndex()
+    index.stops = {(0, 1071): ('Flinders Street Station', 'Melbourne City') + FLINDERS,
+        (0, 1): ('Nowhere', None, None, None)}
+    assert len(StopLocator.from_index(index)) == 1
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from ptv.client import PTVClient
+from ptv.models import Run
+from ptv.stream import iter_items
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+RUNS = {
+    'status': {'health': 1, 'version': '3.0'},
+    'runs': [{'run_id': i, 'destination_name': 'Flinders "St" é', 'express_stop_count': -1.5e3}
+        for i in range(200)],
+}
+
+
+def chunked(payload, size):
+    raw = json.dumps(payload).encode('UTF-8')
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_iter_items_across_chunk_boundaries(size):
+    assert list(iter_items(chunked(RUNS, size), 'runs')) == RUNS['runs']
+
+def test_iter_items_flattens_grouped_arrays_and_handles_missing_keys():
+    payload = {'disruptions': {'general': [{'disruption_id': 1}], 'metro_bus': [],
+        'metro_train': [{'disruption_id': 2}]}, 'status': {}}
+    assert [d['disruption_id'] for d in iter_items(chunked(payload, 3), 'disruptions')] == [1, 2]
+    assert list(iter_items(chunked(RUNS, 5), 'routes')) == []
+
+def test_iter_items_is_lazy():
+    chunks = iter(chunked(RUNS, 64))
+    items = iter_items(chunks, 'runs')
+    assert next(items)['run_id'] == 0
+    assert next(chunks, None) is not None
+
+def test_client_streams_endpoint_arrays():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(RUNS))
+    assert [run['run_id'] for run in client.iter_runs_for_route(1)] == list(range(200))
+    client.models = True
+    assert isinstance(next(client.stream('get_runs_for_route', 1)), Run)
+    with pytest.raises(ValueError):
+        client.stream('get_route', 1)
+
+def test_custom_json_decoder():
+    calls = []
+
+    def loads(body):
+        calls.append(body)
+        return json.loads(body)
+
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(RUNS), json_loads=loads)
+    assert client.get_runs_for_route(1) == RUNS
+    assert len(calls) == 1
@@ -0,0 +1,136 @@
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import re
+import threading
+import time
+import urllib.parse
+
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.timetable import day_bounds
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+DAY = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def timetable(step=10):
+    # Two routes departing together every 10 minutes, and a run calling twice at 12:00.
+    # With a smaller step, route 1 also departs in between.
+    departures = []
+    for minute in range(0, 24 * 60, step):
+        when = (DAY + timedelta(minutes=minute)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for route_id in (1, 6) if minute % 10 == 0 else (1,):
+            departures.append({'run_id': route_id * 10000 + minute, 'route_id': route_id,
+                'stop_id': 1071, 'scheduled_departure_utc': when})
+    departures.append({'run_id': 10720, 'route_id': 1, 'stop_id': 1071,
+        'scheduled_departure_utc': '2020-01-01T12:30:00Z'})
+    return departures
+
+
+def departures_payload(url, per_route=False):
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    since = query['date_utc'][0]
+    max_results = int(query['max_results'][0])
+    route = re.search(r'/route/(\d+)\?', url)
+    route_id = int(route.group(1)) if route else None
+    departures = [d for d in timetable(5 if per_route else 10)
+        if d['scheduled_departure_utc'] >= since and route_id in (None, d['route_id'])]
+    departures.sort(key=lambda d: d['scheduled_departure_utc'])
+    if per_route:
+        departures = [d for route_id in (1, 6)
+            for d in [d for d in departures if d['route_id'] == route_id][:max_results]]
+    else:
+        departures = departures[:max_results]
+    return {'departures': departures, 'status': {'health': 1}}
+
+
+def walk(per_route=False, **kwargs):
+    transport = StubTransport(lambda url: departures_payload(url, per_route))
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    departures = list(client.walk_departures(RouteType.TRAIN, 1071, **kwargs))
+    return departures, transport
+
+
+def keys(departures):
+    return [(d['run_id'], d['scheduled_departure_utc']) for d in departures]
+
+
+def test_walk_pages_and_deduplicates():
+    departures, transport = walk(start=DAY, end=DAY + timedelta(days=1), page_size=25)
+    expected = sorted(keys(timetable()), key=lambda key: (key[1], key[0]))
+    assert sorted(keys(departures), key=lambda key: (key[1], key[0])) == expected
+    assert len(set(keys(departures))) == len(departures) == 289
+    times = [d['scheduled_departure_utc'] for d in departures]
+    assert times == sorted(times)
+    assert 12 < len(transport.urls) < 20
+    assert 'date_utc=2020-01-01T00%3A00%3A00Z' in transport.urls[0]
+
+def test_max_results_per_route():
+    departures, transport = walk(start=DAY, end=DAY + timedelta(days=1), page_size=25, per_route=True)
+    assert sorted(keys(departures)) == sorted(keys(timetable(5)))
+    times = [d['scheduled_departure_utc'] for d in departures]
+    assert times == sorted(times)
+
+def test_walk_is_lazy_and_honours_end():
+    transport = StubTransport(departures_payload)
+    client = PTVClient(DEV_ID, API_KEY, transport=transport)
+    walker = client.walk_departures(RouteType.TRAIN, 1071, '2020-01-01T06:00:00Z',
+        '2020-01-01T07:00:00Z', route_id=6, page_size=4)
+    first = next(walker)
+    assert first['scheduled_departure_utc'] == '2020-01-01T06:00:00Z'
+    assert len(transport.urls) == 1
+    assert [d['run_id'] for d in walker] == [60370, 60380, 60390, 60400, 60410]
+
+def test_page_of_simultaneous_departures_is_refetched_larger(caplog):
+    departures, transport = walk(start=DAY, end=DAY + timedelta(minutes=30), page_size=1)
+    assert keys(departures) == [(10000, '2020-01-01T00:00:00Z'), (60000, '2020-01-01T00:00:00Z'),
+        (10010, '2020-01-01T00:10:00Z'), (60010, '2020-01-01T00:10:00Z'),
+        (10020, '2020-01-01T00:20:00Z'), (60020, '2020-01-01T00:20:00Z')]
+    assert 'skipping' not in caplog.text
+
+def test_capped_page_at_one_instant_is_skipped_with_a_warning(caplog):
+    capped = lambda url: departures_payload(re.sub(r'max_results=\d+', 'max_results=1', url))
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(capped))
+    departures = list(client.walk_departures(RouteType.TRAIN, 1071, DAY, DAY + timedelta(minutes=15),
+        page_size=1))
+    assert keys(departures) == [(10000, '2020-01-01T00:00:00Z'), (10010, '2020-01-01T00:10:00Z')]
+    assert 'at 2020-01-01T00:00:00Z' in caplog.text
+
+def test_parallel_slices_match_sequential_walk():
+    sequential, _ = walk(start=DAY, end=DAY + timedelta(days=1), page_size=25)
+    parallel, _ = walk(start=DAY, end=DAY + timedelta(days=1), page_size=25, slices=4)
+    assert sorted(keys(parallel)) == sorted(keys(sequential))
+    assert len(parallel) == len(sequential)
+
+def test_parallel_slices_stream_lazily():
+    release = threading.Event()
+
+    def gated(url):
+        # Only the first hour is answered before release, or a timeout.
+        if 'date_utc=2020-01-01T00' not in url and not release.wait(2):
+            release.set()
+        return departures_payload(url)
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(gated))
+    started = time.perf_counter()
+    walker = client.walk_departures(RouteType.TRAIN, 1071, DAY, DAY + timedelta(days=1),
+        page_size=5, slices=4)
+    assert next(walker)['scheduled_departure_utc'] == '2020-01-01T00:00:00Z'
+    assert time.perf_counter() - started < 1
+    release.set()
+    rest = list(walker)
+    sequential, _ = walk(start=DAY, end=DAY + timedelta(days=1), page_size=5)
+    assert len(rest) + 1 == len(sequential)
+
+    walker = client.walk_departures(RouteType.TRAIN, 1071, DAY, DAY + timedelta(days=1),
+        page_size=1, slices=4)
+    next(walker)
+    walker.close()
+
+def test_day_bounds():
+    assert day_bounds(date(2020, 1, 1)) == (DAY, DAY + timedelta(days=1))
+    melbourne = timezone(timedelta(hours=11))
+    assert day_bounds(date(2020, 1, 1), melbourne)[0] == DAY - timedelta(hours=11)
@@ -0,0 +1,40 @@
+import pytest
+import requests
+
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.transport import RequestsTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+
+
+def test_injected_transport_is_shared_by_endpoints():
+    transport = StubTransport()
+    client = PTVClient(DEV_ID, API_KEY, transport=transport, base_url='http://localhost:1')
+    assert client.get_route_types() == transport.payload
+    client.get_departure_from_stop(RouteType.TRAIN, 1071)
+    assert len(transport.urls) == 2
+    assert transport.urls[0].startswith('http://localhost:1/v3/route_types?devid=' + DEV_ID)
+    assert '&signature=' in transport.urls[1]
+
+def test_http_errors_are_raised():
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(status_code=503))
+    with pytest.raises(requests.HTTPError):
+        client.get_route_types()
+
+def test_context_manager_closes_transport():
+    transport = StubTransport()
+    with PTVClient(DEV_ID, API_KEY, transport=transport):
+        pass
+    assert transport.closed
+
+def test_requests_transport_pool_configuration():
+    transport = RequestsTransport(pool_maxsize=32, keep_alive=False,
+        connect_timeout=1, read_timeout=2)
+    adapter = transport.session.get_adapter('https://timetableapi.ptv.vic.gov.au')
+    assert adapter._pool_maxsize == 32
+    assert transport.session.headers['Connection'] == 'close'
+    assert transport.timeout == (1, 2)
+    transport.close()
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime
+from datetime import timezone
+import itertools
+import re
+
+from ptv.aio import AsyncPTVClient
+from ptv.client import PTVClient
+from ptv.client import RouteType
+from ptv.watch import ADDED
+from ptv.watch import CHANGED
+from ptv.watch import REMOVED
+from ptv.watch import DepartureTracker
+from ptv.watch import poll_interval
+from tests.stubs import AsyncStubTransport
+from tests.stubs import StubTransport
+
+DEV_ID = "1000733"
+API_KEY = "dfa5929b-04f9-11e6-a65e-029db85e733b"
+NOW = 1600000000
+
+
+def at(offset):
+    return datetime.fromtimestamp(NOW + offset, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def departure(run_id, stop_id, offset, estimated=None):
+    return {'run_id': run_id, 'stop_id': stop_id, 'route_id': 6, 'direction_id': 1,
+        'scheduled_departure_utc': at(offset),
+        'estimated_departure_utc': at(estimated) if estimated is not None else None,
+        'platform_number': '1', 'at_platform': False, 'flags': '', 'disruption_ids': []}
+
+
+POLLS = [
+    {1071: [departure(10, 1071, 600), departure(11, 1071, 900)], 1162: [departure(10, 1162, 780)]},
+    {1071: [departure(10, 1071, 600, estimated=660), departure(11, 1071, 900)],
+        1162: [departure(10, 1162, 780)]},
+    {1071: [departure(11, 1071, 900), departure(12, 1071, 1200)], 1162: None},
+]
+
+
+def board(polls):
+    def payload(url):
+        stop_id = int(re.search(r'/stop/(\d+)\?', url).group(1))
+        departures = polls[0][stop_id]
+        if departures is None:
+            return None
+        return {'departures': departures, 'status': {'health': 1}}
+    return payload
+
+
+def test_tracker_emits_only_changes():
+    polls = list(POLLS)
+    client = PTVClient(DEV_ID, API_KEY, transport=StubTransport(board(polls)))
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        polls.pop(0)
+
+    changes = client.watch_departures([(RouteType.TRAIN, 1071), (RouteType.TRAIN, 1162)],
+        clock=lambda: NOW + 480, sleep=sleep)
+    first = list(itertools.islice(changes, 3))
+    assert [(c.kind, c.key) for c in first] == [(ADDED, (10, 1071)), (ADDED, (11, 1071)),
+        (ADDED, (10, 1162))]
+    changed = next(changes)
+    assert (changed.kind, changed.key) == (CHANGED, (10, 1071))
+    assert changed.changed_fields() == ['estimated_departure_utc']
+    assert changed.previous['estimated_departure_utc'] is None
+    # Stop 1162 fails on the third poll, so its departure is kept rather than removed.
+    third = list(itertools.islice(changes, 2))
+    assert [(c.kind, c.key) for c in third] == [(ADDED, (12, 1071)), (REMOVED, (10, 1071))]
+    assert waits == [30, 45]
+
+def test_unchanged_poll_yields_nothing():
+    tracker = DepartureTracker()
+    result = {'departures': [departure(10, 1071, 600)], 'errors': []}
+    assert len(tracker.update(result)) == 1
+    assert tracker.update(result) == []
+
+def test_poll_interval_adapts_to_soonest_departure():
+    assert poll_interval([departure(1, 1, 3600)], NOW) == 60
+    assert poll_interval([departure(1, 1, 3600), departure(2, 1, 120)], NOW) == 30
+    assert poll_interval([departure(1, 1, 3600, estimated=8)], NOW) == 5
+    assert poll_interval([departure(1, 1, -30)], NOW) == 60
+    assert poll_interval([], NOW, max_interval=20) == 20
+
+def test_async_watch():
+    polls = list(POLLS)
+    transport = AsyncStubTransport(board(polls))
+    client = AsyncPTVClient(DEV_ID, API_KEY, transport=transport)
+
+    async def watch():
+        changes = []
+        async for change in client.watch_departures([(RouteType.TRAIN, 1071)], min_interval=0,
+            max_interval=0, clock=lambda: NOW):
+            changes.append(change)
+            if len(changes) == 2:
+                polls.pop(0)
+            if len(changes) == 3:
+                return changes
+
+    assert [(c.kind, c.key) for c in asyncio.run(watch())] == [(ADDED, (10, 1071)),
+        (ADDED, (11, 1071)), (CHANGED, (10, 1071))]